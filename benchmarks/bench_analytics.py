@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           bench_analytics.py
+:project        bilibili_live_utils
+:name           弹幕统计的内存和耗时测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/23 14:00
+:description    模拟一场12小时的直播（时间加速），观众不断更换，每小时输出一次统计占用的内存、每个事件的处理耗时和统计结果，
+                确认内存（统计对象包含的所有对象的大小）不随直播时长和观众数量增长。
+                在项目根目录运行： python -m benchmarks.bench_analytics --hours 12 --rate 20
+"""
+
+import argparse
+import random
+import time
+
+from scripts import analytics, utils
+from scripts.analytics import ChatAnalytics
+
+WORDS = ['哈哈哈', '草', '主播好强', 'awsl', '晚上好', '？？？', '来了来了', '这波操作可以的', '888', 'gg']
+
+
+class FakeClock(object):
+    """
+    代替 analytics 模块中的 time，手动推进时间
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="弹幕统计的内存和耗时测试")
+    parser.add_argument('--hours', type=int, default=12, help="模拟的直播时长（小时）")
+    parser.add_argument('--rate', type=float, default=20, help="每秒的弹幕数")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    clock = FakeClock()
+    analytics.time = clock
+    stats = ChatAnalytics()
+    uid = 0
+    step = 1.0 / args.rate
+    print("%-6s %12s %14s %12s %10s  %s" % ("小时", "累计弹幕", "统计内存(KB)", "us/事件", "发言人数", "发言最多"))
+    for hour in range(1, args.hours + 1):
+        start = time.perf_counter()
+        count = int(3600 * args.rate)
+        for i in range(count):
+            clock.now += step
+            if random.random() < 0.3:
+                uid += 1  # 新观众，12小时内会出现几十万个不同的观众
+            sender = uid if random.random() < 0.9 else 1  # 1号观众是刷屏的
+            stats.add_danmaku(sender, 'u' + str(sender), random.choice(WORDS))
+            if i % 10 == 0:
+                stats.add_gift('gold', 1000)
+        per_event = (time.perf_counter() - start) / count * 1e6
+        snapshot = stats.snapshot()
+        memory = utils.deep_getsizeof(stats.__dict__) / 1024
+        print("%-6d %12d %14.1f %12.2f %10d  %s" % (hour, stats.total_danmaku, memory, per_event,
+                                                    snapshot['unique_chatters'], snapshot['top_senders'][:2]))
+    print("不同的观众总数：%d，统计结构固定大小：%.1fKB" % (uid, stats.nbytes / 1024))
+
+
+if __name__ == '__main__':
+    main()
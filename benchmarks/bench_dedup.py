@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           bench_dedup.py
+:project        bilibili_live_utils
+:name           已欢迎观众去重的性能测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/15 21:10
+:description    对比原来的 welcomed_list（list）和 ExpiringSet 在不同观众数量下处理进入事件的速度
+                在项目根目录运行： python -m benchmarks.bench_dedup
+"""
+
+import random
+import time
+
+from scripts.cache import ExpiringSet
+
+
+def run_list(uids: list, size: int) -> float:
+    welcomed_list = list(range(size))
+    start = time.perf_counter()
+    for uid in uids:
+        if uid not in welcomed_list:
+            welcomed_list.append(uid)
+    return time.perf_counter() - start
+
+
+def run_set(uids: list, size: int) -> float:
+    welcomed = ExpiringSet(maxsize=size * 2, ttl=3600)
+    for uid in range(size):
+        welcomed.add(uid)
+    start = time.perf_counter()
+    for uid in uids:
+        if uid not in welcomed:
+            welcomed.add(uid)
+    return time.perf_counter() - start
+
+
+def main():
+    events = 2000
+    print("%-10s %-8s %14s %14s %10s" % ("已欢迎数", "事件数", "list(us/事件)", "set(us/事件)", "加速比"))
+    for size in (100, 1000, 10000, 50000):
+        # 一半是已经欢迎过的观众，一半是新观众
+        uids = [random.randrange(size) if i % 2 else size + i for i in range(events)]
+        t_list = run_list(uids, size)
+        t_set = run_set(uids, size)
+        print("%-13d %-10d %14.2f %14.2f %10.1fx" % (
+            size, events, t_list / events * 1e6, t_set / events * 1e6, t_list / t_set))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           bench_logging.py
+:project        bilibili_live_utils
+:name           日志输出的性能测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/20 18:30
+:description    对比原来的日志方式（拼接字符串 + colored()，控制台和文件 Handler 在事件循环上同步写入，
+                每条日志重新编译正则去除颜色）和日志管道（%-参数延迟格式化，后台线程批量写入）处理一个事件的日志开销。
+                分别测试日志等级为 INFO（输出）和 WARNING（不输出）的情况。
+                在项目根目录运行： python -m benchmarks.bench_logging
+"""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from termcolor import colored
+
+from scripts import utils
+from scripts.log_pipeline import BatchFileHandler, ColorFormatter, LogPipeline, style
+
+FORMAT = '[%(asctime)s][%(levelname)-8s][%(module)s.%(funcName)-15s]:%(lineno)d -> %(message)s'
+DANMAKU_STYLE = style('blue')
+
+
+class LegacyTrimColorFormatter(logging.Formatter):
+    """
+    原来的 TrimColorFormatter：每条日志都重新编译正则，并修改 record.msg
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+        record.msg = ansi_escape.sub('', record.msg)
+        return super(LegacyTrimColorFormatter, self).format(record)
+
+
+def legacy_logger(name: str, level: str, directory: str, console) -> tuple:
+    log = logging.getLogger(name)
+    log.propagate = False
+    log.setLevel(level)
+    console_handler = logging.StreamHandler(console)
+    console_handler.setFormatter(logging.Formatter(FORMAT))
+    file_handler = logging.FileHandler(os.path.join(directory, name + '.log'), encoding='utf-8')
+    file_handler.setFormatter(LegacyTrimColorFormatter(FORMAT))
+    log.addHandler(console_handler)
+    log.addHandler(file_handler)
+    return log, None
+
+
+def pipeline_logger(name: str, level: str, directory: str, console) -> tuple:
+    log = logging.getLogger(name)
+    log.propagate = False
+    log.setLevel(level)
+    console_handler = logging.StreamHandler(console)
+    console_handler.setFormatter(ColorFormatter(FORMAT))
+    file_handler = BatchFileHandler(os.path.join(directory, name + '.log'), encoding='utf-8')
+    file_handler.setFormatter(utils.TrimColorFormatter(FORMAT))
+    pipeline = LogPipeline([console_handler, file_handler])
+    log.addHandler(pipeline.handler)
+    pipeline.start()
+    return log, pipeline
+
+
+def legacy_event(log, uname, content):
+    log.info(colored(str("【收到弹幕】" + uname + ": " + content), 'blue'))
+
+
+def pipeline_event(log, uname, content):
+    log.info("【收到弹幕】%s: %s", uname, content, extra=DANMAKU_STYLE)
+
+
+def run(factory, event, level: str, count: int, directory: str) -> tuple:
+    with open(os.devnull, 'w', encoding='utf-8') as console:
+        log, pipeline = factory(factory.__name__ + '_' + level, level, directory, console)
+        start = time.perf_counter()
+        for i in range(count):
+            event(log, '观众' + str(i), '主播好强')
+        caller = time.perf_counter() - start
+        if pipeline is not None:
+            pipeline.stop()  # 等待后台线程写完
+        total = time.perf_counter() - start
+        for handler in list(log.handlers):
+            handler.close()
+            log.removeHandler(handler)
+    return caller, total
+
+
+def main():
+    count = 20000
+    directory = tempfile.mkdtemp(prefix='bilibili_live_utils_bench_')
+    try:
+        print("%-10s %-8s %20s %20s" % ("日志方式", "等级", "事件循环上(us/事件)", "写完全部(us/事件)"))
+        for level in ('INFO', 'WARNING'):
+            for name, factory, event in (("原来", legacy_logger, legacy_event),
+                                         ("日志管道", pipeline_logger, pipeline_event)):
+                caller, total = run(factory, event, level, count, directory)
+                print("%-10s %-10s %20.2f %20.2f" % (name, level, caller / count * 1e6, total / count * 1e6))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
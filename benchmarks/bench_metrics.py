@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           bench_metrics.py
+:project        bilibili_live_utils
+:name           运行指标记录开销的性能测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/20 14:00
+:description    对比热路径上记录一次指标（提前取得的计数器/直方图、每次按标签查找）和调用一次日志的开销
+                在项目根目录运行： python -m benchmarks.bench_metrics
+"""
+
+import logging
+import time
+
+from scripts.metrics import MetricsRegistry
+
+
+def measure(func, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    count = 200000
+    registry = MetricsRegistry()
+    events = registry.counter('events_total', '', ('room', 'type'))
+    latency = registry.histogram('latency_seconds', '', ('room', 'handler'))
+    counter = events.labels(6154037, 'DANMU_MSG')
+    histogram = latency.labels(6154037, 'on_danmaku')
+    log = logging.getLogger('bench_metrics')
+    log.propagate = False
+    log.addHandler(logging.NullHandler())
+    log.setLevel(logging.INFO)
+
+    cases = [
+        ("计数器 inc()", counter.inc),
+        ("直方图 observe()", lambda: histogram.observe(0.003)),
+        ("每次 labels().inc()", lambda: events.labels(6154037, 'DANMU_MSG').inc()),
+        ("log.debug（未输出）", lambda: log.debug("收到事件 DANMU_MSG")),
+        ("log.info（NullHandler）", lambda: log.info("收到事件 DANMU_MSG")),
+    ]
+    print("%-24s %12s" % ("操作", "ns/次"))
+    for name, func in cases:
+        print("%-24s %12.0f" % (name, measure(func, count) * 1e9))
+    start = time.perf_counter()
+    text = registry.render()
+    print("导出 %d 行指标耗时 %.3fms" % (text.count('\n'), (time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           bench_startup.py
+:project        bilibili_live_utils
+:name           启动耗时测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/26 16:00
+:description    使用模拟的接口（每次调用有固定耗时）测量连接直播间前的准备时间：
+                第一次启动（本地状态数据库为空，需要查询直播间信息）和再次启动（使用上次保存的信息）。
+                完整的大航海列表在后台获取，单独输出获取完成的时间。
+                在项目根目录运行： python -m benchmarks.bench_startup --api-latency 300 --rooms 3
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks import replay
+from scripts import main as main_module
+from scripts.supervisor import Supervisor
+
+
+async def bootstrap(supervisor) -> tuple:
+    """
+    :return: (可以连接直播间的耗时, 大航海列表全部获取完成的耗时)
+    """
+    start = time.perf_counter()
+    await supervisor.bootstrap()
+    ready = time.perf_counter() - start
+    await asyncio.gather(*(ctx.roster._task for ctx in supervisor.rooms.values() if ctx.roster._task is not None))
+    return ready, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时测试")
+    parser.add_argument('--api-latency', type=float, default=300, help="模拟的接口耗时（毫秒）")
+    parser.add_argument('--rooms', type=int, default=1, help="同时连接的直播间数量")
+    args = parser.parse_args()
+
+    replay.install_stubs(args.api_latency / 1000)
+    workdir = tempfile.mkdtemp(prefix='bilibili_live_utils_bench_')
+    config_path = replay.write_config(workdir, 'http://127.0.0.1:1/openapi/api/v2', 'ERROR', args.rooms)
+    os.chdir(workdir)
+    config = main_module.load_config(config_path)
+    config.set('STATE', 'ENABLE', 'True')
+    main_module.setup_logging(config)
+    print("%-12s %16s %20s" % ("", "可以连接(s)", "大航海列表完成(s)"))
+    for name in ("第一次启动", "再次启动"):
+        supervisor = Supervisor(config, config_path)
+        ready, roster = supervisor.loop.run_until_complete(bootstrap(supervisor))
+        print("%-12s %16.3f %20.3f" % (name, ready, roster))
+        supervisor.store.close()
+        supervisor.gateway.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           payloads.py
+:project        bilibili_live_utils
+:name           合成直播间事件
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/16 13:45
+:description    根据真实抓到的事件样本生成随机的直播间事件流，供性能测试回放使用
+"""
+
+import copy
+import random
+
+# 各类事件在合成事件流中的默认比例（大致对应一场礼物刷屏的直播）
+DEFAULT_MIX = {
+    'DANMU_MSG': 30,
+    'INTERACT_WORD': 30,
+    'SEND_GIFT': 25,
+    'COMBO_SEND': 5,
+    'ENTRY_EFFECT': 3,
+    'VIEW': 3,
+    'ROOM_REAL_TIME_MESSAGE_UPDATE': 2,
+    'SUPER_CHAT_MESSAGE': 1,
+    'GUARD_BUY': 1,
+}
+
+# 事件样本（来自 main.py 中记录的真实事件，只保留处理时会用到的字段）
+SAMPLES = {
+    'VIEW': 113791,
+    'DANMU_MSG': {'cmd': 'DANMU_MSG', 'info': [
+        [0, 1, 25, 12802438, 1612863232120, 1612862943, 0, 'b80e5623', 0, 0, 2, '#19897EFF,#403F388E,#33897EFF'],
+        '感觉可以的', [7930172, 'AのFa', 0, 1, 1, 10000, 1, '#E17AFF'],
+        [30, 'ASAKI', 'Asaki大人', 6154037, 2951253, '', 1000006, 16771156, 2951253, 10329087, 2, 1, 194484313],
+        [50, 0, 16746162, 6331, 1], ['title-279-1', 'title-279-1'], 0, 2, None,
+        {'ts': 1612863232, 'ct': '684B0420'}, 0, 0, None, None, 0]},
+    'INTERACT_WORD': {'cmd': 'INTERACT_WORD', 'data': {
+        'uid': 298047096, 'uname': '德物昂Duang', 'uname_color': '', 'identities': [3, 1], 'msg_type': 1,
+        'roomid': 6154037, 'timestamp': 1612862503, 'score': 1612872706213,
+        'fans_medal': {'target_id': 168598, 'medal_level': 2, 'medal_name': '刺儿', 'medal_color': 6067854,
+                       'is_lighted': 1, 'guard_level': 0, 'special': '', 'icon_id': 0, 'anchor_roomid': 1017,
+                       'score': 203},
+        'is_spread': 0, 'spread_info': '', 'contribution': {'grade': 0}, 'spread_desc': '', 'tail_icon': 0}},
+    'ENTRY_EFFECT': {'cmd': 'ENTRY_EFFECT', 'data': {
+        'id': 4, 'uid': 39832030, 'target_id': 351799197, 'mock_effect': 0, 'privilege_type': 3,
+        'copy_writing': '欢迎舰长 <%小馋狮%> 进入直播间', 'copy_color': '#ffffff', 'highlight_color': '#E6FF00',
+        'priority': 1, 'copy_writing_v2': '欢迎舰长 <%小馋狮%> 进入直播间', 'icon_list': [], 'max_delay_time': 7}},
+    'SEND_GIFT': {'cmd': 'SEND_GIFT', 'data': {
+        'draw': 0, 'gold': 0, 'silver': 0, 'num': 1, 'total_coin': 0, 'effect': 0, 'guard_level': 0,
+        'uid': 383665082, 'timestamp': 1612862911, 'giftId': 30607, 'giftType': 5, 'price': 0, 'action': '投喂',
+        'coin_type': 'silver', 'uname': 'Akatuと',
+        'batch_combo_id': 'batch:gift:combo_id:383665082:194484313:30607:1612862906.4710',
+        'giftName': '小心心', 'combo_send': None, 'batch_combo_send': None, 'combo_stay_time': 3,
+        'combo_total_coin': 1, 'tid': '1612862911130200004',
+        'medal_info': {'target_id': 194484313, 'special': '', 'icon_id': 1000006, 'anchor_uname': '',
+                       'anchor_roomid': 0, 'medal_level': 21, 'medal_name': 'ASAKI', 'medal_color': 1725515,
+                       'is_lighted': 1, 'guard_level': 0}}},
+    'COMBO_SEND': {'cmd': 'COMBO_SEND', 'data': {
+        'uid': 3822596, 'ruid': 194484313, 'uname': '猫耳☆幻想冰旋', 'r_uname': 'Asaki大人', 'combo_num': 21,
+        'gift_id': 30607, 'gift_num': 0, 'batch_combo_num': 21, 'gift_name': '小心心', 'action': '投喂',
+        'combo_id': 'gift:combo_id:3822596:194484313:30607:1612862905.8227',
+        'batch_combo_id': 'batch:gift:combo_id:3822596:194484313:30607:1612862905.8234', 'is_show': 1,
+        'total_num': 21, 'combo_total_coin': 0,
+        'medal_info': {'target_id': 194484313, 'special': '', 'icon_id': 1000006, 'anchor_uname': '',
+                       'anchor_roomid': 0, 'medal_level': 15, 'medal_name': 'ASAKI', 'medal_color': 12478086,
+                       'is_lighted': 1, 'guard_level': 0}}},
+    'GUARD_BUY': {'cmd': 'GUARD_BUY', 'data': {
+        'uid': 9405475, 'username': '超超超超超超超爱', 'guard_level': 3, 'num': 1, 'price': 198000,
+        'gift_id': 10003, 'gift_name': '舰长', 'start_time': 1612869234, 'end_time': 1612869234}},
+    'SUPER_CHAT_MESSAGE': {'cmd': 'SUPER_CHAT_MESSAGE', 'data': {
+        'uid': 7930172, 'price': 30, 'message': '主播晚上好', 'user_info': {'uname': 'AのFa'}}},
+    'ROOM_REAL_TIME_MESSAGE_UPDATE': {'cmd': 'ROOM_REAL_TIME_MESSAGE_UPDATE', 'data': {
+        'roomid': 6154037, 'fans': 600657, 'red_notice': -1, 'fans_club': 15463}},
+}
+
+CHAT_LINES = ['哈哈哈哈', '主播好强', '草', '来了来了', '？？？', '晚上好', '好耶', '这也行', '8888', '$?今天天气怎么样']
+
+
+def make_event(event_type: str, room_id: int, rnd: random.Random, viewers: int = 5000) -> dict:
+    """
+    生成一个随机化的事件，格式与 LiveDanmaku 传给事件处理函数的 msg 相同
+    :param viewers: 随机观众的数量（决定 UID 的取值范围，影响缓存和去重的命中率）
+    """
+    uid = rnd.randrange(1, viewers + 1)
+    uname = '观众' + str(uid)
+    if event_type == 'VIEW':
+        data = rnd.randrange(1000, 200000)
+    else:
+        data = copy.deepcopy(SAMPLES[event_type])
+        if event_type == 'DANMU_MSG':
+            data['info'][1] = rnd.choice(CHAT_LINES)
+            data['info'][2][0] = uid
+            data['info'][2][1] = uname
+        elif event_type == 'INTERACT_WORD':
+            data['data']['uid'] = uid
+            data['data']['uname'] = uname
+            data['data']['fans_medal']['medal_level'] = rnd.randrange(0, 21)
+            data['data']['fans_medal']['anchor_roomid'] = rnd.choice((room_id, 1017))
+        elif event_type == 'ENTRY_EFFECT':
+            data['data']['uid'] = uid
+            data['data']['copy_writing'] = '欢迎舰长 <%' + uname + '%> 进入直播间'
+        elif event_type == 'SEND_GIFT':
+            data['data']['uid'] = uid
+            data['data']['uname'] = uname
+            data['data']['num'] = rnd.choice((1, 1, 1, 5, 10))
+            data['data']['batch_combo_id'] = 'batch:gift:combo_id:%d:%d' % (uid, rnd.randrange(3))
+        elif event_type == 'COMBO_SEND':
+            data['data']['uid'] = uid
+            data['data']['uname'] = uname
+            data['data']['total_num'] = rnd.randrange(1, 100)
+            data['data']['batch_combo_id'] = 'batch:gift:combo_id:%d:%d' % (uid, rnd.randrange(3))
+        elif event_type == 'GUARD_BUY':
+            data['data']['uid'] = uid
+            data['data']['username'] = uname
+        elif event_type == 'SUPER_CHAT_MESSAGE':
+            data['data']['uid'] = uid
+            data['data']['user_info']['uname'] = uname
+    return {'room_display_id': room_id, 'room_real_id': room_id, 'type': event_type, 'data': data}
+
+
+def synthetic_events(count: int, room_id: int, mix: dict = None, seed: int = 0, viewers: int = 5000):
+    """
+    按比例随机生成事件流
+    :param count: 事件数量
+    :param mix: 各类事件的比例 {事件类型: 权重}，默认 DEFAULT_MIX
+    :param seed: 随机种子，相同的种子生成相同的事件流
+    """
+    mix = mix or DEFAULT_MIX
+    rnd = random.Random(seed)
+    types = list(mix)
+    weights = [mix[t] for t in types]
+    for event_type in rnd.choices(types, weights, k=count):
+        yield make_event(event_type, room_id, rnd, viewers)
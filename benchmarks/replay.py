@@ -0,0 +1,301 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           replay.py
+:project        bilibili_live_utils
+:name           直播间事件回放性能测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/16 14:30
+:description    把录制的或合成的事件流（JSONL，每行一个事件）按指定速率回放给 Supervisor 中各直播间的事件处理函数，
+                统计每秒处理事件数、各处理函数的 p50/p99 延迟和事件循环延迟。
+                bilibili_api 的网络接口和图灵机器人接口都在本地模拟，不会访问网络。
+                在项目根目录运行：
+                    python -m benchmarks.replay --events 5000 --rate 5000
+                    python -m benchmarks.replay --events 20000 --rooms 20 --rate 0
+                    python -m benchmarks.replay --generate storm.jsonl --events 20000
+                    python -m benchmarks.replay --input storm.jsonl --rate 0
+                    python -m benchmarks.replay --input records/6154037_20210217_200000.jsonl.gz --types DANMU_MSG
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from configparser import RawConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.payloads import synthetic_events  # noqa: E402
+from scripts import main as main_module, metrics  # noqa: E402
+from scripts.recorder import RecordReader  # noqa: E402
+from scripts.supervisor import Supervisor  # noqa: E402
+
+ROOM_ID = 6154037
+
+
+class FakeLiveDanmaku(object):
+    """
+    代替 live.LiveDanmaku，只记录注册的事件处理函数，不连接直播间
+    """
+
+    def __init__(self, room_display_id: int, *args, **kwargs):
+        self.room_display_id = room_display_id
+        self.handlers = {}
+
+    def add_event_handler(self, event_name: str, func):
+        self.handlers.setdefault(event_name.upper(), []).append(func)
+
+    def on(self, name: str):
+        def decoration(func):
+            self.add_event_handler(name, func)
+            return func
+        return decoration
+
+    def connect(self, return_coroutine: bool = False):
+        raise RuntimeError("性能测试中不连接直播间")
+
+
+class FakeTuringHandler(BaseHTTPRequestHandler):
+    """
+    本地的图灵机器人接口，固定回复
+    """
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        body = json.dumps({'intent': {'code': 10004},
+                           'results': [{'values': {'text': '这是本地模拟的图灵机器人回复'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def install_stubs(api_latency: float):
+    """
+    把 bilibili_api 中用到的网络接口替换成本地模拟，每次调用耗时 api_latency 秒
+    """
+    from bilibili_api import live, user
+
+    def fake_call(result):
+        def call(*args, **kwargs):
+            time.sleep(api_latency)
+            return result
+        return call
+
+    live.LiveDanmaku = FakeLiveDanmaku
+    def fake_dahanghai_raw(room_real_id, ruid, page=1, page_size=29, verify=None):
+        # 100个大航海成员：前3名在 top3 中，其余分页返回
+        time.sleep(api_latency)
+        members = [{'uid': i, 'guard_level': 3} for i in range(3, 100)]
+        pages = (len(members) + page_size - 1) // page_size
+        return {'info': {'num': 100, 'page': pages, 'now': page},
+                'top3': [{'uid': i, 'guard_level': 1} for i in range(3)] if page == 1 else [],
+                'list': members[(page - 1) * page_size:page * page_size]}
+
+    live.get_room_info = fake_call({'room_info': {'live_status': 1, 'room_id': 6154037, 'uid': 194484313},
+                                    'anchor_info': {'base_info': {'uname': '测试主播'},
+                                                    'medal_info': {'medal_name': '测试'}}})
+    live.get_room_play_info = fake_call({'room_id': 6154037, 'uid': 194484313})
+    live.get_dahanghai_raw = fake_dahanghai_raw
+    live.send_danmaku = fake_call({})
+    user.get_relation_info = fake_call({'following': 100, 'follower': 20000})
+    user.get_user_info = fake_call({'sex': '保密', 'level': 5})
+
+
+def write_config(directory: str, turing_url: str, log_level: str, rooms: int = 1) -> str:
+    """
+    基于 config.ini.example 生成测试用的配置文件
+    :param rooms: 连接的直播间数量，房间号从 ROOM_ID 开始递增
+    """
+    config = RawConfigParser()
+    config.read(os.path.join(ROOT, 'config.ini.example'), encoding='utf-8')
+    config.set('LIVE', 'ROOM_ID', str(ROOM_ID))
+    for i in range(1, rooms):
+        config.add_section('LIVE:%d' % i)
+        config.set('LIVE:%d' % i, 'ROOM_ID', str(ROOM_ID + i))
+    config.set('SUPERVISOR', 'REPORT_INTERVAL', '0')
+    config.set('LOG', 'LEVEL', log_level)
+    config.set('LOG', 'FILE', '')
+    config.set('CACHE', 'FILE', '')
+    config.set('TURING_AI', 'API_URL', turing_url)
+    path = os.path.join(directory, 'config.ini')
+    with open(path, 'w', encoding='utf-8') as f:
+        config.write(f)
+    return path
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def load_events(args):
+    if args.input and args.input.endswith('.gz'):
+        return list(RecordReader(args.input).read(types=args.types))
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return list(synthetic_events(args.events, ROOM_ID, seed=args.seed, viewers=args.viewers))
+
+
+async def replay(supervisor, events: list, rate: float, alloc: bool = False) -> dict:
+    """
+    按速率回放事件，rate 为每分钟事件数，0 表示不限速。
+    连接了多个直播间时，事件按顺序轮流分给各个直播间
+    """
+    rooms = [ctx.room.handlers for ctx in supervisor.rooms.values()]
+    latencies = {}
+    lags = []
+    tasks = set()
+    stop = False
+    allocations = []
+
+    async def timed(handler, msg):
+        start = time.perf_counter()
+        try:
+            await handler(msg)
+        except Exception as e:
+            latencies.setdefault('错误', []).append(0.0)
+            supervisor.log.debug("处理事件出错：" + repr(e))
+        latencies.setdefault(handler.__name__, []).append(time.perf_counter() - start)
+
+    async def monitor_lag(interval: float = 0.005):
+        while not stop:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    # 按事件类型分发到的处理函数单独计时（on_all 的耗时包括分发到的处理函数）
+    for ctx in supervisor.rooms.values():
+        for event_type, (handler, latency) in ctx._handlers.items():
+            ctx._handlers[event_type] = (functools.partial(timed, handler), latency)
+
+    monitor = asyncio.get_event_loop().create_task(monitor_lag())
+    interval = 60.0 / rate if rate > 0 else 0.0
+    start = time.perf_counter()
+    for i, msg in enumerate(events):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            await asyncio.sleep(delay if delay > 0 else 0)
+        else:
+            await asyncio.sleep(0)
+        handlers = rooms[i % len(rooms)]
+        if alloc:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        for handler in handlers.get(msg['type'], []) + handlers.get('ALL', []):
+            task = asyncio.get_event_loop().create_task(timed(handler, msg))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if alloc:
+            # 让新任务运行到第一次等待网络请求（或处理完），记录这期间分配的内存峰值
+            await asyncio.sleep(0)
+            allocations.append(tracemalloc.get_traced_memory()[1] - before)
+    dispatched = time.perf_counter() - start
+    while tasks:
+        await asyncio.gather(*list(tasks))
+    elapsed = time.perf_counter() - start
+    stop = True
+    await monitor
+    return {'latencies': latencies, 'lags': lags, 'dispatched': dispatched, 'elapsed': elapsed,
+            'allocations': allocations}
+
+
+def report(events: list, result: dict, supervisor):
+    count = len(events)
+    print("回放事件数：%d，派发耗时 %.2fs，全部处理完成耗时 %.2fs，吞吐 %.0f 事件/秒" % (
+        count, result['dispatched'], result['elapsed'], count / result['elapsed']))
+    print("%-22s %8s %12s %12s %12s" % ("处理函数", "次数", "p50(ms)", "p99(ms)", "max(ms)"))
+    for name, values in sorted(result['latencies'].items()):
+        print("%-26s %8d %12.3f %12.3f %12.3f" % (name, len(values), percentile(values, 0.5) * 1000,
+                                                 percentile(values, 0.99) * 1000, max(values) * 1000))
+    lags = result['lags']
+    print("事件循环延迟：p50 %.3fms  p99 %.3fms  max %.3fms（%d 次采样）" % (
+        percentile(lags, 0.5) * 1000, percentile(lags, 0.99) * 1000, max(lags or [0]) * 1000, len(lags)))
+    for room_id, ctx in supervisor.rooms.items():
+        usage = ctx.usage()
+        print("[%d] 事件 %d 个，处理耗时 %.3fs，状态内存约 %.1fKB，弹幕发送队列：%s" % (
+            room_id, usage['events'], usage['handler_time'], usage['memory_kb'], ctx.ds.stats()))
+    print("用户信息缓存：" + str(supervisor.user_cache.stats()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直播间事件回放性能测试")
+    parser.add_argument('--input', help="要回放的事件文件（JSONL 或录制的 .jsonl.gz），不指定则使用合成事件")
+    parser.add_argument('--types', nargs='+', help="只回放录制文件中的这些事件类型")
+    parser.add_argument('--generate', metavar='FILE', help="只生成合成事件文件，不回放")
+    parser.add_argument('--events', type=int, default=5000, help="合成事件数量")
+    parser.add_argument('--viewers', type=int, default=5000, help="合成事件中不同观众的数量")
+    parser.add_argument('--seed', type=int, default=0, help="合成事件的随机种子")
+    parser.add_argument('--rate', type=float, default=5000, help="回放速率（事件/分钟），0 表示不限速")
+    parser.add_argument('--rooms', type=int, default=1, help="同时连接的直播间数量")
+    parser.add_argument('--api-latency', type=float, default=50, help="模拟的接口耗时（毫秒）")
+    parser.add_argument('--metrics', metavar='FILE', help="回放结束后把运行指标写入该文件")
+    parser.add_argument('--log-level', default='ERROR', help="测试时的日志等级")
+    parser.add_argument('--alloc', action='store_true', help="统计派发每个事件时分配的内存（会明显变慢）")
+    args = parser.parse_args()
+
+    events = load_events(args)
+    if args.generate:
+        with open(args.generate, 'w', encoding='utf-8') as f:
+            for msg in events:
+                f.write(json.dumps(msg, ensure_ascii=False) + '\n')
+        print("已生成 %d 个事件到 %s" % (len(events), args.generate))
+        return
+
+    install_stubs(args.api_latency / 1000)
+    FakeTuringHandler.latency = args.api_latency / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTuringHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix='bilibili_live_utils_bench_')
+    config_path = write_config(workdir, 'http://127.0.0.1:%d/openapi/api/v2' % server.server_port, args.log_level,
+                               args.rooms)
+    os.chdir(workdir)
+    config = main_module.load_config(config_path)
+    main_module.setup_logging(config)
+    supervisor = Supervisor(config, config_path)
+    supervisor.loop.run_until_complete(supervisor.bootstrap())
+    for ctx in supervisor.rooms.values():
+        ctx.ds.start()
+        ctx.gifts.start()
+    if args.alloc:
+        tracemalloc.start()
+    result = supervisor.loop.run_until_complete(replay(supervisor, events, args.rate, args.alloc))
+    report(events, result, supervisor)
+    if args.alloc:
+        tracemalloc.stop()
+        allocations = result['allocations']
+        print("派发每个事件时分配的内存：平均 %.2fKB，p50 %.2fKB，p99 %.2fKB" % (
+            sum(allocations) / len(allocations) / 1024, percentile(allocations, 0.5) / 1024,
+            percentile(allocations, 0.99) / 1024))
+    if args.metrics:
+        metrics.registry.dump(os.path.join(ROOT, args.metrics) if not os.path.isabs(args.metrics) else args.metrics)
+        print("运行指标已写入：" + args.metrics)
+    if supervisor.store is not None:
+        supervisor.store.close()
+    supervisor.gateway.shutdown()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
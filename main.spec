@@ -1,7 +1,14 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+
 block_cipher = None
 
+# 打包方式：默认打包成单个 main.exe（每次启动都要先解压到临时目录）；
+# 设置环境变量 ONEDIR=1 后打包成 dist\main 目录（启动时不需要解压，启动更快），例如：
+#   set ONEDIR=1 && pyinstaller main.spec
+onedir = os.environ.get('ONEDIR', '').strip() == '1'
+
 add_files = [
     ('venv\\Lib\\site-packages\\bilibili_api\\data\\api.json', 'bilibili_api\\data'),
     ]
@@ -20,17 +27,37 @@ a = Analysis(['scripts\\main.py'],
              noarchive=False)
 pyz = PYZ(a.pure, a.zipped_data,
              cipher=block_cipher)
-exe = EXE(pyz,
-          a.scripts,
-          a.binaries,
-          a.zipfiles,
-          a.datas,
-          [],
-          name='main',
-          debug=False,
-          bootloader_ignore_signals=False,
-          strip=False,
-          upx=True,
-          upx_exclude=[],
-          runtime_tmpdir=None,
-          console=True )
+if onedir:
+    exe = EXE(pyz,
+              a.scripts,
+              [],
+              exclude_binaries=True,
+              name='main',
+              debug=False,
+              bootloader_ignore_signals=False,
+              strip=False,
+              upx=False,
+              console=True )
+    coll = COLLECT(exe,
+                   a.binaries,
+                   a.zipfiles,
+                   a.datas,
+                   strip=False,
+                   upx=False,
+                   upx_exclude=[],
+                   name='main')
+else:
+    exe = EXE(pyz,
+              a.scripts,
+              a.binaries,
+              a.zipfiles,
+              a.datas,
+              [],
+              name='main',
+              debug=False,
+              bootloader_ignore_signals=False,
+              strip=False,
+              upx=True,
+              upx_exclude=[],
+              runtime_tmpdir=None,
+              console=True )
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           admin.py
+:project        bilibili_live_utils
+:name           管理接口
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/26 10:00
+:description    在本机的 HTTP 端口上提供管理接口（在事件循环上运行，和直播间共用同一个线程），
+                不需要控制台也可以发送弹幕、刷新配置、查看状态、暂停/恢复自动回复和重新获取大航海列表。
+                请求和返回都是 JSON，设置了 TOKEN 时请求需要带上 X-Admin-Token 头。
+                GET  /status                    所有直播间的发送队列、资源占用、缓存和图灵机器人的状态
+                GET  /metrics                   运行指标（和指标接口相同）
+                POST /send                      发送弹幕 {"room": 房间号（可选）, "text": 内容}
+                POST /reload                    刷新配置文件
+                POST /rooms/房间号/pause         暂停该直播间的自动回复（欢迎、答谢、AI回复、定时弹幕）
+                POST /rooms/房间号/resume        恢复该直播间的自动回复
+                POST /rooms/房间号/resync        重新获取该直播间的大航海列表
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+from http import HTTPStatus
+
+from scripts import metrics
+
+# 请求体的最大长度（字节）
+MAX_BODY = 64 * 1024
+# 读取请求的超时时间（秒）
+READ_TIMEOUT = 10
+
+
+class AdminError(Exception):
+    """
+    请求有误，返回对应的状态码和错误信息
+    """
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AdminServer(object):
+
+    def __init__(self, supervisor, host: str = '127.0.0.1', port: int = 9200, token: str = '',
+                 log: logging.Logger = None):
+        """
+        初始化管理接口（需要在事件循环上调用 start）
+        :param supervisor: Supervisor，命令通过它的方法执行
+        :param host: 监听的地址，默认只允许本机访问
+        :param port: 监听的端口，0 表示随机端口
+        :param token: 请求需要带上的 X-Admin-Token，留空则不检查
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.supervisor = supervisor
+        self.host = host
+        self.port = port
+        self.token = token
+        self._server = None
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, headers, body = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT)
+            if self.token != '' and not hmac.compare_digest(headers.get('x-admin-token', ''), self.token):
+                raise AdminError(HTTPStatus.UNAUTHORIZED, 'X-Admin-Token 不正确')
+            status, content_type, payload = HTTPStatus.OK, 'text/plain; version=0.0.4; charset=utf-8', None
+            if method == 'GET' and path == '/metrics':
+                payload = metrics.registry.render().encode('utf-8')
+            else:
+                result = await self.dispatch(method, path, body)
+                content_type = 'application/json; charset=utf-8'
+                payload = json.dumps(dict(ok=True, **result), ensure_ascii=False, default=str).encode('utf-8')
+        except AdminError as e:
+            status, content_type = e.status, 'application/json; charset=utf-8'
+            payload = json.dumps({'ok': False, 'error': str(e)}, ensure_ascii=False).encode('utf-8')
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        except Exception as e:
+            self._log.exception("管理接口处理请求失败！%s", e)
+            status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, 'application/json; charset=utf-8'
+            payload = json.dumps({'ok': False, 'error': str(e)}, ensure_ascii=False).encode('utf-8')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+                      % (status.value, status.phrase, content_type, len(payload))).encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> tuple:
+        """
+        读取一个 HTTP 请求
+        :return: (方法, 路径, {小写的头: 值}, 请求体)
+        """
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise AdminError(HTTPStatus.BAD_REQUEST, '请求格式有误')
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if line == '':
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        # 在读取请求体之前检查长度
+        length = headers.get('content-length', '') or '0'
+        if not length.isdecimal():  # 也排除了负数
+            raise AdminError(HTTPStatus.BAD_REQUEST, 'Content-Length 有误：%s' % length)
+        # 先比较位数，避免把超长的数字转换成整数
+        length = length.lstrip('0') or '0'
+        if len(length) > len(str(MAX_BODY)) or int(length) > MAX_BODY:
+            raise AdminError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, '请求体过长')
+        length = int(length)
+        body = await reader.readexactly(length) if length > 0 else b''
+        return request_line[0].upper(), request_line[1].split('?')[0].rstrip('/') or '/', headers, body
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> dict:
+        """
+        执行一条命令
+        :return: 返回给请求方的内容
+        :raise AdminError: 命令不存在或参数有误
+        """
+        supervisor = self.supervisor
+        if method == 'GET' and path == '/status':
+            return supervisor.dump_state()
+        if method != 'POST':
+            raise AdminError(HTTPStatus.NOT_FOUND, '没有这个接口：%s %s' % (method, path))
+        if path == '/send':
+            try:
+                params = json.loads(body.decode('utf-8')) if body else {}
+            except ValueError:
+                raise AdminError(HTTPStatus.BAD_REQUEST, '请求体不是 JSON')
+            if not isinstance(params, dict):
+                raise AdminError(HTTPStatus.BAD_REQUEST, '请求体应为 JSON 对象')
+            text = str(params.get('text', '')).strip()
+            if text == '':
+                raise AdminError(HTTPStatus.BAD_REQUEST, '缺少 text')
+            ctx = supervisor.send_danmaku(text, self._room_id(params.get('room')))
+            return {'room': ctx.room_id}
+        if path == '/reload':
+            return {'reloaded': await supervisor.reload_config()}
+        parts = path.split('/')
+        if len(parts) == 4 and parts[1] == 'rooms':
+            room_id = self._room_id(parts[2])
+            if parts[3] in ('pause', 'resume'):
+                supervisor.set_paused(room_id, parts[3] == 'pause')
+                return {'room': room_id, 'paused': parts[3] == 'pause'}
+            if parts[3] == 'resync':
+                supervisor.resync_roster(room_id)
+                return {'room': room_id}
+        raise AdminError(HTTPStatus.NOT_FOUND, '没有这个接口：%s %s' % (method, path))
+
+    def _room_id(self, value):
+        """
+        检查房间号，None 表示第一个直播间
+        """
+        if value is None:
+            return None
+        try:
+            room_id = int(value)
+        except (TypeError, ValueError):
+            raise AdminError(HTTPStatus.BAD_REQUEST, '房间号有误：%s' % value)
+        if room_id not in self.supervisor.rooms:
+            raise AdminError(HTTPStatus.NOT_FOUND, '没有连接直播间 %d' % room_id)
+        return room_id
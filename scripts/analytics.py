@@ -0,0 +1,314 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           analytics.py
+:project        bilibili_live_utils
+:name           弹幕统计
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/23 10:00
+:description    按滑动窗口统计直播间的弹幕数、进场数、金瓜子收入、不同的发言人数、发言最多的观众和弹幕中的热词。
+                窗口分成固定数量的时间桶循环使用（环形缓冲），人数用 HyperLogLog 估算，发言次数和热词用 Count-Min Sketch 估算，
+                占用的内存只和配置有关，不会随直播时长和观众数量增长
+"""
+
+import math
+import re
+import time
+from array import array
+
+_MASK64 = (1 << 64) - 1
+
+# 热词：连续的英文/数字，或连续的中文（超过 KEYWORD_MAX 个字时拆成相邻两个字）
+_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+|[\u4e00-\u9fff]+')
+KEYWORD_MAX = 6
+
+
+def hash64(key) -> int:
+    """
+    64位哈希（splitmix64 混合 Python 的 hash，整数的 hash 是它本身，需要打散）
+    """
+    z = (hash(key) + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def keywords(text: str) -> list:
+    """
+    从弹幕中提取热词
+    """
+    words = []
+    for token in _TOKEN_PATTERN.findall(text):
+        if len(token) > KEYWORD_MAX and not token.isascii():
+            words.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            words.append(token.lower())
+    return words
+
+
+class CountMinSketch(object):
+    __slots__ = ('width', 'depth', '_table')
+
+    def __init__(self, width: int = 1024, depth: int = 4):
+        """
+        :param width: 每行的计数器个数（误差约为 总数 * e / width）
+        :param depth: 行数（误差超出范围的概率约为 e^-depth）
+        """
+        self.width = width
+        self.depth = depth
+        self._table = array('I', bytes(4 * width * depth))
+
+    def indexes(self, h: int) -> list:
+        """
+        哈希值对应的每行计数器的位置（同样大小的 sketch 可以共用）
+        """
+        h1 = h & 0xFFFFFFFF
+        h2 = h >> 32 | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, indexes: list, count: int = 1):
+        table = self._table
+        for i in indexes:
+            table[i] += count
+
+    def estimate(self, indexes: list) -> int:
+        table = self._table
+        return min(table[i] for i in indexes)
+
+    def add_estimate(self, indexes: list, count: int = 1) -> int:
+        """
+        计数并返回新的估计值
+        """
+        table = self._table
+        for i in indexes:
+            table[i] += count
+        return min(table[i] for i in indexes)
+
+    def subtract(self, other):
+        """
+        减去另一个相同大小的 sketch 的计数（窗口滑出一个时间桶时使用）
+        """
+        self._table = array('I', map(int.__sub__, self._table, other._table))
+
+    def clear(self):
+        self._table = array('I', bytes(4 * self.width * self.depth))
+
+
+class HyperLogLog(object):
+    __slots__ = ('p', '_registers')
+
+    def __init__(self, p: int = 12):
+        """
+        :param p: 使用 2^p 个寄存器（p = 12 时占用 4KB，误差约 1.6%）
+        """
+        self.p = p
+        self._registers = bytearray(1 << p)
+
+    def add(self, h: int):
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & _MASK64
+        rank = 64 - self.p + 1 if rest == 0 else 65 - rest.bit_length()
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def merge(self, other):
+        registers = self._registers
+        for i, value in enumerate(other._registers):
+            if value > registers[i]:
+                registers[i] = value
+
+    def count(self) -> int:
+        m = len(self._registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # 数量较少时使用线性计数
+        return int(round(estimate))
+
+    def clear(self):
+        self._registers = bytearray(len(self._registers))
+
+
+class _Bucket(object):
+    __slots__ = ('slot', 'danmaku', 'enters', 'gifts', 'gold', 'chatters', 'senders', 'words')
+
+    def __init__(self, width: int, depth: int, p: int):
+        self.slot = -1  # 这个桶当前对应的时间段编号
+        self.danmaku = 0
+        self.enters = 0
+        self.gifts = 0
+        self.gold = 0
+        self.chatters = HyperLogLog(p)
+        self.senders = CountMinSketch(width, depth)
+        self.words = CountMinSketch(width, depth)
+
+    def reset(self, slot: int):
+        self.slot = slot
+        self.danmaku = self.enters = self.gifts = self.gold = 0
+        self.chatters.clear()
+        self.senders.clear()
+        self.words.clear()
+
+
+class _TopN(object):
+    """
+    候选集合固定大小的 Top-N：新元素的估计值超过候选中最小的才替换进来
+    """
+    __slots__ = ('capacity', '_candidates', '_floor')
+
+    def __init__(self, n: int):
+        self.capacity = n * 4
+        self._candidates = {}  # {key: [估计值, 显示名]}
+        self._floor = 0  # 不大于候选中最小估计值的下限，新元素不超过它时不需要查找最小的候选
+
+    def offer(self, key, label, estimate: int):
+        candidates = self._candidates
+        entry = candidates.get(key)
+        if entry is not None:
+            entry[0] = estimate
+            entry[1] = label
+        elif len(candidates) < self.capacity:
+            candidates[key] = [estimate, label]
+        elif estimate > self._floor:
+            smallest = min(candidates, key=lambda k: candidates[k][0])
+            self._floor = candidates[smallest][0]
+            if self._floor < estimate:
+                del candidates[smallest]
+                candidates[key] = [estimate, label]
+                self._floor = min(entry[0] for entry in candidates.values())
+
+    def top(self, n: int, estimate) -> list:
+        """
+        用当前窗口重新估计候选，返回前 n 个 [(显示名, 次数)]，窗口内已经没有的候选会被移除
+        """
+        candidates = self._candidates
+        self._floor = 0
+        for key in list(candidates):
+            count = estimate(key)
+            if count <= 0:
+                del candidates[key]
+            else:
+                candidates[key][0] = count
+        ranked = sorted(candidates.values(), key=lambda entry: entry[0], reverse=True)
+        return [(label, count) for count, label in ranked[:n]]
+
+
+class ChatAnalytics(object):
+
+    def __init__(self, window: float = 600, buckets: int = 10, top_n: int = 10, sketch_width: int = 1024,
+                 sketch_depth: int = 4, hll_precision: int = 12):
+        """
+        初始化直播间统计
+        :param window: 滑动窗口长度（秒）
+        :param buckets: 窗口分成多少个时间桶，窗口每次滑动一个桶的长度
+        :param top_n: 统计发言最多的观众和热词的个数
+        :param sketch_width: Count-Min Sketch 每行的计数器个数
+        :param sketch_depth: Count-Min Sketch 的行数
+        :param hll_precision: HyperLogLog 的精度（2^p 个寄存器）
+        """
+        self.window = window
+        self.bucket_length = window / buckets
+        self.top_n = top_n
+        self._buckets = [_Bucket(sketch_width, sketch_depth, hll_precision) for _ in range(buckets)]
+        # 整个窗口的计数（各时间桶之和），时间桶滑出窗口时减去，查询时只需要查一个 sketch
+        self._window_senders = CountMinSketch(sketch_width, sketch_depth)
+        self._window_words = CountMinSketch(sketch_width, sketch_depth)
+        self._senders = _TopN(top_n)
+        self._words = _TopN(top_n)
+        self._hll_precision = hll_precision
+        self._slot = -1  # 当前时间桶的编号
+        self._current = self._buckets[0]
+        self.total_danmaku = 0
+        self.total_gold = 0
+
+    def _advance(self) -> _Bucket:
+        """
+        返回当前时间桶，时间进入新的时间桶时清空滑出窗口的时间桶
+        """
+        slot = int(time.monotonic() // self.bucket_length)
+        if slot != self._slot:
+            self._slot = slot
+            for bucket in self._buckets:
+                if bucket.slot != -1 and bucket.slot <= slot - len(self._buckets):
+                    self._window_senders.subtract(bucket.senders)
+                    self._window_words.subtract(bucket.words)
+                    bucket.reset(-1)
+            self._current = self._buckets[slot % len(self._buckets)]
+            self._current.slot = slot
+        return self._current
+
+    def add_danmaku(self, uid, uname: str, content: str):
+        bucket = self._advance()
+        bucket.danmaku += 1
+        self.total_danmaku += 1
+        h = hash64(uid)
+        bucket.chatters.add(h)
+        indexes = self._window_senders.indexes(h)
+        bucket.senders.add(indexes)
+        self._senders.offer(uid, uname, self._window_senders.add_estimate(indexes))
+        for word in keywords(content):
+            indexes = self._window_words.indexes(hash64(word))
+            bucket.words.add(indexes)
+            self._words.offer(word, word, self._window_words.add_estimate(indexes))
+
+    def add_gift(self, coin_type: str, total_coin: int):
+        bucket = self._advance()
+        bucket.gifts += 1
+        if coin_type == 'gold':
+            bucket.gold += total_coin
+            self.total_gold += total_coin
+
+    def add_enter(self):
+        self._advance().enters += 1
+
+    def snapshot(self) -> dict:
+        """
+        当前窗口的统计结果（每分钟的数量按窗口内的平均值计算）
+        """
+        self._advance()
+        buckets = [bucket for bucket in self._buckets if bucket.slot != -1]
+        minutes = self.window / 60
+        chatters = HyperLogLog(self._hll_precision)
+        for bucket in buckets:
+            chatters.merge(bucket.chatters)
+        return {
+            'window_minutes': minutes,
+            'danmaku_per_minute': sum(bucket.danmaku for bucket in buckets) / minutes,
+            'enters_per_minute': sum(bucket.enters for bucket in buckets) / minutes,
+            'gifts_per_minute': sum(bucket.gifts for bucket in buckets) / minutes,
+            'gold_per_minute': sum(bucket.gold for bucket in buckets) / minutes,
+            'unique_chatters': chatters.count(),
+            'top_senders': self._senders.top(self.top_n, self._sender_count),
+            'top_keywords': self._words.top(self.top_n, self._word_count),
+            'total_danmaku': self.total_danmaku,
+            'total_gold': self.total_gold,
+        }
+
+    def danmaku_rate(self) -> float:
+        """
+        最近的弹幕数量（每分钟），只计算有数据的时间桶，刚开始统计时不会被低估
+        """
+        self._advance()
+        buckets = [bucket for bucket in self._buckets if bucket.slot != -1]
+        if not buckets:
+            return 0.0
+        return sum(bucket.danmaku for bucket in buckets) / (len(buckets) * self.bucket_length / 60)
+
+    def _sender_count(self, uid) -> int:
+        return self._window_senders.estimate(self._window_senders.indexes(hash64(uid)))
+
+    def _word_count(self, word: str) -> int:
+        return self._window_words.estimate(self._window_words.indexes(hash64(word)))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        统计结构占用的内存（字节），只和配置有关
+        """
+        bucket = self._buckets[0]
+        sketch = bucket.senders._table.itemsize * len(bucket.senders._table)
+        return (len(bucket.chatters._registers) + sketch * 2) * len(self._buckets) + sketch * 2
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           cache.py
+:project        bilibili_live_utils
+:name           缓存
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/14 15:30
+:description    带过期时间（TTL）和最近最少使用（LRU）淘汰的有界缓存，可以保存到本地文件
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from scripts import utils
+
+_MISSING = object()
+
+
+class TTLCache(object):
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600):
+        """
+        初始化缓存
+        :param maxsize: 最多缓存的条目数，超出时淘汰最久未使用的条目
+        :param ttl: 默认的过期时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # {key: (过期时间戳, value)}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._log = logging.getLogger('bilibili_live_utils')
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        """
+        读取缓存，过期的条目视为不存在
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] < time.time():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        """
+        写入缓存
+        :param ttl: 这一条目的过期时间（秒），不指定则使用默认值
+        """
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        缓存命中统计
+        :return: 包含条目数、命中、未命中和淘汰次数的字典
+        """
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def save(self, path: str):
+        """
+        把未过期的条目保存到文件（JSON格式），key 和 value 需要能被 JSON 序列化
+        """
+        now = time.time()
+        entries = [[key, expire, value] for key, (expire, value) in self._data.items() if expire >= now]
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def load(self, path: str):
+        """
+        从文件读取之前保存的条目，已经过期的条目会被忽略
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            self._log.warning("读取缓存文件 %s 失败：%s", path, e)
+            return
+        now = time.time()
+        for key, expire, value in entries:
+            if expire >= now:
+                self._data[key] = (expire, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class ExpiringSet(object):
+
+    def __init__(self, maxsize: int = 50000, ttl: float = None):
+        """
+        初始化带过期时间的去重集合，查询是 O(1)，添加是 O(log n)
+        :param maxsize: 最多保存的元素数，超出时丢弃最先过期的元素
+        :param ttl: 元素的过期时间（秒），过期后视为不在集合中；None 表示不过期（直到 clear）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}  # {元素: 过期时间戳}
+        self._heap = []  # 按过期时间排序的 [(过期时间戳, 序号, 元素)]，和 _data 不一致的是已被刷新或删除的旧记录
+        self._counter = itertools.count()  # 过期时间相同时按加入的先后排序
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        记录的元素占用的内存（字节，估算）
+        """
+        return utils.deep_getsizeof((self._data, self._heap))
+
+    def __contains__(self, item):
+        expire = self._data.get(item)
+        if expire is None:
+            return False
+        if expire < time.monotonic():
+            del self._data[item]
+            return False
+        return True
+
+    def add(self, item, ttl: float = None):
+        """
+        加入元素，已存在的元素会刷新过期时间
+        :param ttl: 这个元素的过期时间（秒），默认使用集合的 ttl（恢复保存的记录时使用剩余的时间）
+        """
+        now = time.monotonic()
+        if ttl is None:
+            ttl = self.ttl
+        expire = now + ttl if ttl is not None else float('inf')
+        self._data[item] = expire
+        heapq.heappush(self._heap, (expire, next(self._counter), item))
+        # 清理所有已过期的元素，仍然超出上限时丢弃最先过期的元素
+        heap = self._heap
+        while heap and (heap[0][0] < now or len(self._data) > self.maxsize):
+            expire, _, oldest = heapq.heappop(heap)
+            if self._data.get(oldest) == expire:
+                del self._data[oldest]
+        # 刷新过期时间留下的旧记录太多时重建
+        if len(heap) > 2 * len(self._data) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [(expire, next(self._counter), item) for item, expire in self._data.items()]
+        heapq.heapify(self._heap)
+
+    def discard(self, item):
+        self._data.pop(item, None)
+
+    def clear(self):
+        self._data.clear()
+        self._heap.clear()
@@ -0,0 +1,232 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           connection.py
+:project        bilibili_live_utils
+:name           直播间连接管理
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/22 15:00
+:description    保持与直播间的连接：连接断开或失败后按带随机抖动的指数退避重新连接，
+                直播间上下文（缓存、已欢迎观众、大航海列表、弹幕队列）在重连期间保留，不需要重新初始化。
+                记录每次重连耗时，并按断开前的事件速率估算断线期间丢失的事件数。
+                bilibili_api 的 LiveDanmaku 连接时会在事件循环上同步查询真实房间号、聊天服务器配置和登录用户信息，
+                这些查询改为在连接前通过网络请求网关（线程池）完成，只有这个直播间的连接使用查询好的结果
+"""
+
+import asyncio
+import logging
+import random
+import time
+import types
+
+from bilibili_api import live
+
+from scripts import metrics, utils
+
+# 替换 LiveDanmaku 连接时使用的查询函数只在这些版本上验证过（库的私有方法 __main 通过模块中的这些名字查询）
+PREFETCH_VERSIONS = ('3.2.', )
+
+_self_info = {}  # {SESSDATA: 登录用户信息}，用户信息不会改变，一直保留
+
+
+class _UserModule(object):
+    """
+    代替 __main 中使用的 user 模块，get_self_info 优先使用查询好的结果，其余函数不变
+    """
+
+    @staticmethod
+    def get_self_info(verify=None):
+        info = _self_info.get(verify.sessdata) if verify is not None else None
+        if info is None:
+            return live.user.get_self_info(verify)
+        return info
+
+    def __getattr__(self, name):
+        return getattr(live.user, name)
+
+
+def _scope_queries(room, get_room_play_info, get_chat_conf) -> bool:
+    """
+    给这个 LiveDanmaku 换上一份自己的 __main：代码不变，只是其中查询用的 get_room_play_info、get_chat_conf 和 user
+    换成传入的函数。bilibili_api 模块本身不修改，其他直播间和其他代码（如网关线程）调用的仍是原来的函数
+    :return: 是否已替换（不是 LiveDanmaku 或 bilibili_api 不是验证过的版本时不替换，连接时仍在事件循环上同步查询）
+    """
+    if not isinstance(room, live.LiveDanmaku) or not utils.bilibili_api_version().startswith(PREFETCH_VERSIONS):
+        return False
+    main = live.LiveDanmaku._LiveDanmaku__main
+    namespace = dict(vars(live), get_room_play_info=get_room_play_info, get_chat_conf=get_chat_conf,
+                     user=_UserModule())
+    main = types.FunctionType(main.__code__, namespace, main.__name__, main.__defaults__, main.__closure__)
+    room._LiveDanmaku__main = types.MethodType(main, room)  # connect() 通过实例属性调用 __main
+    return True
+
+
+class ConnectionManager(object):
+
+    def __init__(self, room, room_id: int, on_reconnect=None, base_delay: float = 1, max_delay: float = 60,
+                 stable_after: float = 60, max_retries: int = 0, on_connect=None, gateway=None,
+                 log: logging.Logger = None):
+        """
+        初始化连接管理
+        :param room: live.LiveDanmaku（需要关闭自带的立即重连 should_reconnect=False）
+        :param room_id: 直播间房间号
+        :param on_reconnect: 重连成功后（收到第一个事件时）调用的回调，不能阻塞
+        :param base_delay: 第一次重连前最多等待的秒数，之后每次翻倍
+        :param max_delay: 重连前最多等待的秒数
+        :param stable_after: 连接保持超过多少秒后，下次断开时重新从 base_delay 开始退避
+        :param max_retries: 连续重连失败多少次后放弃，0 表示一直重连
+        :param on_connect: 第一次连接成功（收到第一个事件时）调用的回调，不能阻塞
+        :param gateway: ApiGateway，用它在连接前查询连接需要的信息，None 表示由库自己查询
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.room = room
+        self.room_id = room_id
+        self.on_reconnect = on_reconnect
+        self.on_connect = on_connect
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.max_retries = max_retries
+        self.gateway = gateway
+        self.connected = False  # 是否已收到当前连接的事件
+        self.attempts = 0  # 连续重连的次数
+        self.reconnects = 0  # 重连成功的总次数
+        self.events_lost = 0.0  # 估算的丢失事件总数
+        self._stopping = False
+        self._down_since = None  # 连接断开的时间
+        self._connected_at = None
+        self._events = 0  # 当前连接收到的事件数
+        self._rate = 0.0  # 断开前的事件速率（个/秒）
+        self._prefetched = {}  # {查询: 连接前查询好的结果}，库使用一次后删除
+        self._scoped = gateway is not None and _scope_queries(room, self._get_room_play_info, self._get_chat_conf)
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+        self._reconnect_metric = metrics.reconnect_latency.labels(room_id)
+        self._lost_metric = metrics.events_lost.labels(room_id)
+
+    async def run(self):
+        """
+        连接直播间，断开后自动重连，直到调用 stop() 或连续重连失败超过 max_retries 次
+        :raise ConnectionError: 超过 max_retries 次仍然无法连接时抛出
+        """
+        while not self._stopping:
+            error = None
+            try:
+                await self._prefetch()
+                await self.room.connect(True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                self._prefetched.clear()
+                self._reset_room()
+            if self._stopping:
+                return
+            self._on_disconnect(error)
+            if self.max_retries and self.attempts >= self.max_retries:
+                raise ConnectionError("连续%d次重连直播间失败" % self.attempts)
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** self.attempts))
+            self.attempts += 1
+            self._log.warning("与直播间的连接已断开（%s），%.1f秒后第%d次重连", error if error is not None else "连接关闭",
+                              delay, self.attempts)
+            await asyncio.sleep(delay)
+
+    async def _prefetch(self):
+        """
+        通过网关查询连接需要的真实房间号、聊天服务器配置和登录用户信息，库连接时直接使用
+        """
+        if not self._scoped:
+            return
+        room = self.room
+        self._prefetched.clear()  # 查询时不能使用上次没有用掉的结果
+        # 库用当前的 room_real_id 查询（第一次连接时是显示的房间号）
+        play_info = await self.gateway.get_room_play_info(room.room_real_id, room.verify)
+        chat_conf = await self.gateway.get_chat_conf(play_info['room_id'], room.verify)
+        verify = room.verify
+        if verify is not None and verify.has_sess() and verify.sessdata not in _self_info:
+            _self_info[verify.sessdata] = await self.gateway.get_self_info(verify)
+        self._prefetched.update(play_info=play_info, chat_conf=chat_conf)
+
+    def _get_room_play_info(self, room_display_id: int, stream_config: dict = None, verify=None):
+        info = self._prefetched.pop('play_info', None)
+        if info is None:
+            return live.get_room_play_info(room_display_id, stream_config, verify)
+        return info
+
+    def _get_chat_conf(self, room_real_id: int, verify=None):
+        conf = self._prefetched.pop('chat_conf', None)
+        if conf is None:
+            return live.get_chat_conf(room_real_id, verify)
+        return conf
+
+    def _reset_room(self):
+        """
+        库只在 websocket 连接关闭时清理连接状态，其他异常会让状态停在“已连接”（之后 connect 会抛出“不可重复连接”），
+        心跳任务也会继续向断开的连接发送心跳。每次连接结束后停止心跳，仍是“已连接”状态时断开连接，保证可以重新连接
+        """
+        room = self.room
+        heartbeat = getattr(room, '_LiveDanmaku__heartbeat_task', None)
+        if heartbeat is not None and not heartbeat.done():
+            heartbeat.cancel()
+        get_status = getattr(room, 'get_connect_status', None)
+        if get_status is None or get_status() != 1:
+            return
+        try:
+            room.disconnect()  # 状态改为已断开，并关闭可能还打开着的 websocket
+        except Exception as e:
+            self._log.debug("断开直播间连接出错：%r", e)
+
+    def stop(self):
+        """
+        主动断开连接，不再重连
+        """
+        self._stopping = True
+        if self.connected:
+            try:
+                self.room.disconnect()
+            except Exception as e:
+                self._log.debug("断开直播间连接出错：%r", e)
+
+    def on_event(self, event_type: str):
+        """
+        收到直播间事件时调用（每个事件一次），第一次收到事件表示连接成功
+        """
+        if event_type == 'DISCONNECT':  # 连接断开时库发出的事件
+            return
+        self._events += 1
+        if self.connected:
+            return
+        now = time.monotonic()
+        self.connected = True
+        self._connected_at = now
+        self._events = 1
+        if self._down_since is None:
+            if self.reconnects == 0 and self.on_connect is not None:
+                self.on_connect()
+            return
+        downtime = now - self._down_since
+        lost = self._rate * downtime
+        self._down_since = None
+        self.reconnects += 1
+        self.events_lost += lost
+        self._reconnect_metric.observe(downtime)
+        self._lost_metric.inc(lost)
+        self._log.warning("重新连接直播间成功，断线%.1f秒，估计丢失%d个事件", downtime, lost)
+        if self.on_reconnect is not None:
+            self.on_reconnect()
+
+    def _on_disconnect(self, error):
+        now = time.monotonic()
+        if self.connected:
+            # 连接过一段时间后断开：记录断开前的事件速率，连接稳定时重新从 base_delay 开始退避
+            elapsed = now - self._connected_at
+            if elapsed > 0:
+                self._rate = self._events / elapsed
+            if elapsed >= self.stable_after:
+                self.attempts = 0
+            self.connected = False
+        if self._down_since is None:
+            self._down_since = now
@@ -7,43 +7,148 @@
 :name           弹幕发送服务
 :author         Doby2333
 :github         https://github.com/lyzhang0113/bilibili-live-utils
-:version        1.0
+:version        1.1
 :created        2021/01/31
 :description    使用账号信息和房间号进行初始化后，可以向该房间发送指定格式弹幕
+                弹幕先进入发送队列，由每个发送账号各自的发送任务按令牌桶限速依次发出，不会阻塞事件循环
 """
 
+import asyncio
 import logging
+import threading
 import time
-from datetime import datetime
-from termcolor import colored
+from collections import deque
 from bilibili_api import *
 
+from scripts import metrics, utils
+from scripts.gateway import ApiGateway
+from scripts.log_pipeline import style
+from scripts.sender_pool import SenderAccount, SenderPool
+from scripts.templates import MAX_LENGTH, MessageTemplates
+
+# 日志颜色（只在控制台显示）
+SEND_STYLE = style('red', 'on_green')
+DROP_STYLE = style('yellow', 'on_red')
+
+# 发送队列的优先级（数字越小越优先）
+PRIORITY_IMPORTANT = 0  # 大航海、醒目留言的答谢
+PRIORITY_TEXT = 1  # AI回复、定时弹幕、控制台输入等整段文字
+PRIORITY_NORMAL = 2  # 普通的欢迎、礼物答谢
+
 
 class DanmakuSender(object):
 
-    def __init__(self, room_id: int, verify: Verify, min_interval: int = 3000, enable: bool = True):
+    def __init__(self, room_id: int, verify: Verify, min_interval: int = 3000, enable: bool = True,
+                 burst: int = 1, queue_size: int = 20, max_delay: float = 30, gateway: ApiGateway = None,
+                 templates: MessageTemplates = None, pool: SenderPool = None, log: logging.Logger = None):
         """
         初始化弹幕姬，传入用户验证信息和房间号
         :type verify: Verify 登陆用户的Verify类
         :type room_id: int 需要连接的房间号
         :type min_interval: int 需要发送的两条弹幕之间的最小间隔时间ms
+        :type burst: int 允许连续发送（不等待间隔）的最大弹幕条数
+        :type queue_size: int 整段文字和普通弹幕队列各自的最大长度，队列满时丢弃该队列最早的弹幕（重要弹幕的队列不限长度）
+        :type max_delay: float 普通弹幕在队列中最长等待时间（秒），超时则丢弃
+        :type gateway: ApiGateway 发送弹幕使用的网络请求网关
+        :type templates: MessageTemplates 编译好的弹幕模板，默认使用 templates.TEMPLATES 中的模板
+        :type pool: SenderPool 发送弹幕的账号，默认只使用 verify 对应的账号（按 min_interval 和 burst 限流）
+        :type log: logging.Logger 日志记录器，默认为 bilibili_live_utils
         """
         self.room_id = room_id
         self.verify = verify
-        self.__prev_time = datetime.now()
         self.minimal_send_interval = min_interval
         self.enable = enable
-        self._log = logging.getLogger('bilibili_live_utils')
+        self.paused = False  # 暂停自动回复时只发送手动输入的弹幕
+        self.max_delay = max_delay
+        self.gateway = gateway if gateway is not None else ApiGateway()
+        self.templates = templates if templates is not None else MessageTemplates.from_config()
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+        self.pool = pool if pool is not None else SenderPool([SenderAccount('main', verify, min_interval, burst)])
+        self.queue_size = queue_size
+        self._lanes = (deque(), deque(), deque())  # 不使用 maxlen，丢弃弹幕时需要计数
+        self._wakeup = asyncio.Event()
+        self._loop = None
+        self._loop_thread = None
+        self._tasks = []  # 每个账号一个发送任务
+        # 统计信息
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0
+        self._latencies = deque(maxlen=100)
+        # 运行指标（提前取得，发送时直接计数）
+        self._sent_metric = metrics.danmaku.labels(room_id, 'sent')
+        self._failed_metric = metrics.danmaku.labels(room_id, 'failed')
+        self._dropped_metric = metrics.danmaku.labels(room_id, 'dropped')
+        self._expired_metric = metrics.danmaku.labels(room_id, 'expired')
+        self._account_metrics = {account.name: (metrics.danmaku_account.labels(room_id, account.name, 'sent'),
+                                                metrics.danmaku_account.labels(room_id, account.name, 'failed'))
+                                 for account in self.pool.accounts}
+        metrics.queue_depth.labels(room_id, 'danmaku').set_function(lambda: self.queue_depth)
+
+    def apply(self, settings):
+        """
+        刷新配置后应用新的弹幕配置（settings.DanmakuSettings），队列中的弹幕保留
+        """
+        self.enable = settings.enable
+        self.templates = settings.templates
+        self.minimal_send_interval = settings.send_interval
+        for account in self.pool.accounts:
+            account.configure(settings.send_interval, settings.send_burst)
+
+    def start(self):
+        """
+        在当前事件循环上为每个账号启动发送任务，需要在连接直播间之前调用
+        """
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        self._tasks = [self._loop.create_task(self._worker(account)) for account in self.pool.accounts]
+
+    def stop(self):
+        """
+        停止发送任务，队列中未发送的弹幕会被丢弃
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        当前排队等待发送的弹幕数量
+        """
+        return sum(len(lane) for lane in self._lanes)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        发送队列占用的内存（字节，估算）
+        """
+        return utils.deep_getsizeof(self._lanes)
+
+    def stats(self) -> dict:
+        """
+        发送队列的统计信息
+        :return: 包含队列长度、发送/丢弃数量和发送延迟（秒）的字典
+        """
+        latencies = list(self._latencies)
+        return {
+            'queue_depth': self.queue_depth,
+            'lanes': [len(lane) for lane in self._lanes],
+            'sent': self.sent_count,
+            'dropped': self.dropped_count,
+            'failed': self.failed_count,
+            'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_max': max(latencies) if latencies else 0.0,
+            'accounts': self.pool.stats(),
+        }
 
     def welcome_enter(self, uname, sex):
         """
         欢迎用户进入直播间
-        :param sex: 进入直播间的用户性别 ['男', '女', '保密']
+        :param sex: 进入直播间的用户性别 ['男', '女', '保密']，模板不使用 ${sex} 时为空字符串（不查询）
         :type uname: str 进入直播间的用户的用户名
         """
-        # TODO: 修改以兼容配置文件写定格式
-        sex = '' if sex == "保密" else sex + "妈妈"
-        content = "欢迎" + sex + uname + "进入直播间"
+        content = self.templates.render('WELCOME_ENTER', uname=uname, sex='' if sex == "保密" else sex)
         self.send(Danmaku(text=content, mode=Danmaku.MODE_BOTTOM, font_size=Danmaku.FONT_SIZE_SMALL))
 
     def welcome_guard(self, uname, guard_type):
@@ -52,7 +157,7 @@ class DanmakuSender(object):
         :type uname: str 进入直播间的用户的用户名
         :type guard_type: str 大航海级别（字符串）
         """
-        content = "喵~欢迎" + guard_type + "大人" + uname + "光临直播间"
+        content = self.templates.render('WELCOME_GUARD', uname=uname, guard_type=guard_type)
         self.send(Danmaku(text=content, mode=Danmaku.MODE_BOTTOM, font_size=Danmaku.FONT_SIZE_SMALL), True)
 
     def thanks_gift(self, uname, giftname, num):
@@ -62,7 +167,7 @@ class DanmakuSender(object):
         :type giftname: str 赠送的礼物名称
         :type num: int 赠送的礼物数量
         """
-        content = "感谢" + uname + "投喂的" + giftname + "x" + str(num)
+        content = self.templates.render('THANK_GIFT', uname=uname, gift_name=giftname, gift_count=num)
         self.send(Danmaku(text=content, mode=Danmaku.MODE_TOP, font_size=Danmaku.FONT_SIZE_SMALL))
 
     def thanks_guard(self, uname, giftname, num):
@@ -72,7 +177,7 @@ class DanmakuSender(object):
         :type giftname: str 开通的大航海类型（字符串）
         :type num: int 开通的月数
         """
-        content = "感谢" + uname + "开通的" + str(num) + "个月" + giftname + "~"
+        content = self.templates.render('THANK_GUARD', uname=uname, guard_type=giftname, gift_count=num)
         self.send(Danmaku(text=content, mode=Danmaku.MODE_TOP, font_size=Danmaku.FONT_SIZE_NORMAL), True)
 
     def thanks_sc(self, uname):
@@ -80,41 +185,112 @@ class DanmakuSender(object):
         感谢醒目留言
         :type uname: str 发送形目留言的用户的用户名
         """
-        content = "感谢" + uname + "发送的醒目留言~"
+        content = self.templates.render('THANK_SC', uname=uname)
         self.send(Danmaku(text=content, mode=Danmaku.MODE_TOP, font_size=Danmaku.FONT_SIZE_NORMAL), True)
 
-    def send_text(self, text, interval: float = 1.5):
+    def send_text(self, text, key=None, manual=False):
         """
         对超长弹幕的预处理，分片发送
-        使用此方法可以自动以30个字拆分弹幕并发送
+        使用此方法可以自动以30个字拆分弹幕并按顺序放入发送队列，分片之间的间隔由限速器控制
         :param text: 要发送的弹幕内容（可以超过30个字）
-        :param interval: 如果弹幕过长需要分多条发送时的间隔
+        :param key: 相同 key 的弹幕由同一个账号发送（如回复同一个观众），保证分片的顺序
+        :param manual: 手动输入的弹幕，暂停自动回复时也发送
         """
-        chunks = [text[i:i + 30] for i in range(0, len(text), 30)]
-        self._log.debug(str(chunks))
+        chunks = [text[i:i + MAX_LENGTH] for i in range(0, len(text), MAX_LENGTH)]
+        self._log.debug("%s", chunks)
         for chunk in chunks:
             if chunk != "":
                 self.send(danmaku=Danmaku(text=chunk, mode=Danmaku.MODE_FLY, font_size=Danmaku.FONT_SIZE_NORMAL),
-                          important=True)
-                time.sleep(interval)
+                          priority=PRIORITY_TEXT, key=key, manual=manual)
 
-    def send(self, danmaku: Danmaku, important=False):
+    def send(self, danmaku: Danmaku, important=False, priority: int = None, key=None, manual=False):
         """
-        发送弹幕，有最短间隔时间
+        把弹幕放入发送队列后立即返回，可以在其他线程中调用
         :type danmaku: Danmaku
-        :type important: bool
+        :type important: bool 重要弹幕进入最高优先级队列，且不会因排队超时被丢弃
+        :type priority: int 直接指定优先级，见 PRIORITY_* 常量
+        :param key: 相同 key 的弹幕由同一个账号发送，见 SenderPool
+        :param manual: 手动输入的弹幕，暂停自动回复时也发送
         """
         # 弹幕功能已禁用
         if not self.enable:
             # self._log.warning("弹幕发送失败，已禁用！" + danmaku.text)
             return
-        try:
-            self._log.info(colored(str("【发送弹幕】" + danmaku.text), 'red', 'on_green'))
-            time_delta = datetime.now() - self.__prev_time
-            if time_delta.microseconds < self.minimal_send_interval and not important:
-                self._log.warning(colored(str("【弹幕发送失败，间隔太短】" + str(time_delta.microseconds) + "ms"), 'yellow', 'on_red'))
-                return
-            live.send_danmaku(room_real_id=self.room_id, danmaku=danmaku, verify=self.verify)
-            self.__prev_time = datetime.now()
-        except Exception as e:
-            self._log.error("弹幕发送失败！" + str(e))
+        if self.paused and not manual:
+            return
+        if priority is None:
+            priority = PRIORITY_IMPORTANT if important else PRIORITY_NORMAL
+        item = (danmaku, priority, time.monotonic(), key)
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._enqueue, item)
+        else:
+            self._enqueue(item)
+
+    def _enqueue(self, item):
+        lane = self._lanes[item[1]]
+        # 重要弹幕（大航海、醒目留言的答谢）从不丢弃，其余队列满时丢弃最早的弹幕
+        if item[1] != PRIORITY_IMPORTANT and len(lane) >= self.queue_size:
+            dropped = lane.popleft()
+            self.dropped_count += 1
+            self._dropped_metric.inc()
+            self._log.warning("【弹幕发送失败，队列已满】%s", dropped[0].text, extra=DROP_STYLE)
+        lane.append(item)
+        self._wakeup.set()
+
+    def _next(self, account: SenderAccount):
+        """
+        按优先级取出下一条该账号可以发送的弹幕，丢弃排队超时的普通弹幕
+        """
+        now = time.monotonic()
+        for lane in self._lanes:
+            i = 0
+            while i < len(lane):
+                item = lane[i]
+                if item[1] == PRIORITY_NORMAL and now - item[2] > self.max_delay:
+                    del lane[i]
+                    self.dropped_count += 1
+                    self._expired_metric.inc()
+                    self._log.warning("【弹幕发送失败，排队超时】%s", item[0].text, extra=DROP_STYLE)
+                    continue
+                if not self.pool.accepts(account, item[3]):
+                    i += 1  # 由其他账号发送
+                    continue
+                del lane[i]
+                self.pool.bind(item[3], account)
+                return item
+        return None
+
+    async def _worker(self, account: SenderAccount):
+        """
+        账号的发送任务：账号可以发送时取出一条弹幕，通过网关调用发送接口
+        """
+        sent_metric, failed_metric = self._account_metrics[account.name]
+        while True:
+            delay = account.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            item = self._next(account)
+            if item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not account.bucket.try_acquire():
+                # 账号被其他直播间抢先使用，放回队列等待下一个令牌
+                self._lanes[item[1]].appendleft(item)
+                continue
+            danmaku = item[0]
+            try:
+                self._log.info("【发送弹幕】%s", danmaku.text, extra=SEND_STYLE)
+                await self.gateway.send_danmaku(self.room_id, danmaku, account.verify)
+                account.report_success()
+                self.sent_count += 1
+                self._sent_metric.inc()
+                sent_metric.inc()
+                self._latencies.append(time.monotonic() - item[2])
+            except Exception as e:
+                account.report_failure(e)
+                self.failed_count += 1
+                self._failed_metric.inc()
+                failed_metric.inc()
+                self._log.error("弹幕发送失败（%s）！%s", account.name, e)
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           events.py
+:project        bilibili_live_utils
+:name           直播间事件
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/24 15:00
+:description    把 bilibili_api 收到的原始事件（多层嵌套的 dict 和按位置取值的 list）包装成带类型的事件对象。
+                事件对象只保存原始数据，字段在访问时才从原始数据中取出，用不到的字段不会被解析。
+                安装了 orjson 且 bilibili_api 是验证过的版本时使用 orjson 解析直播间消息的 JSON
+"""
+
+import json
+
+from scripts import utils
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_REQUIRED = object()
+
+
+def loads(data):
+    """
+    解析 JSON（安装了 orjson 时使用 orjson）
+    """
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """
+    序列化为 UTF-8 编码的 JSON（中文不转义）
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+# 替换 bilibili_api.live 中的 json 只在这些版本上验证过（消息在库内部的私有方法中解析，无法在处理函数中自己解析）
+FAST_JSON_VERSIONS = ('3.2.', )
+
+
+class _FastJson(object):
+    """
+    代替 bilibili_api.live 模块中的 json，只替换解析消息使用的 loads
+    """
+    loads = staticmethod(loads)
+    dumps = staticmethod(json.dumps)
+
+
+def install_fast_json() -> bool:
+    """
+    让 bilibili_api 解析直播间消息时使用 orjson（可以用 uninstall_fast_json 恢复）
+    :return: 是否已替换（没有安装 orjson 或 bilibili_api 不是验证过的版本时不替换）
+    """
+    if orjson is None or not utils.bilibili_api_version().startswith(FAST_JSON_VERSIONS):
+        return False
+    from bilibili_api import live
+    if getattr(live, 'json', None) is not json:
+        return live.json is _FastJson  # 已经替换过，或者被其他代码替换了
+    live.json = _FastJson
+    return True
+
+
+def uninstall_fast_json():
+    """
+    恢复 bilibili_api 原来使用的 json
+    """
+    from bilibili_api import live
+    if live.json is _FastJson:
+        live.json = json
+
+
+class Field(object):
+    """
+    事件的字段：访问时按 keys 依次从事件的 data 中取值
+    """
+    __slots__ = ('keys', 'default')
+
+    def __init__(self, *keys, default=_REQUIRED):
+        """
+        :param keys: 取值的路径（dict 的 key 或 list 的位置）
+        :param default: 取不到时的默认值，不设置时取不到会抛出异常
+        """
+        self.keys = keys
+        self.default = default
+
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        value = event.data
+        try:
+            for key in self.keys:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            if self.default is _REQUIRED:
+                raise
+            return self.default
+        return value if value is not None or self.default is _REQUIRED else self.default
+
+
+class Event(object):
+    """
+    没有专门类型的事件，data 为原始事件中的 data
+    """
+    __slots__ = ('raw', 'data')
+
+    def __init__(self, raw: dict):
+        """
+        :param raw: bilibili_api 传给事件处理函数的原始事件
+        """
+        self.raw = raw
+        self.data = self._payload(raw)
+
+    @staticmethod
+    def _payload(raw: dict):
+        return raw['data']
+
+    @property
+    def type(self) -> str:
+        return self.raw['type']
+
+
+class _CommandEvent(Event):
+    """
+    大多数事件的内容在 data.data 中
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def _payload(raw: dict):
+        return raw['data']['data']
+
+
+class _MedalMixin(object):
+    """
+    带着的粉丝牌（fans_medal / medal_info），没有时为空
+    """
+    __slots__ = ()
+    _medal_key = 'medal_info'
+
+    @property
+    def medal(self) -> dict:
+        return self.data.get(self._medal_key) or {}
+
+
+# {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'VIEW', 'data': 113791}
+class ViewEvent(Event):
+    __slots__ = ()
+    viewers = Field()  # 直播间人气
+
+
+# {'type': 'DANMU_MSG', 'data': {'cmd': 'DANMU_MSG', 'info': [[...], '感觉可以的', [7930172, 'AのFa', ...], ...]}}
+class DanmakuEvent(Event):
+    __slots__ = ()
+    content = Field(1)  # 弹幕内容
+    uid = Field(2, 0)  # 发送者UID
+    uname = Field(2, 1)  # 发送者用户名
+
+    @staticmethod
+    def _payload(raw: dict):
+        return raw['data']['info']
+
+
+# {'type': 'INTERACT_WORD', 'data': {'cmd': 'INTERACT_WORD', 'data': {'uid': 298047096, 'uname': '德物昂Duang', ...}}}
+class EnterEvent(_MedalMixin, _CommandEvent):
+    __slots__ = ()
+    _medal_key = 'fans_medal'
+    uid = Field('uid')
+    uname = Field('uname')
+    msg_type = Field('msg_type', default=1)  # 1：进入直播间
+    identities = Field('identities', default=())
+
+
+# {'type': 'ENTRY_EFFECT', 'data': {'cmd': 'ENTRY_EFFECT', 'data': {'uid': 39832030, 'target_id': 351799197, ...}}}
+class GuardEnterEvent(_CommandEvent):
+    __slots__ = ()
+    uid = Field('uid')
+    up_uid = Field('target_id')  # 主播的UID
+    guard_level = Field('privilege_type')  # 在该直播间的大航海等级（3：舰长，... ）
+    copy_writing = Field('copy_writing')  # "欢迎舰长 <%uname%> 进入直播间"
+
+    @property
+    def uname(self) -> str:
+        copy_writing = str(self.copy_writing)
+        start = copy_writing.find('<%') + 2
+        return copy_writing[start:copy_writing.find('%>', start)]
+
+
+class SuperChatEvent(_MedalMixin, _CommandEvent):
+    __slots__ = ()
+    uid = Field('uid')
+    uname = Field('user_info', 'uname')
+    message = Field('message')
+    price = Field('price')  # 人民币（元）
+
+
+# {'type': 'SEND_GIFT', 'data': {'cmd': 'SEND_GIFT', 'data': {'num': 1, 'uid': 383665082, 'giftName': '小心心', ...}}}
+class GiftEvent(_MedalMixin, _CommandEvent):
+    __slots__ = ()
+    uid = Field('uid')
+    uname = Field('uname')
+    gift_name = Field('giftName')
+    num = Field('num')
+    gold = Field('gold')
+    silver = Field('silver')
+    total_coin = Field('total_coin')
+    coin_type = Field('coin_type')  # gold / silver
+    combo_id = Field('batch_combo_id', default=None)  # 同一次连击的礼物共享这个ID
+
+
+# {'type': 'COMBO_SEND', 'data': {'cmd': 'COMBO_SEND', 'data': {'uid': 3822596, 'total_num': 21, ...}}}
+class ComboEvent(_MedalMixin, _CommandEvent):
+    __slots__ = ()
+    uid = Field('uid')
+    uname = Field('uname')
+    ruid = Field('ruid')  # 收到礼物的主播UID
+    r_uname = Field('r_uname')  # 收到礼物的主播用户名
+    gift_name = Field('gift_name')
+    total_num = Field('total_num')
+    total_coin = Field('combo_total_coin')
+
+    @property
+    def combo_id(self):
+        return self.data.get('batch_combo_id') or self.data.get('combo_id')
+
+
+# {'type': 'GUARD_BUY', 'data': {'cmd': 'GUARD_BUY', 'data': {'uid': 9405475, 'username': '超超超超超超超爱', ...}}}
+class GuardBuyEvent(_CommandEvent):
+    __slots__ = ()
+    uid = Field('uid')
+    uname = Field('username')
+    guard_level = Field('guard_level')
+    num = Field('num')  # 月数
+    price = Field('price')  # 金瓜子
+    gift_name = Field('gift_name')
+
+
+# {'type': 'ROOM_REAL_TIME_MESSAGE_UPDATE', 'data': {'cmd': ..., 'data': {'roomid': 6154037, 'fans': 600657, 'fans_club': 15463}}}
+class FansUpdateEvent(_CommandEvent):
+    __slots__ = ()
+    fans = Field('fans')
+    fans_club = Field('fans_club')
+
+
+# 事件类型对应的事件类，没有列出的使用 Event
+EVENT_TYPES = {
+    'VIEW': ViewEvent,
+    'DANMU_MSG': DanmakuEvent,
+    'INTERACT_WORD': EnterEvent,
+    'ENTRY_EFFECT': GuardEnterEvent,
+    'SUPER_CHAT_MESSAGE': SuperChatEvent,
+    'SEND_GIFT': GiftEvent,
+    'COMBO_SEND': ComboEvent,
+    'GUARD_BUY': GuardBuyEvent,
+    'ROOM_REAL_TIME_MESSAGE_UPDATE': FansUpdateEvent,
+}
+
+
+def decode(raw: dict) -> Event:
+    """
+    把原始事件包装成对应类型的事件对象
+    """
+    return EVENT_TYPES.get(raw['type'], Event)(raw)
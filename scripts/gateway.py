@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           gateway.py
+:project        bilibili_live_utils
+:name           网络请求网关
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/15 10:40
+:description    所有 bilibili_api 和图灵机器人的网络请求都通过这里发出
+                同步的请求放到有界线程池中执行，每种接口有单独的并发上限和超时，不会阻塞事件循环
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from bilibili_api import live, user
+
+from scripts import metrics
+
+# 每种接口的最大并发数
+DEFAULT_LIMITS = {
+    'room_info': 2,
+    'dahanghai': 4,
+    'relation_info': 4,
+    'user_info': 2,
+    'send_danmaku': 2,
+    'turing': 4,
+}
+
+
+class ApiGateway(object):
+
+    def __init__(self, max_workers: int = 16, timeout: float = 10, limits: dict = None, timeouts: dict = None):
+        """
+        初始化网关
+        :param max_workers: 线程池大小，即同时进行的网络请求总数上限
+        :param timeout: 默认超时时间（秒），只计算取得并发名额之后的请求时间，不包括排队等待的时间
+        :param limits: 每种接口的最大并发数 {接口名: 并发数}，未指定的使用 DEFAULT_LIMITS
+        :param timeouts: 每种接口的超时时间 {接口名: 秒}
+        """
+        self.timeout = timeout
+        self._limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._timeouts = dict(timeouts or {})
+        self._semaphores = {}
+        self._metrics = {}  # {接口名: (耗时直方图, 超时计数)}
+        self._executor = ThreadPoolExecutor(max_workers, 'ApiGateway')
+        # 长连接复用的 HTTP 会话（图灵机器人等直接发出的请求使用）
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._log = logging.getLogger('bilibili_live_utils')
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self._limits.get(endpoint, 2))
+        return semaphore
+
+    def _metric(self, endpoint: str) -> tuple:
+        endpoint_metrics = self._metrics.get(endpoint)
+        if endpoint_metrics is None:
+            endpoint_metrics = self._metrics[endpoint] = (metrics.api_latency.labels(endpoint),
+                                                          metrics.api_errors.labels(endpoint, 'timeout'))
+        return endpoint_metrics
+
+    async def call(self, endpoint: str, func, *args, **kwargs):
+        """
+        在线程池中执行同步的网络请求
+        :param endpoint: 接口名，用于区分并发上限和超时
+        :param func: 要执行的同步方法
+        :return: func 的返回值
+        :raise asyncio.TimeoutError: 请求超时时抛出（只计算取得并发名额之后的请求时间，不包括排队时间）
+        """
+        timeout = self._timeouts.get(endpoint, self.timeout)
+        future = await self._submit(endpoint, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._metric(endpoint)[1].inc()
+            raise
+
+    async def _submit(self, endpoint: str, func) -> asyncio.Future:
+        """
+        等待取得并发名额后把请求交给线程池
+        :return: 请求的 Future
+        """
+        semaphore = self._semaphore(endpoint)
+        latency = self._metric(endpoint)[0]
+        await semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            future = asyncio.get_event_loop().run_in_executor(self._executor, func)
+        except Exception:
+            semaphore.release()
+            raise
+
+        # 超时后线程仍在运行，直到请求真正结束才释放并发名额
+        def on_done(f):
+            semaphore.release()
+            latency.observe(time.perf_counter() - start)
+            if not f.cancelled() and f.exception() is not None:
+                metrics.api_errors.labels(endpoint, type(f.exception()).__name__).inc()
+                self._log.debug("接口 %s 请求失败：%s", endpoint, f.exception())
+        future.add_done_callback(on_done)
+        return future
+
+    async def get_room_info(self, room_id: int, verify):
+        return await self.call('room_info', live.get_room_info, room_id, verify)
+
+    async def get_room_play_info(self, room_id: int, verify):
+        return await self.call('room_info', live.get_room_play_info, room_id, verify=verify)
+
+    async def get_chat_conf(self, room_real_id: int, verify):
+        return await self.call('room_info', live.get_chat_conf, room_real_id, verify=verify)
+
+    async def get_self_info(self, verify):
+        return await self.call('user_info', user.get_self_info, verify)
+
+    async def get_dahanghai_page(self, room_real_id: int, ruid: int, page: int, verify):
+        return await self.call('dahanghai', live.get_dahanghai_raw, room_real_id, ruid, page, verify=verify)
+
+    async def get_relation_info(self, uid: int, verify):
+        return await self.call('relation_info', user.get_relation_info, uid=uid, verify=verify)
+
+    async def get_user_info(self, uid: int, verify):
+        return await self.call('user_info', user.get_user_info, uid=uid, verify=verify)
+
+    async def send_danmaku(self, room_id: int, danmaku, verify):
+        return await self.call('send_danmaku', live.send_danmaku, room_real_id=room_id, danmaku=danmaku, verify=verify)
+
+    async def post_json(self, endpoint: str, url: str, body: dict):
+        """
+        使用复用的会话发送 JSON POST 请求
+        :return: 解析后的 JSON 响应
+        """
+        timeout = self._timeouts.get(endpoint, self.timeout)
+        return await self.call(endpoint, lambda: self._session.post(url, json=body, timeout=timeout).json())
+
+    def shutdown(self):
+        """
+        关闭线程池和 HTTP 会话
+        """
+        self._executor.shutdown(wait=False)
+        self._session.close()
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           gift_aggregator.py
+:project        bilibili_live_utils
+:name           礼物答谢合并
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/14 11:05
+:description    把一段时间窗口内同一用户的同一种礼物（包括连击）合并成一条答谢弹幕
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from scripts import utils
+
+
+class _GiftGroup(object):
+    __slots__ = ('uname', 'loose', 'combo_ids', 'coin', 'first_seen')
+
+    def __init__(self, uname):
+        self.uname = uname
+        self.loose = 0  # 没有连击ID的礼物数量
+        self.combo_ids = set()  # 属于这一组的连击ID
+        self.coin = 0  # 总价值（瓜子），窗口内答谢名额不够时优先答谢价值高的
+        self.first_seen = time.monotonic()
+
+
+class GiftAggregator(object):
+
+    def __init__(self, on_flush, window: float = 5.0, max_groups: int = 3, max_pending: int = 100,
+                 combo_memory: int = 1000, log: logging.Logger = None):
+        """
+        初始化礼物合并器
+        :param on_flush: 答谢回调 on_flush(uname, giftname, num)，一般为 DanmakuSender.thanks_gift
+        :param window: 合并窗口长度（秒），每个窗口结束时发送一次答谢
+        :param max_groups: 每个窗口最多答谢的组数，剩下的留到下一个窗口
+        :param max_pending: 最多保留的待答谢组数，加入新的组时超出则丢弃价值最低的组
+        :param combo_memory: 记住的连击ID数量，用来避免同一连击被重复答谢
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.on_flush = on_flush
+        self.window = window
+        self.max_groups = max_groups
+        self.max_pending = max_pending
+        self._combo_memory = combo_memory
+        self._groups = {}  # {(uid, giftname): _GiftGroup}
+        self._combos = OrderedDict()  # {combo_id: [已知总数, 已答谢数]}
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+        self._task = None
+
+    def start(self):
+        """
+        在当前事件循环上启动定时合并任务
+        """
+        self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    def stop(self):
+        """
+        停止定时合并任务，并立即答谢剩余的礼物
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        while self._groups:
+            self.flush()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        等待答谢的礼物和记住的连击ID占用的内存（字节，估算）
+        """
+        return utils.deep_getsizeof((self._groups, self._combos))
+
+    @property
+    def pending(self) -> int:
+        """
+        当前等待答谢的组数
+        """
+        return len(self._groups)
+
+    def add_gift(self, uid, uname: str, giftname: str, num: int, combo_id: str = None, coin: int = 0):
+        """
+        记录一次 SEND_GIFT 事件
+        :param combo_id: 礼物的 batch_combo_id，没有则按普通礼物累加
+        :param coin: 礼物总价值
+        """
+        group = self._group(uid, uname, giftname)
+        group.coin += coin
+        if not combo_id:
+            group.loose += num
+            return
+        self._combo(combo_id)[0] += num
+        group.combo_ids.add(combo_id)
+
+    def add_combo(self, uid, uname: str, giftname: str, total_num: int, combo_id: str, coin: int = 0):
+        """
+        记录一次 COMBO_SEND 事件，连击事件带有该连击的累计数量
+        :param combo_id: 连击的 batch_combo_id / combo_id
+        :param coin: 连击总价值
+        """
+        counts = self._combo(combo_id)
+        if total_num <= counts[0]:
+            return
+        counts[0] = total_num
+        group = self._group(uid, uname, giftname)
+        group.coin = max(group.coin, coin)
+        group.combo_ids.add(combo_id)
+
+    def flush(self):
+        """
+        答谢价值最高的 max_groups 组礼物，其余的留到下一个窗口
+        """
+        if not self._groups:
+            return
+        ranked = sorted(self._groups.items(), key=lambda kv: (-kv[1].coin, kv[1].first_seen))
+        for key, group in ranked[:self.max_groups]:
+            del self._groups[key]
+            num = group.loose
+            for combo_id in group.combo_ids:
+                counts = self._combos.get(combo_id)
+                if counts is not None:
+                    num += counts[0] - counts[1]
+                    counts[1] = counts[0]
+            if num > 0:
+                self.on_flush(group.uname, key[1], num)
+
+    def _group(self, uid, uname, giftname) -> _GiftGroup:
+        key = (uid, giftname)
+        group = self._groups.get(key)
+        if group is None:
+            if self._groups and len(self._groups) >= self.max_pending:
+                # 礼物刷屏时待答谢的组数不超过上限：丢弃价值最低的组（价值相同时丢弃最新的）
+                lowest = min(self._groups, key=lambda k: (self._groups[k].coin, -self._groups[k].first_seen))
+                dropped = self._groups.pop(lowest)
+                self._log.debug("礼物答谢队列已满，丢弃：%s %s", dropped.uname, lowest[1])
+            group = self._groups[key] = _GiftGroup(uname)
+        return group
+
+    def _combo(self, combo_id) -> list:
+        counts = self._combos.get(combo_id)
+        if counts is None:
+            counts = self._combos[combo_id] = [0, 0]
+            if len(self._combos) > self._combo_memory:
+                self._combos.popitem(last=False)
+        return counts
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                self._log.error("礼物答谢合并失败！%s", e)
@@ -0,0 +1,224 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           guard_roster.py
+:project        bilibili_live_utils
+:name           大航海成员列表
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/21 11:00
+:description    增量维护直播间的大航海成员：收到上舰事件时直接更新并记录到期时间，
+                只在每日定时任务或发现列表和实际不一致时，在后台并发分页重新获取完整列表
+"""
+
+import asyncio
+import logging
+import time
+
+from scripts import utils
+
+# 上舰一个月按30天计算到期时间
+MONTH = 30 * 24 * 3600
+
+
+class _Guard(object):
+    __slots__ = ('level', 'expire', 'updated')
+
+    def __init__(self, level: int, expire: float = None, updated: float = 0.0):
+        self.level = level  # 大航海等级（1：总督，2：提督，3：舰长）
+        self.expire = expire  # 到期时间戳，None 表示未知（来自完整列表）
+        self.updated = updated  # 最后一次由上舰事件更新的时间
+
+
+class GuardRoster(object):
+
+    def __init__(self, room_id: int, gateway, verify=None, resync_interval: float = 600, on_change=None,
+                 log: logging.Logger = None):
+        """
+        初始化大航海成员列表
+        :param room_id: 直播间房间号
+        :param gateway: 网络请求网关
+        :param resync_interval: 发现不一致时，两次重新获取完整列表的最小间隔（秒）
+        :param on_change: 成员变化后调用的回调（参数为 snapshot()），用于保存列表
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.room_id = room_id
+        self.gateway = gateway
+        self.verify = verify
+        self.resync_interval = resync_interval
+        self.room_real_id = room_id
+        self.ruid = None  # 主播的UID
+        self.total = 0  # 最近一次完整列表中接口返回的成员总数
+        self._members = {}  # {uid: _Guard}
+        self.on_change = on_change
+        self._task = None
+        self._last_sync = float('-inf')
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+
+    def __len__(self):
+        return len(self._members)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        大航海成员列表占用的内存（字节，估算）
+        """
+        return utils.deep_getsizeof(self._members)
+
+    def __contains__(self, uid):
+        return self.get(uid) != 0
+
+    def get(self, uid) -> int:
+        """
+        获取用户的大航海等级，不是大航海成员（或已到期）时返回 0
+        """
+        guard = self._members.get(uid)
+        if guard is None:
+            return 0
+        if guard.expire is not None and guard.expire < time.time():
+            del self._members[uid]
+            return 0
+        return guard.level
+
+    def as_dict(self) -> dict:
+        """
+        当前所有大航海成员 {uid: 大航海等级}
+        """
+        self.expire()
+        return {uid: guard.level for uid, guard in self._members.items()}
+
+    def snapshot(self) -> dict:
+        """
+        当前所有大航海成员 {uid: (大航海等级, 到期时间戳或 None)}，用于保存和恢复
+        """
+        return {uid: (guard.level, guard.expire) for uid, guard in self._members.items()}
+
+    def restore(self, members: dict):
+        """
+        恢复上次保存的列表（已到期的成员不恢复），之后仍应在后台重新获取完整列表
+        :param members: snapshot() 的返回值
+        """
+        now = time.time()
+        self._members = {uid: _Guard(level, expire) for uid, (level, expire) in members.items()
+                         if expire is None or expire >= now}
+        self._log.info("读取了上次保存的大航海列表，共%d个成员", len(self._members))
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.snapshot())
+
+    def configure(self, room_real_id: int, ruid: int):
+        """
+        设置获取完整列表需要的真实房间号和主播UID（来自直播间信息，省去一次查询）
+        """
+        self.room_real_id = room_real_id
+        self.ruid = ruid
+
+    def apply_purchase(self, uid, guard_level: int, num: int = 1):
+        """
+        根据上舰事件更新成员：等级取更高的一个（数字更小），到期时间顺延 num 个月
+        """
+        now = time.time()
+        guard = self._members.get(uid)
+        if guard is None:
+            self._members[uid] = _Guard(guard_level, now + num * MONTH, now)
+        else:
+            guard.level = min(guard.level, guard_level) if guard.level else guard_level
+            guard.expire = max(guard.expire or now, now) + num * MONTH
+            guard.updated = now
+        self._changed()
+
+    def observe(self, uid, guard_level: int):
+        """
+        根据其他事件（如舰长进入直播间）核对成员，不一致时在后台重新获取完整列表
+        """
+        if guard_level and self.get(uid) != guard_level:
+            self._log.debug("大航海列表与实际不一致：%s 应为 %s，当前记录为 %s", uid, guard_level, self.get(uid))
+            self.resync()
+
+    def expire(self) -> int:
+        """
+        移除已到期的成员
+        :return: 移除的数量
+        """
+        now = time.time()
+        expired = [uid for uid, guard in self._members.items() if guard.expire is not None and guard.expire < now]
+        for uid in expired:
+            del self._members[uid]
+        return len(expired)
+
+    def resync(self, force: bool = False) -> bool:
+        """
+        在后台重新获取完整列表（已在获取中，或距离上次获取不足 resync_interval 时跳过）
+        :param force: 忽略最小间隔
+        :return: 是否开始获取
+        """
+        if self._task is not None and not self._task.done():
+            return False
+        if not force and time.monotonic() - self._last_sync < self.resync_interval:
+            return False
+        self._last_sync = time.monotonic()
+        self._task = asyncio.get_event_loop().create_task(self._resync())
+        return True
+
+    async def _resync(self):
+        try:
+            await self.reconcile()
+        except Exception as e:
+            self._log.error("获取大航海列表失败！%r", e)
+
+    async def reconcile(self):
+        """
+        获取完整的大航海列表并与当前记录合并：获取期间收到的上舰事件保留，已知的到期时间保留
+        """
+        started = time.time()
+        self._last_sync = time.monotonic()
+        fetched = await self.fetch()
+        members = {}
+        for uid, level in fetched.items():
+            guard = self._members.get(uid)
+            members[uid] = _Guard(level, guard.expire if guard is not None else None,
+                                  guard.updated if guard is not None else 0.0)
+        for uid, guard in self._members.items():
+            if guard.updated >= started:
+                members[uid] = guard
+        added = len(members.keys() - self._members.keys())
+        removed = len(self._members.keys() - members.keys())
+        self._members = members
+        self._changed()
+        self._log.info("大航海列表已同步，当前船上有%d个成员（新增%d，移除%d）", len(members), added, removed)
+
+    async def fetch(self) -> dict:
+        """
+        分页获取完整的大航海列表：先获取第一页得到总页数，其余页并发获取（并发数由网关限制）
+        :return: {uid: 大航海等级}
+        """
+        if self.ruid is None:
+            play_info = await self.gateway.get_room_play_info(self.room_id, self.verify)
+            self.room_real_id = play_info['room_id']
+            self.ruid = play_info['uid']
+        first = await self.gateway.get_dahanghai_page(self.room_real_id, self.ruid, 1, self.verify)
+        info = first.get('info') or {}
+        self.total = info.get('num', 0)
+        pages = [first]
+        if 'page' in info:
+            pages += await asyncio.gather(*(self.gateway.get_dahanghai_page(self.room_real_id, self.ruid, page,
+                                                                             self.verify)
+                                            for page in range(2, info['page'] + 1)))
+        else:
+            # 没有总页数时依次获取，直到返回空页
+            page = 2
+            while pages[-1]['list']:
+                pages.append(await self.gateway.get_dahanghai_page(self.room_real_id, self.ruid, page, self.verify))
+                page += 1
+        members = {}
+        for user in (first.get('top3') or []):
+            members[user['uid']] = user['guard_level']
+        for resp in pages:
+            for user in resp['list']:
+                members[user['uid']] = user['guard_level']
+        if self.total and self.total != len(members):
+            self._log.debug("大航海列表数量不一致：接口返回总数 %d，实际获取 %d", self.total, len(members))
+        return members
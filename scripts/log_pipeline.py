@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           log_pipeline.py
+:project        bilibili_live_utils
+:name           日志输出管道
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/20 16:20
+:description    事件循环上只把日志记录放进队列，格式化、上色和写文件都在后台的写日志线程中进行，
+                文件一批记录只写入一次。
+                日志颜色通过 extra=style(...) 指定，只在控制台输出时添加，文件中不会出现颜色标记
+"""
+
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler
+
+from termcolor import colored
+
+
+def style(color: str = None, on_color: str = None, attrs: list = None) -> dict:
+    """
+    日志颜色，用法：log.info("收到弹幕 %s", text, extra=style('blue'))
+    热路径上请提前生成并复用返回的字典
+    """
+    return {'color': (color, on_color, attrs)}
+
+
+class ColorFormatter(logging.Formatter):
+    """
+    控制台使用的格式，按日志记录的 color 属性给日志内容上色
+    """
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        color = getattr(record, 'color', None)
+        if color is not None:
+            record.message = colored(record.message, *color)
+        return super(ColorFormatter, self).formatMessage(record)
+
+
+class BatchFileHandler(logging.FileHandler):
+    """
+    每条日志只写入文件缓冲区，由写日志线程在一批日志处理完后统一 flush
+    """
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    直接把日志记录放入队列，不在调用线程中格式化（队列只在进程内使用，不需要序列化）
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogPipeline(object):
+
+    def __init__(self, handlers: list, batch_size: int = 256):
+        """
+        初始化日志管道
+        :param handlers: 在写日志线程中执行的 Handler
+        :param batch_size: 一次最多处理多少条日志后 flush
+        """
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.handler = _LazyQueueHandler(self.queue)
+        self._thread = None
+
+    def start(self):
+        """
+        启动写日志线程
+        """
+        self._thread = threading.Thread(target=self._run, name='LogPipeline', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        写完队列中剩余的日志后结束写日志线程
+        """
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is None:
+                    self._flush()
+                    return
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            self._flush()
+
+    def _flush(self):
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
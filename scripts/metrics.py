@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           metrics.py
+:project        bilibili_live_utils
+:name           运行指标
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/20 10:30
+:description    计数器、直方图和仪表盘指标，以 Prometheus 文本格式通过本地 HTTP 接口导出，也可以定时写入文件。
+                每组标签的指标在第一次使用时创建并缓存，热路径上应提前取得（labels()）后直接调用 inc / observe，
+                记录指标只是整数加法，不经过日志
+"""
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认的延迟直方图分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 重连耗时（秒）的分桶
+RECONNECT_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+
+
+class Counter(object):
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(object):
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None  # 导出时调用，返回当前值
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """
+        导出时才调用 function() 获取当前值（如队列长度），平时不产生任何开销
+        """
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metric(object):
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: tuple, factory):
+        """
+        一个指标及其所有标签组合
+        :param kind: counter / gauge / histogram
+        :param labelnames: 标签名
+        :param factory: 创建一组标签对应的值对象
+        """
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}  # {标签值: Counter / Gauge / Histogram}
+
+    def labels(self, *values):
+        """
+        获取一组标签对应的值对象，不存在时创建
+        """
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            assert len(values) == len(self.labelnames), self.name + ' 需要的标签：' + str(self.labelnames)
+            child = self._children[values] = self._factory()
+        return child
+
+    def remove(self, *values):
+        self._children.pop(tuple(str(v) for v in values), None)
+
+    def render(self) -> list:
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.kind)]
+        for values, child in list(self._children.items()):
+            labels = ','.join('%s="%s"' % (k, _escape(v)) for k, v in zip(self.labelnames, values))
+            if self.kind == 'histogram':
+                total = 0
+                for bound, count in zip(child.buckets + (float('inf'), ), list(child.counts)):
+                    total += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_bucket{%s} %d' % (self.name, _join(labels, 'le="%s"' % le), total))
+                lines.append('%s_sum{%s} %r' % (self.name, labels, child.sum))
+                lines.append('%s_count{%s} %d' % (self.name, labels, total))
+            else:
+                value = child.get() if self.kind == 'gauge' else child.value
+                lines.append('%s{%s} %s' % (self.name, labels, _format(value)))
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _join(labels: str, extra: str) -> str:
+    return labels + ',' + extra if labels else extra
+
+
+def _format(value) -> str:
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class MetricsRegistry(object):
+
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register(Metric('counter', name, documentation, labelnames, Counter))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Metric:
+        return self._register(Metric('gauge', name, documentation, labelnames, Gauge))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Metric:
+        return self._register(Metric('histogram', name, documentation, labelnames, lambda: Histogram(buckets)))
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        以 Prometheus 文本格式输出所有指标
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str):
+        """
+        把所有指标写入文件（先写临时文件再替换，读取的一方不会读到写了一半的文件）
+        """
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+class MetricsServer(object):
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9108):
+        """
+        在后台线程中提供 http://host:port/metrics 接口
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# 全局的指标
+registry = MetricsRegistry()
+events = registry.counter('bilibili_events_total', '收到的直播间事件数', ('room', 'type'))
+handler_latency = registry.histogram('bilibili_handler_latency_seconds', '事件处理函数的耗时', ('room', 'handler'))
+danmaku = registry.counter('bilibili_danmaku_total', '弹幕发送结果（sent / failed / dropped / expired）', ('room', 'result'))
+api_latency = registry.histogram('bilibili_api_latency_seconds', '网络请求的耗时', ('endpoint', ))
+api_errors = registry.counter('bilibili_api_errors_total', '网络请求失败次数', ('endpoint', 'error'))
+queue_depth = registry.gauge('bilibili_queue_depth', '队列长度', ('room', 'queue'))
+guards = registry.gauge('bilibili_guards', '当前大航海成员数', ('room', ))
+reconnect_latency = registry.histogram('bilibili_reconnect_seconds', '直播间断线到重新收到事件的时间', ('room', ),
+                                       buckets=RECONNECT_BUCKETS)
+events_lost = registry.counter('bilibili_events_lost_total', '按断线前的事件速率估算的断线期间丢失的事件数', ('room', ))
+danmaku_rejected = registry.counter('bilibili_danmaku_rejected_total', '被刷屏过滤的弹幕（rate / duplicate / busy）',
+                                    ('room', 'reason'))
+danmaku_account = registry.counter('bilibili_danmaku_account_total', '每个账号的弹幕发送结果（sent / failed）',
+                                   ('room', 'account', 'result'))
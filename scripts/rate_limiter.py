@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           rate_limiter.py
+:project        bilibili_live_utils
+:name           令牌桶限流器
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/13 16:20
+:description    按固定速率补充令牌，令牌不足时等待，用于控制弹幕发送频率
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        初始化令牌桶
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量（允许的最大突发数量）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    @property
+    def tokens(self) -> float:
+        """
+        当前可用的令牌数
+        """
+        self._refill()
+        return self._tokens
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """
+        距离可以取得指定数量令牌还需要等待的秒数
+        :param tokens: 需要的令牌数
+        :return: 需要等待的秒数，0 表示可以立即取得
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        尝试立即取得令牌，不等待
+        :param tokens: 需要的令牌数
+        :return: 是否取得成功
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        异步等待直到取得令牌
+        :param tokens: 需要的令牌数
+        """
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
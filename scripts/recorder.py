@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           recorder.py
+:project        bilibili_live_utils
+:name           直播间事件录制
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/17 20:15
+:description    把直播间的所有事件按批压缩写入文件（每场直播一个文件），并提供可按时间和事件类型查找的读取器
+                文件格式：<房间号>_<开始时间>.jsonl.gz 由多个独立的 gzip 块拼接而成，每块是一批 JSON 行，
+                同名的 .idx 文件每行记录一块的位置、时间范围和包含的事件类型
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from scripts import events, utils
+
+
+class EventRecorder(object):
+
+    def __init__(self, directory: str, room_id: int, batch_size: int = 500, flush_interval: float = 2.0,
+                 log: logging.Logger = None):
+        """
+        初始化事件录制器
+        :param directory: 录制文件保存的目录
+        :param room_id: 直播间房间号（用于文件名）
+        :param batch_size: 缓存多少个事件后写入一次
+        :param flush_interval: 最长多少秒写入一次
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.directory = directory
+        self.room_id = room_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self._buffer = []
+        self._executor = ThreadPoolExecutor(1, 'EventRecorder')  # 单线程，保证写入顺序
+        self._task = None
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+        os.makedirs(directory, exist_ok=True)
+        self.rotate()
+
+    def start(self):
+        """
+        在当前事件循环上启动定时写入任务
+        """
+        self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    def stop(self):
+        """
+        停止定时写入，并写入剩余的事件（等待写入完成）
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.submit(self._write_batch, self.path, self._swap())
+        self._executor.shutdown(wait=True)
+
+    @property
+    def pending(self) -> int:
+        """
+        缓存中等待写入的事件数
+        """
+        return len(self._buffer)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        缓存中等待写入的事件占用的内存（字节，估算）
+        """
+        return utils.deep_getsizeof(self._buffer)
+
+    def record(self, msg: dict):
+        """
+        记录一个事件，只放入内存缓存，由后台线程写入文件
+        """
+        self._buffer.append((time.time(), msg))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        把缓存的事件交给后台线程写入
+        """
+        if self._buffer:
+            self._executor.submit(self._write_batch, self.path, self._swap())
+
+    def rotate(self):
+        """
+        开始一个新的录制文件（每场直播开始、结束时调用）
+        """
+        if self.path is not None:
+            self.flush()
+        self.path = os.path.join(self.directory, '%d_%s.jsonl.gz' % (
+            self.room_id, datetime.now().strftime('%Y%m%d_%H%M%S')))
+        self._log.info("录制直播间事件到：%s", os.path.abspath(self.path))
+
+    def _swap(self) -> list:
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    def _write_batch(self, path: str, batch: list):
+        if not batch:
+            return
+        try:
+            lines = []
+            types = {}
+            for ts, msg in batch:
+                lines.append(events.dumps(dict(msg, ts=ts)))
+                types[msg['type']] = types.get(msg['type'], 0) + 1
+            block = gzip.compress(b'\n'.join(lines) + b'\n')
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(block)
+            entry = {'offset': offset, 'length': len(block), 'start': batch[0][0], 'end': batch[-1][0],
+                     'count': len(batch), 'types': types}
+            with open(path + '.idx', 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except Exception as e:
+            self._log.error("写入录制文件失败！%s", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+
+class RecordReader(object):
+
+    def __init__(self, path: str):
+        """
+        打开录制文件，读取它的索引
+        :param path: .jsonl.gz 录制文件路径
+        """
+        self.path = path
+        self.index = []
+        if os.path.exists(path + '.idx'):
+            with open(path + '.idx', encoding='utf-8') as f:
+                self.index = [json.loads(line) for line in f if line.strip()]
+
+    @property
+    def count(self) -> int:
+        """
+        文件中的事件总数
+        """
+        return sum(entry['count'] for entry in self.index)
+
+    def read(self, start: float = None, end: float = None, types=None):
+        """
+        按时间范围和事件类型读取事件，只解压索引中符合条件的块
+        :param start: 开始时间戳（包含），None 表示不限
+        :param end: 结束时间戳（包含），None 表示不限
+        :param types: 要读取的事件类型集合，None 表示全部
+        :return: 事件的生成器，每个事件带有录制时间 'ts'
+        """
+        types = set(types) if types else None
+        with open(self.path, 'rb') as f:
+            for entry in self.index:
+                if start is not None and entry['end'] < start:
+                    continue
+                if end is not None and entry['start'] > end:
+                    break
+                if types is not None and types.isdisjoint(entry['types']):
+                    continue
+                f.seek(entry['offset'])
+                for line in gzip.decompress(f.read(entry['length'])).splitlines():
+                    msg = events.loads(line)
+                    if start is not None and msg['ts'] < start:
+                        continue
+                    if end is not None and msg['ts'] > end:
+                        break
+                    if types is None or msg['type'] in types:
+                        yield msg
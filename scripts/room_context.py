@@ -0,0 +1,619 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           room_context.py
+:project        bilibili_live_utils
+:name           直播间上下文
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/18 19:40
+:description    一个直播间的全部状态（弹幕发送器、大航海成员、已欢迎观众、直播状态等）和事件处理函数，
+                网关、缓存、图灵机器人等共享服务由 Supervisor 提供
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+import types
+from collections import deque
+
+from bilibili_api import live
+
+from scripts import events, metrics, startup, utils
+from scripts.cache import ExpiringSet
+from scripts.connection import ConnectionManager
+from scripts.danmaku_sender import DanmakuSender
+from scripts.log_pipeline import style
+from scripts.gift_aggregator import GiftAggregator
+from scripts.guard_roster import GuardRoster
+from scripts.scheduler import IntervalTrigger
+from scripts.sender_pool import SenderPool
+from scripts.spam_filter import REJECT_BUSY, SpamFilter
+
+
+# 日志颜色（只在控制台显示）
+BOLD = style(attrs=['bold', ])
+DANMAKU_STYLE = style('blue')
+ENTER_STYLE = style('white')
+GUARD_ENTER_STYLE = style('green')
+SUPER_CHAT_STYLE = style('red')
+GIFT_STYLE = style('magenta')
+COMBO_STYLE = style('yellow')
+GUARD_BUY_STYLE = style('red')
+LIVE_STATUS_STYLE = style('red', 'on_yellow')
+FANS_STYLE = style('yellow')
+TURING_ERROR_STYLE = style('yellow', 'on_magenta', ['bold', ])
+NOTICE_STYLE = style(on_color='on_yellow')
+
+
+def _room_summary(room_info: dict) -> dict:
+    """
+    从 get_room_info 的结果中取出连接直播间需要的信息（保存在本地状态存储中，下次启动时直接使用）
+    """
+    return {
+        'live_status': room_info['room_info']['live_status'],
+        'live_start_time': room_info['room_info'].get('live_start_time', 0),
+        'room_id': room_info['room_info'].get('room_id'),
+        'uid': room_info['room_info'].get('uid'),
+        'uname': room_info['anchor_info']['base_info']['uname'],
+        'medal_name': room_info['anchor_info']['medal_info']['medal_name'],
+    }
+
+
+# 定时弹幕因发送队列积压推迟后，每隔多少秒重新检查一次
+NOTICE_RETRY = 60
+
+
+class RoomLogAdapter(logging.LoggerAdapter):
+    """
+    在日志前加上房间号，区分不同直播间的日志
+    """
+    def process(self, msg, kwargs):
+        return self.extra['prefix'] + str(msg), kwargs
+
+
+class RoomContext(object):
+
+    def __init__(self, room_id: int, supervisor):
+        """
+        初始化直播间上下文，注册事件处理函数
+        :param room_id: 直播间房间号
+        :param supervisor: Supervisor 提供配置和共享服务
+        """
+        config = supervisor.config
+        settings = supervisor.settings
+        self.room_id = room_id
+        self.supervisor = supervisor
+        self.config = config
+        self.settings = settings  # 配置快照，刷新配置时整体替换
+        self.log = RoomLogAdapter(logging.getLogger('bilibili_live_utils.' + str(room_id)), {'prefix': '[' + str(room_id) + ']'})
+        # 断线重连由 ConnectionManager 负责（带退避），关闭库自带的立即重连
+        self.room = live.LiveDanmaku(room_display_id=room_id, verify=supervisor.verify, should_reconnect=False)
+        self.connection = ConnectionManager(self.room, room_id, on_reconnect=self._on_reconnect,
+                                            on_connect=self._on_connect,
+                                            base_delay=config.getfloat('CONNECTION', 'RECONNECT_BASE', fallback=1),
+                                            max_delay=config.getfloat('CONNECTION', 'RECONNECT_MAX', fallback=60),
+                                            stable_after=config.getfloat('CONNECTION', 'STABLE_AFTER', fallback=60),
+                                            max_retries=config.getint('CONNECTION', 'MAX_RETRIES', fallback=0),
+                                            gateway=supervisor.gateway, log=self.log)
+        self.ds = DanmakuSender(room_id=room_id, verify=supervisor.verify, enable=settings.danmaku.enable,
+                                min_interval=settings.danmaku.send_interval, burst=settings.danmaku.send_burst,
+                                gateway=supervisor.gateway, templates=settings.danmaku.templates,
+                                pool=SenderPool(supervisor.accounts,
+                                                sticky_ttl=config.getfloat('SENDER', 'STICKY_TTL', fallback=120)),
+                                log=self.log)
+        self.gifts = GiftAggregator(on_flush=self.ds.thanks_gift, window=settings.danmaku.gift_merge_window,
+                                    max_groups=settings.danmaku.gift_merge_max, log=self.log)
+        welcome_cooldown = settings.danmaku.welcome_cooldown
+        # 已经欢迎过的观众（下播时重置，也可以设置冷却时间后重新欢迎）
+        self.welcomed = ExpiringSet(maxsize=config.getint('DANMAKU', 'WELCOMED_MAX', fallback=50000),
+                                    ttl=welcome_cooldown * 60 if welcome_cooldown > 0 else None)
+        self.recorder = None  # 直播间事件录制器（未启用时为 None）
+        if config.getboolean('RECORDER', 'ENABLE', fallback=False):
+            from scripts.recorder import EventRecorder  # 可选的组件只在启用时导入，减少启动时间
+            self.recorder = EventRecorder(directory=config.get('RECORDER', 'DIR', fallback='records'), room_id=room_id,
+                                          batch_size=config.getint('RECORDER', 'BATCH', fallback=500),
+                                          flush_interval=config.getfloat('RECORDER', 'FLUSH_INTERVAL', fallback=2),
+                                          log=self.log)
+        self.analytics = None  # 弹幕统计（未启用时为 None）
+        self.analytics_snapshots = deque(maxlen=config.getint('ANALYTICS', 'KEEP', fallback=144))  # 最近的统计快照
+        self.analytics_file = config.get('ANALYTICS', 'FILE', fallback='')  # 统计快照追加写入的文件（留空则不写入）
+        if config.getboolean('ANALYTICS', 'ENABLE', fallback=False):
+            from scripts.analytics import ChatAnalytics
+            self.analytics = ChatAnalytics(window=config.getfloat('ANALYTICS', 'WINDOW', fallback=10) * 60,
+                                           buckets=config.getint('ANALYTICS', 'BUCKETS', fallback=10),
+                                           top_n=config.getint('ANALYTICS', 'TOP_N', fallback=10))
+        # 触发自动回复的弹幕先经过刷屏过滤
+        self.spam_filter = SpamFilter(room_id, enable=config.getboolean('SPAM_FILTER', 'ENABLE', fallback=False),
+                                      user_rate=config.getfloat('SPAM_FILTER', 'USER_RATE', fallback=6),
+                                      user_burst=config.getint('SPAM_FILTER', 'USER_BURST', fallback=2),
+                                      duplicate_window=config.getfloat('SPAM_FILTER', 'DUPLICATE_WINDOW', fallback=60),
+                                      duplicate_size=config.getint('SPAM_FILTER', 'DUPLICATE_SIZE', fallback=10),
+                                      similarity=config.getfloat('SPAM_FILTER', 'SIMILARITY', fallback=0.8),
+                                      log=self.log)
+        self.up_name = ''  # 主播名字
+        self.fan_medal = ''  # 连接直播间的粉丝牌名
+        self.is_streaming = False  # 当前是否在直播
+        self._notice_deferred_at = None  # 定时弹幕开始推迟的时间（time.monotonic），没有推迟时为 None
+        # 大航海成员（上舰时增量更新，每日凌晨或发现不一致时在后台重新获取完整列表）
+        self.store = supervisor.store  # 本地状态存储（未启用时为 None）
+        self.roster = GuardRoster(room_id, supervisor.gateway, supervisor.verify,
+                                  resync_interval=config.getint('DAHANGHAI', 'RESYNC_INTERVAL', fallback=10) * 60,
+                                  on_change=self._save_roster if self.store is not None else None, log=self.log)
+        # 资源占用统计
+        self.event_count = 0
+        self.handler_time = 0.0
+        self._started_at = time.monotonic()
+        self._event_metrics = {}  # {事件类型: 计数器}
+        metrics.queue_depth.labels(room_id, 'gift').set_function(lambda: self.gifts.pending)
+        metrics.guards.labels(room_id).set_function(lambda: len(self.roster))
+        if self.recorder is not None:
+            metrics.queue_depth.labels(room_id, 'recorder').set_function(lambda: self.recorder.pending)
+
+        self._handlers = {}  # {事件类型: (处理函数, 处理耗时指标)}
+        for event, handler in (
+                ("VIEW", self.on_view),
+                ("NOTICE_MSG", self.on_notice),
+                ("DANMU_MSG", self.on_danmaku),
+                ("INTERACT_WORD", self.on_user_enter),
+                ("ENTRY_EFFECT", self.on_guard_enter),
+                ("SUPER_CHAT_MESSAGE", self.on_super_chat),
+                ("SEND_GIFT", self.on_gift),
+                ("COMBO_SEND", self.on_gift_combo),
+                ("GUARD_BUY", self.on_guard_buy),
+                ("PREPARING", self.on_live_end),
+                ("LIVE", self.on_live_on),
+                ("ROOM_REAL_TIME_MESSAGE_UPDATE", self.on_fans_update)):
+            self._handlers[event] = (handler, metrics.handler_latency.labels(room_id, handler.__name__))
+        # 只注册一个处理函数，每个事件只创建一个任务，在 on_all 中按事件类型查表分发
+        self.room.add_event_handler("ALL", self.on_all)
+
+    def apply_settings(self, settings):
+        """
+        刷新配置后切换到新的配置快照，并推送给弹幕发送器、礼物合并和定时弹幕任务
+        """
+        old = self.settings.danmaku
+        self.config = settings.config
+        self.settings = settings
+        self.ds.apply(settings.danmaku)
+        self.gifts.window = settings.danmaku.gift_merge_window
+        self.gifts.max_groups = settings.danmaku.gift_merge_max
+        self.welcomed.ttl = settings.danmaku.welcome_cooldown * 60 if settings.danmaku.welcome_cooldown > 0 else None
+        job_id = 'interval_job_' + str(self.room_id)
+        if (old.scheduled_interval != settings.danmaku.scheduled_interval
+                or old.scheduled_jitter != settings.danmaku.scheduled_jitter) \
+                and self.supervisor.scheduler.get_job(job_id) is not None:
+            self.supervisor.scheduler.reschedule_job(job_id, IntervalTrigger(self.notice_delay,
+                                                                             settings.danmaku.scheduled_jitter))
+
+    async def _enrich_user(self, source: str, fields: dict):
+        """
+        欢迎规则需要时查询用户信息（优先从缓存读取），写入规则使用的字段
+        """
+        uid = fields['uid']
+        if source == 'relation':
+            relation = await utils.cached(self.supervisor.user_cache, 'relation:' + str(uid),
+                                          self._load_user, 'relation', uid)
+            fields['following'] = relation['following']  # 关注数
+            fields['follower'] = relation['follower']  # 粉丝数
+        else:
+            info = await utils.cached(self.supervisor.user_cache, 'info:' + str(uid), self._load_user, 'info', uid)
+            fields['sex'] = info['sex']  # '男', '女', '保密'
+            fields['level'] = info['level']  # B站等级
+
+    async def _load_user(self, source: str, uid) -> dict:
+        """
+        内存缓存中没有的用户信息：先查本地状态存储（没有过期时），再通过网络查询并保存
+        """
+        keys = ('following', 'follower') if source == 'relation' else ('sex', 'level')
+        now = time.time()
+        if self.store is not None:
+            viewer = await self.store.get_viewer(uid)
+            if viewer is not None and (viewer.get(source + '_at') or 0) > now - self.supervisor.user_cache.ttl:
+                return {key: viewer[key] for key in keys}
+        gateway = self.supervisor.gateway
+        if source == 'relation':
+            data = await gateway.get_relation_info(uid, self.supervisor.verify)
+        else:
+            data = await gateway.get_user_info(uid, self.supervisor.verify)
+        if self.store is not None:
+            self.store.update_viewer(uid, **{key: data[key] for key in keys}, **{source + '_at': now})
+        return data
+
+    @types.coroutine
+    def _measure(self, coro):
+        # 逐步驱动处理函数的协程，累加每一步的耗时，单独统计处理函数实际占用事件循环的时间（不包括等待网络请求的时间）
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                future = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                self.handler_time += time.perf_counter() - start
+                return stop.value
+            except BaseException:
+                self.handler_time += time.perf_counter() - start
+                raise
+            self.handler_time += time.perf_counter() - start
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+    async def bootstrap(self):
+        """
+        获取连接直播间前需要的数据：启用本地状态存储时直接使用上次保存的直播间信息和大航海列表，
+        连接后在后台核对；完整的大航海列表总是在后台获取，不等待
+        """
+        # TODO: 已登录用户xxx
+        info = await self.store.load_room_info(self.room_id) if self.store is not None else None
+        cached = info is not None
+        if not cached:
+            info = _room_summary(await self.supervisor.gateway.get_room_info(self.room_id, self.supervisor.verify))
+            if self.store is not None:
+                self.store.save_room_info(self.room_id, info)
+        self._apply_room_info(info)
+        self.log.info("连接到 [%s] 的直播间 [%d] ，当前直播状态：%s%s", self.up_name, self.room_id,
+                      "直播中" if self.is_streaming else "未开播", "（上次保存的信息）" if cached else "", extra=BOLD)
+        if cached:
+            asyncio.get_event_loop().create_task(self._resync_status())
+        members = await self.store.load_roster(self.room_id) if self.store is not None else None
+        if members:
+            self.roster.restore(members)
+        self.roster.resync(True)
+        if self.store is not None and self.is_streaming and self.settings.danmaku.only_welcome_once:
+            await self._restore_welcomed(info['live_start_time'])
+
+    def _apply_room_info(self, info: dict):
+        """
+        使用直播间信息（见 _room_summary）
+        """
+        self.is_streaming = info['live_status'] == 1
+        self.up_name = info['uname']
+        self.fan_medal = info['medal_name']
+        self.roster.configure(info['room_id'] or self.room_id, info['uid'])
+
+    async def _restore_welcomed(self, live_start: float):
+        """
+        重启前本场直播已经欢迎过的观众不再重复欢迎（设置了冷却时间时只恢复还在冷却中的）
+        """
+        now = time.time()
+        since = live_start
+        if self.welcomed.ttl is not None:
+            since = max(since, now - self.welcomed.ttl)
+        welcomed = await self.store.load_welcomed(self.room_id, since)
+        for uid, at in welcomed:
+            self.welcomed.add(uid, at + self.welcomed.ttl - now if self.welcomed.ttl is not None else None)
+        if welcomed:
+            self.log.info("本场直播已经欢迎过%d个观众", len(welcomed))
+
+    def _save_roster(self, members: dict):
+        self.store.save_roster(self.room_id, members)
+
+    def start(self):
+        """
+        启动弹幕发送队列、礼物合并、事件录制，并添加定时弹幕任务
+        """
+        self.ds.start()
+        self.gifts.start()
+        if self.recorder is not None:
+            self.recorder.start()
+        self.supervisor.scheduler.add_job(self.interval_job, IntervalTrigger(self.notice_delay,
+                                                                             self.settings.danmaku.scheduled_jitter),
+                                          id='interval_job_' + str(self.room_id))
+        if self.analytics is not None:
+            self.supervisor.scheduler.add_job(self.take_snapshot, IntervalTrigger(
+                self.config.getfloat('ANALYTICS', 'SNAPSHOT_INTERVAL', fallback=5) * 60),
+                id='analytics_job_' + str(self.room_id))
+
+    def stop(self):
+        self.connection.stop()
+        self.gifts.stop()
+        self.ds.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    async def connect(self):
+        """
+        连接至直播间并监听事件，断线后自动重连，直到调用 stop()
+        """
+        await self.connection.run()
+
+    def _on_reconnect(self):
+        """
+        重连成功后在后台核对直播状态（断线期间可能错过了开播/下播事件），并按需重新获取大航海列表
+        """
+        asyncio.get_event_loop().create_task(self._resync_status())
+        self.roster.resync()
+
+    def _on_connect(self):
+        self.log.info("收到第一个事件，启动耗时 %.2fs", startup.profile.elapsed, extra=BOLD)
+
+    async def _resync_status(self):
+        """
+        重新获取直播间信息，核对直播状态（断线期间或上次保存后可能错过了开播/下播事件）
+        """
+        try:
+            room_info = await self.supervisor.gateway.get_room_info(self.room_id, self.supervisor.verify)
+        except Exception as e:
+            self.log.warning("获取直播状态失败！%r", e)
+            return
+        info = _room_summary(room_info)
+        if self.store is not None:
+            self.store.save_room_info(self.room_id, info)
+        was_streaming = self.is_streaming
+        self._apply_room_info(info)
+        if self.is_streaming != was_streaming:
+            self.log.warning("直播状态已改变，当前直播状态：%s", "直播中" if self.is_streaming else "未开播",
+                             extra=LIVE_STATUS_STYLE)
+            self.welcomed.clear()
+            if self.recorder is not None:
+                self.recorder.rotate()
+
+    def usage(self) -> dict:
+        """
+        该直播间的资源占用：处理的事件数、处理事件的耗时及占比、直播间状态占用的内存（估算）
+        """
+        elapsed = time.monotonic() - self._started_at
+        components = (self.welcomed, self.roster, self.ds, self.gifts, self.recorder, self.analytics)
+        return {
+            'events': self.event_count,
+            'handler_time': self.handler_time,
+            'cpu_percent': self.handler_time / elapsed * 100 if elapsed > 0 else 0.0,
+            'memory_kb': sum(component.nbytes for component in components if component is not None) / 1024,
+        }
+
+    """
+    **************************************************************************
+    **************************** 定义直播间事件触发 ****************************
+    **************************************************************************
+    """
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'VIEW', 'data': 113791}
+    async def on_view(self, event: events.ViewEvent):  # 直播间人气更新
+        viewer_num = event.viewers
+        self.log.info("【人气更新】当前直播间人气 %s", viewer_num, extra=BOLD)
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'NOTICE_MSG', 'data': {'cmd': 'NOTICE_MSG', 'full': {'head_icon': 'http://i0.hdslb.com/bfs/live/b29add66421580c3e680d784a827202e512a40a0.webp', 'tail_icon': 'http://i0.hdslb.com/bfs/live/822da481fdaba986d738db5d8fd469ffa95a8fa1.webp', 'head_icon_fa': 'http://i0.hdslb.com/bfs/live/49869a52d6225a3e70bbf1f4da63f199a95384b2.png', 'tail_icon_fa': 'http://i0.hdslb.com/bfs/live/38cb2a9f1209b16c0f15162b0b553e3b28d9f16f.png', 'head_icon_fan': 24, 'tail_icon_fan': 4, 'background': '#66A74EFF', 'color': '#FFFFFFFF', 'highlight': '#FDFF2FFF', 'time': 20}, 'half': {'head_icon': 'http://i0.hdslb.com/bfs/live/ec9b374caec5bd84898f3780a10189be96b86d4e.png', 'tail_icon': '', 'background': '#85B971FF', 'color': '#FFFFFFFF', 'highlight': '#FDFF2FFF', 'time': 15}, 'side': {'head_icon': '', 'background': '', 'color': '', 'highlight': '', 'border': ''}, 'roomid': 156536, 'real_roomid': 156536, 'msg_common': '<円円__>投喂<一心X_IN>1个小电视飞船，点击前往TA的房间吧！', 'msg_self': '<円円__>投喂<一心X_IN>1个小电视飞船，快来围观吧！', 'link_url': 'https://live.bilibili.com/156536?from=28003&extra_jump_from=28003&live_lottery_type=1&broadcast_type=1', 'msg_type': 2, 'shield_uid': -1, 'business_id': '25', 'scatter': {'min': 0, 'max': 0}}}
+    async def on_notice(self, event: events.Event):  # 全频道通知
+        pass
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'DANMU_MSG', 'data': {'cmd': 'DANMU_MSG', 'info': [[0, 1, 25, 12802438, 1612863232120, 1612862943, 0, 'b80e5623', 0, 0, 2, '#19897EFF,#403F388E,#33897EFF'], '感觉可以的', [7930172, 'AのFa', 0, 1, 1, 10000, 1, '#E17AFF'], [30, 'ASAKI', 'Asaki大人', 6154037, 2951253, '', 1000006, 16771156, 2951253, 10329087, 2, 1, 194484313], [50, 0, 16746162, 6331, 1], ['title-279-1', 'title-279-1'], 0, 2, None, {'ts': 1612863232, 'ct': '684B0420'}, 0, 0, None, None, 0]}}
+    async def on_danmaku(self, event: events.DanmakuEvent):  # 收到弹幕
+        uid = str(event.uid)
+        uname = event.uname
+        content = str(event.content)
+        self.log.info("【收到弹幕】%s: %s", uname, content, extra=DANMAKU_STYLE)
+        if self.analytics is not None:
+            self.analytics.add_danmaku(uid, uname, content)
+        if self.store is not None:
+            self.store.update_viewer(int(uid), uname=uname, last_seen=time.time())
+        # AI机器人
+        turing = self.settings.turing
+        if turing.enable and not self.ds.paused and content.startswith(turing.question_prefix):
+            question = content.replace(turing.question_prefix, '')
+            reason = self.spam_filter.check(uid, question)
+            ai_limit = self.supervisor.ai_limit
+            if reason is None and not ai_limit.try_acquire():
+                reason = self.spam_filter.reject(REJECT_BUSY)
+            if reason is not None:
+                self.log.debug("【过滤弹幕】%s: %s（%s）", uname, content, reason)
+                return
+            try:
+                self.ds.send_text(turing.answer_prefix
+                                  + await self.supervisor.turing.ask(question, uid), key=uid)
+            except Exception as turing_exception:
+                self.log.warning("%s", turing_exception, extra=TURING_ERROR_STYLE)
+                self.ds.send_text(turing.answer_prefix + turing.fallback, key=uid)
+            finally:
+                ai_limit.release()
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'INTERACT_WORD', 'data': {'cmd': 'INTERACT_WORD', 'data': {'uid': 298047096, 'uname': '德物昂Duang', 'uname_color': '', 'identities': [3, 1], 'msg_type': 1, 'roomid': 6154037, 'timestamp': 1612862503, 'score': 1612872706213, 'fans_medal': {'target_id': 168598, 'medal_level': 2, 'medal_name': '刺儿', 'medal_color': 6067854, 'medal_color_start': 6067854, 'medal_color_end': 6067854, 'medal_color_border': 6067854, 'is_lighted': 1, 'guard_level': 0, 'special': '', 'icon_id': 0, 'anchor_roomid': 1017, 'score': 203}, 'is_spread': 0, 'spread_info': '', 'contribution': {'grade': 0}, 'spread_desc': '', 'tail_icon': 0}}}
+    async def on_user_enter(self, event: events.EnterEvent):  # 用户进入（更新后大航海成员进入时不会触发该事件！）
+        uid = event.uid  # UID
+        uname = event.uname  # 用户名
+        if self.analytics is not None:
+            self.analytics.add_enter()
+        fans_medal = event.medal
+        if self.store is not None:
+            self.store.update_viewer(uid, uname=uname, medal_name=fans_medal.get('medal_name'),
+                                     medal_level=fans_medal.get('medal_level'), last_seen=time.time())
+        # 已经欢迎过的用户不需要再查询任何信息
+        if uid in self.welcomed:
+            return
+        self.log.info("【用户进入】%s", uname, extra=ENTER_STYLE)
+        # 欢迎规则使用的字段（查询到的用户信息也会写入这里）
+        fields = {
+            'uid': uid,
+            'uname': uname,
+            'room': self.room_id,
+            'msg_type': event.msg_type,  # 1：进入直播间
+            'identities': event.identities,
+            'guard_level': self.roster.get(uid),  # 在本直播间的大航海等级（0：不是大航海成员）
+            'medal_level': fans_medal.get('medal_level', 0),  # 粉丝牌等级
+            'medal_name': fans_medal.get('medal_name', ''),  # 粉丝牌名字
+            'medal_room': fans_medal.get('anchor_roomid', 0),  # 粉丝牌所属房间号
+            'medal_uid': fans_medal.get('target_id', 0),  # 粉丝牌所属主播的UID
+            'medal_lighted': fans_medal.get('is_lighted') == 1,  # 粉丝牌是否为点亮状态
+            'medal_guard_level': fans_medal.get('guard_level', 0),  # 粉丝牌的大航海等级（3：舰长，... ）
+        }
+        try:
+            welcome = await self.settings.welcome_rules.evaluate(fields, self._enrich_user)
+            # 欢迎弹幕使用 ${sex} 且欢迎规则没有查询过时才查询用户信息
+            if welcome and 'sex' not in fields and self.settings.danmaku.templates.uses('WELCOME_ENTER', 'sex'):
+                await self._enrich_user('info', fields)
+        except Exception as e:  # 查询用户信息超时或失败时不欢迎
+            self.log.warning("查询用户 %s 的信息失败，跳过欢迎：%r", uname, e)
+            return
+        if welcome:
+            self.ds.welcome_enter(uname, fields.get('sex', ''))
+
+            # 记录已欢迎的用户以避免重复欢迎
+            if self.settings.danmaku.only_welcome_once:
+                self.welcomed.add(uid)
+                if self.store is not None:
+                    self.store.add_welcome(self.room_id, uid)
+
+    # {'room_display_id': 22603751, 'room_real_id': 22603751, 'type': 'ENTRY_EFFECT', 'data': {'cmd': 'ENTRY_EFFECT', 'data': {'id': 4, 'uid': 39832030, 'target_id': 351799197, 'mock_effect': 0, 'face': 'https://i1.hdslb.com/bfs/face/a2dd3d0cd432b74ef21f5c37c78b4d9865f3455c.jpg', 'privilege_type': 3, 'copy_writing': '欢迎舰长 <%小馋狮%> 进入直播间', 'copy_color': '#ffffff', 'highlight_color': '#E6FF00', 'priority': 1, 'basemap_url': 'https://i0.hdslb.com/bfs/live/mlive/f34c7441cdbad86f76edebf74e60b59d2958f6ad.png', 'show_avatar': 1, 'effective_time': 2, 'web_basemap_url': '', 'web_effective_time': 0, 'web_effect_close': 0, 'web_close_time': 0, 'business': 1, 'copy_writing_v2': '欢迎舰长 <%小馋狮%> 进入直播间', 'icon_list': [], 'max_delay_time': 7}}}
+    async def on_guard_enter(self, event: events.GuardEnterEvent):  # 一路火花带闪电地进入直播间（一般是大航海成员）
+        uid = event.uid # 用户UID
+        guard_level = event.guard_level # 用户在该直播间的大航海等级（3：舰长，... ）
+        guard_type = utils.guard_name[guard_level]
+        uname = event.uname # 进入直播间的用户名
+        self.log.info("【%s进入】%s", guard_type, uname, extra=GUARD_ENTER_STYLE)
+        self.roster.observe(uid, guard_level)  # 和记录的等级不一致时在后台重新获取大航海列表
+        self.ds.welcome_guard(uname, guard_type)
+
+    async def on_super_chat(self, event: events.SuperChatEvent):  # 醒目留言
+        uname = event.uname
+        content = event.message
+        price = event.price
+        self.log.info("【醒目留言】￥%s\t%s: %s", price, uname, content, extra=SUPER_CHAT_STYLE)
+        self.ds.thanks_sc(uname)
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'SEND_GIFT', 'data': {'cmd': 'SEND_GIFT', 'data': {'draw': 0, 'gold': 0, 'silver': 0, 'num': 1, 'total_coin': 0, 'effect': 0, 'broadcast_id': 0, 'crit_prob': 0, 'guard_level': 0, 'rcost': 272777534, 'uid': 383665082, 'timestamp': 1612862911, 'giftId': 30607, 'giftType': 5, 'super': 0, 'super_gift_num': 23, 'super_batch_gift_num': 23, 'remain': 1, 'price': 0, 'beatId': '', 'biz_source': 'Live', 'action': '投喂', 'coin_type': 'silver', 'uname': 'Akatuと', 'face': 'http://i0.hdslb.com/bfs/face/175b45e7c3535b39f2d8af44924dab3a2286a904.jpg', 'batch_combo_id': 'batch:gift:combo_id:383665082:194484313:30607:1612862906.4710', 'rnd': 'FFE5B5D2-9626-4A4F-950D-75BF3B75555E', 'giftName': '小心心', 'combo_send': None, 'batch_combo_send': None, 'tag_image': '', 'top_list': None, 'send_master': None, 'is_first': False, 'demarcation': 1, 'combo_stay_time': 3, 'combo_total_coin': 1, 'tid': '1612862911130200004', 'effect_block': 1, 'is_special_batch': 0, 'combo_resources_id': 1, 'magnification': 1.1, 'name_color': '', 'medal_info': {'target_id': 194484313, 'special': '', 'icon_id': 1000006, 'anchor_uname': '', 'anchor_roomid': 0, 'medal_level': 21, 'medal_name': 'ASAKI', 'medal_color': 1725515, 'medal_color_start': 1725515, 'medal_color_end': 5414290, 'medal_color_border': 1725515, 'is_lighted': 1, 'guard_level': 0}, 'svga_block': 0}}}
+    async def on_gift(self, event: events.GiftEvent):  # 收到礼物
+        uname = event.uname
+        giftname = event.gift_name
+        num = event.num
+        total_coin = event.total_coin
+        self.log.info("【收到礼物】%s 赠送了%sx%s", uname, giftname, num, extra=GIFT_STYLE)
+        self.gifts.add_gift(event.uid, uname, giftname, num, combo_id=event.combo_id, coin=total_coin)
+        if self.analytics is not None:
+            self.analytics.add_gift(event.coin_type, total_coin)
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'COMBO_SEND', 'data': {'cmd': 'COMBO_SEND', 'data': {'uid': 3822596, 'ruid': 194484313, 'uname': '猫耳☆幻想冰旋', 'r_uname': 'Asaki大人', 'combo_num': 21, 'gift_id': 30607, 'gift_num': 0, 'batch_combo_num': 21, 'gift_name': '小心心', 'action': '投喂', 'combo_id': 'gift:combo_id:3822596:194484313:30607:1612862905.8227', 'batch_combo_id': 'batch:gift:combo_id:3822596:194484313:30607:1612862905.8234', 'is_show': 1, 'send_master': None, 'name_color': '', 'total_num': 21, 'medal_info': {'target_id': 194484313, 'special': '', 'icon_id': 1000006, 'anchor_uname': '', 'anchor_roomid': 0, 'medal_level': 15, 'medal_name': 'ASAKI', 'medal_color': 12478086, 'medal_color_start': 12478086, 'medal_color_end': 12478086, 'medal_color_border': 12478086, 'is_lighted': 1, 'guard_level': 0}, 'combo_total_coin': 0}}}
+    async def on_gift_combo(self, event: events.ComboEvent):  # 礼物连击
+        uname = event.uname # 赠送礼物的用户名
+        giftname = event.gift_name
+        total_num = event.total_num
+        self.log.info("【礼物连击】%s 赠送了 %s x%s", uname, giftname, total_num, extra=COMBO_STYLE)
+        self.gifts.add_combo(event.uid, uname, giftname, total_num, combo_id=event.combo_id, coin=event.total_coin)
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'GUARD_BUY', 'data': {'cmd': 'GUARD_BUY', 'data': {'uid': 9405475, 'username': '超超超超超超超爱', 'guard_level': 3, 'num': 1, 'price': 198000, 'gift_id': 10003, 'gift_name': '舰长', 'start_time': 1612869234, 'end_time': 1612869234}}}
+    async def on_guard_buy(self, event: events.GuardBuyEvent):  # 收到大航海
+        uname = event.uname
+        num = event.num
+        price = event.price
+        giftname = event.gift_name
+
+        self.roster.apply_purchase(event.uid, event.guard_level, num)  # 直接更新大航海列表，不再重新获取
+        self.log.info("%s 赠送了%s个月%s 价值￥%s", uname, num, giftname, price / 1000, extra=GUARD_BUY_STYLE)
+        self.ds.thanks_guard(uname, giftname, num)
+
+    async def on_live_end(self, event: events.Event):  # 直播结束
+        self.log.warning("********************【直播结束】********************", extra=LIVE_STATUS_STYLE)
+        self.is_streaming = False
+        self.welcomed.clear()
+        if self.recorder is not None:
+            self.recorder.rotate()
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'LIVE', 'data': {'cmd': 'LIVE', 'roomid': 6154037}}
+    async def on_live_on(self, event: events.Event):  # 直播开始
+        self.log.warning("********************【直播开始】********************", extra=LIVE_STATUS_STYLE)
+        self.is_streaming = True
+        self.welcomed.clear()
+        if self.recorder is not None:
+            self.recorder.rotate()
+
+    # {'room_display_id': 732, 'room_real_id': 6154037, 'type': 'ROOM_REAL_TIME_MESSAGE_UPDATE', 'data': {'cmd': 'ROOM_REAL_TIME_MESSAGE_UPDATE', 'data': {'roomid': 6154037, 'fans': 600657, 'red_notice': -1, 'fans_club': 15463}}}
+    async def on_fans_update(self, event: events.FansUpdateEvent):  # 粉丝数更新
+        num_fans = event.fans
+        num_clubs = event.fans_club
+        self.log.info("粉丝数更新，最新粉丝数量：%s，粉丝团成员数：%s", num_fans, num_clubs, extra=FANS_STYLE)
+
+    async def on_all(self, msg):  # 所有事件均触发：统计、录制后按事件类型查表交给对应的处理函数
+        start = time.perf_counter()
+        event_type = msg['type']
+        self.event_count += 1
+        self.connection.on_event(event_type)
+        counter = self._event_metrics.get(event_type)
+        if counter is None:
+            counter = self._event_metrics[event_type] = metrics.events.labels(self.room_id, event_type)
+        counter.inc()
+        if self.recorder is not None:
+            self.recorder.record(msg)
+        entry = self._handlers.get(event_type)
+        if entry is None:  # DEBUG时使用，来找到新的或者已修改的事件
+            self.log.debug("%s\n", msg)
+            self.handler_time += time.perf_counter() - start
+            return
+        handler, latency = entry
+        event = events.decode(msg)
+        self.handler_time += time.perf_counter() - start
+        try:
+            await self._measure(handler(event))
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    """
+    **************************************************************************
+    ***************************** 定义定时触发任务 *****************************
+    **************************************************************************
+    """
+
+    def refresh_dahanghai(self):
+        """
+        在后台重新获取完整的大航海列表
+        """
+        self.roster.resync(True)
+
+    def take_snapshot(self) -> dict:
+        """
+        生成当前窗口的统计快照，记录到日志，并追加写入 [ANALYTICS] FILE
+        """
+        snapshot = self.analytics.snapshot()
+        snapshot['room'] = self.room_id
+        snapshot['time'] = int(time.time())
+        self.analytics_snapshots.append(snapshot)
+        self.log.info("【弹幕统计】最近%d分钟：弹幕 %.1f/分钟，%d人发言，进场 %.1f/分钟，金瓜子 %.0f/分钟；"
+                      "发言最多：%s；热词：%s", snapshot['window_minutes'], snapshot['danmaku_per_minute'],
+                      snapshot['unique_chatters'], snapshot['enters_per_minute'], snapshot['gold_per_minute'],
+                      snapshot['top_senders'][:3], snapshot['top_keywords'][:5])
+        if self.analytics_file != '':
+            self.supervisor.loop.run_in_executor(None, self._append_snapshot, snapshot)
+        return snapshot
+
+    def _append_snapshot(self, snapshot: dict):
+        try:
+            with open(self.analytics_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot, ensure_ascii=False) + '\n')
+        except OSError as e:
+            self.log.error("写入弹幕统计文件失败！%s", e)
+
+    def notice_delay(self) -> float:
+        """
+        距离下一次定时弹幕的秒数：推迟中每隔 NOTICE_RETRY 秒重新检查，
+        开启 SCHEDULED_ADAPTIVE 且直播间冷清时使用 SCHEDULED_MIN_INTERVAL，否则使用 SCHEDULED_INTERVAL
+        """
+        danmaku = self.settings.danmaku
+        if self._notice_deferred_at is not None:
+            return NOTICE_RETRY
+        if danmaku.scheduled_adaptive and self.analytics is not None \
+                and self.analytics.danmaku_rate() < danmaku.scheduled_quiet_rate:
+            return min(danmaku.scheduled_min_interval, danmaku.scheduled_interval) * 60
+        return danmaku.scheduled_interval * 60
+
+    # 发送定时弹幕
+    def interval_job(self):
+        if not self.is_streaming:
+            self._notice_deferred_at = None
+            return
+        danmaku = self.settings.danmaku
+        if danmaku.scheduled_adaptive and self.ds.queue_depth >= danmaku.scheduled_max_queue:
+            now = time.monotonic()
+            if self._notice_deferred_at is None:
+                self._notice_deferred_at = now
+                self.log.debug("发送队列积压（%d条），推迟定时弹幕", self.ds.queue_depth)
+            elif now - self._notice_deferred_at >= danmaku.scheduled_interval * 60:
+                self._notice_deferred_at = None
+                self.log.info("发送队列持续积压，跳过本次定时弹幕", extra=NOTICE_STYLE)
+            return
+        self._notice_deferred_at = None
+        content = random.choice(danmaku.scheduled_notice)
+        self.log.info("定时弹幕已触发：%s", content, extra=NOTICE_STYLE)
+        self.ds.send_text(content)
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           scheduler.py
+:project        bilibili_live_utils
+:name           定时任务
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/25 15:00
+:description    在事件循环上运行的定时任务（代替 apscheduler 的后台线程），任务函数直接在事件循环中执行，
+                可以是普通函数或协程函数。支持每隔一段时间执行（间隔可以每次重新计算）和每天固定时间执行，
+                可以加随机延迟；错过执行时间太久（如电脑休眠）的任务跳过本次执行，多次错过只补执行一次
+"""
+
+import asyncio
+import datetime
+import logging
+import random
+import time
+
+# 等待时每次最多睡眠的秒数，系统时间被修改或休眠唤醒后可以及时重新计算
+MAX_SLEEP = 60
+
+
+class IntervalTrigger(object):
+
+    def __init__(self, seconds, jitter: float = 0):
+        """
+        每隔一段时间执行一次（第一次在启动一个间隔后执行）
+        :param seconds: 间隔秒数，也可以是返回间隔秒数的函数（每次执行后重新计算）
+        :param jitter: 每次执行时间随机推迟 0 ~ jitter 秒
+        """
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def next_fire_time(self, now: float) -> float:
+        seconds = self.seconds() if callable(self.seconds) else self.seconds
+        return now + seconds + random.uniform(0, self.jitter)
+
+
+class CronTrigger(object):
+
+    def __init__(self, hour=None, minute=0, second=0, jitter: float = 0):
+        """
+        每天在固定的时间执行，None 表示每个小时（分钟、秒）都执行
+        :param hour: 0 ~ 23
+        :param minute: 0 ~ 59
+        :param second: 0 ~ 59
+        :param jitter: 每次执行时间随机推迟 0 ~ jitter 秒
+        """
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.jitter = jitter
+
+    def next_fire_time(self, now: float) -> float:
+        current = datetime.datetime.fromtimestamp(now)
+        for day in range(2):
+            date = current.date() + datetime.timedelta(days=day)
+            for hour in range(24) if self.hour is None else (self.hour, ):
+                for minute in range(60) if self.minute is None else (self.minute, ):
+                    for second in range(60) if self.second is None else (self.second, ):
+                        fire = datetime.datetime.combine(date, datetime.time(hour, minute, second))
+                        if fire > current:
+                            return fire.timestamp() + random.uniform(0, self.jitter)
+        raise ValueError('无法计算下一次执行时间')
+
+
+class Job(object):
+
+    def __init__(self, job_id: str, func, trigger, misfire_grace_time: float = None):
+        """
+        :param job_id: 任务ID
+        :param func: 任务函数（普通函数或协程函数，没有参数）
+        :param trigger: IntervalTrigger 或 CronTrigger
+        :param misfire_grace_time: 超过执行时间多少秒以内仍然执行，None 表示总是执行
+        """
+        self.id = job_id
+        self.func = func
+        self.trigger = trigger
+        self.misfire_grace_time = misfire_grace_time
+        self.next_run_time = None  # 下一次执行时间（time.time）
+        self.runs = 0
+        self.misfires = 0
+        self.task = None
+
+
+class AsyncScheduler(object):
+
+    def __init__(self, log: logging.Logger = None):
+        """
+        初始化定时任务（需要在事件循环上调用 start 后任务才会执行）
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self._jobs = {}  # {任务ID: Job}
+        self._loop = None
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def add_job(self, func, trigger, id: str, misfire_grace_time: float = None) -> Job:
+        """
+        添加定时任务，已经有相同ID的任务时替换掉原来的任务
+        """
+        self.remove_job(id)
+        job = self._jobs[id] = Job(id, func, trigger, misfire_grace_time)
+        if self.running:
+            self._schedule(job)
+        return job
+
+    def get_job(self, job_id: str) -> Job:
+        return self._jobs.get(job_id)
+
+    def get_jobs(self) -> list:
+        return list(self._jobs.values())
+
+    def reschedule_job(self, job_id: str, trigger):
+        """
+        修改任务的触发方式，从现在开始重新计算下一次执行时间
+        """
+        job = self._jobs[job_id]
+        job.trigger = trigger
+        if self.running:
+            job.task.cancel()
+            self._schedule(job)
+
+    def remove_job(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        if job is not None and job.task is not None:
+            job.task.cancel()
+
+    def start(self):
+        """
+        在当前事件循环上开始执行所有任务
+        """
+        self._loop = asyncio.get_event_loop()
+        for job in self._jobs.values():
+            self._schedule(job)
+
+    def shutdown(self):
+        """
+        停止所有任务（正在执行的协程任务会被取消）
+        """
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+                job.task = None
+        self._loop = None
+
+    def _schedule(self, job: Job):
+        job.next_run_time = job.trigger.next_fire_time(time.time())
+        job.task = self._loop.create_task(self._run_job(job))
+
+    async def _run_job(self, job: Job):
+        while True:
+            delay = job.next_run_time - time.time()
+            if delay > 0:
+                await asyncio.sleep(min(delay, MAX_SLEEP))
+                continue
+            if job.misfire_grace_time is not None and -delay > job.misfire_grace_time:
+                job.misfires += 1
+                self._log.warning("定时任务 %s 错过了执行时间（%.1f秒），跳过本次执行", job.id, -delay)
+            else:
+                job.runs += 1
+                try:
+                    result = job.func()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    self._log.exception("定时任务 %s 执行失败！%s", job.id, e)
+            # 从现在开始计算下一次执行时间，错过的多次执行不补
+            job.next_run_time = job.trigger.next_fire_time(time.time())
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           sender_pool.py
+:project        bilibili_live_utils
+:name           发送弹幕的账号
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/25 10:00
+:description    配置多个账号（[USER]、[USER:名字]）时，弹幕由多个账号轮流发送，发送能力随账号数量增加。
+                每个账号有自己的限流器和健康状态（所有直播间共用），哪个账号最先可以发送就由哪个账号发送下一条弹幕，
+                同一个观众的AI回复固定由同一个账号发送（保证分段的顺序）。连续发送失败的账号暂停使用一段时间，
+                暂停时间随连续暂停的次数翻倍
+"""
+
+import logging
+import time
+from configparser import RawConfigParser
+
+from bilibili_api import Verify
+
+from scripts.cache import TTLCache
+from scripts.rate_limiter import TokenBucket
+
+
+class SenderAccount(object):
+
+    def __init__(self, name: str, verify: Verify, min_interval: int = 3000, burst: int = 1, max_failures: int = 3,
+                 cooldown: float = 60, max_cooldown: float = 1800, log: logging.Logger = None):
+        """
+        初始化一个发送弹幕的账号
+        :param name: 账号名（用于日志和指标）
+        :param verify: 账号的登录信息
+        :param min_interval: 该账号两条弹幕之间的最小间隔（毫秒）
+        :param burst: 该账号允许连续发送的最大弹幕条数
+        :param max_failures: 连续失败多少次后暂停使用
+        :param cooldown: 第一次暂停的秒数，之后每次连续暂停翻倍
+        :param max_cooldown: 最长暂停的秒数
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.name = name
+        self.verify = verify
+        self.bucket = TokenBucket(rate=1000 / min_interval, capacity=burst)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.sent = 0
+        self.failed = 0
+        self.failures = 0  # 连续失败的次数
+        self.strikes = 0  # 连续暂停的次数（发送成功后清零）
+        self.disabled_until = 0.0  # 暂停到什么时候（time.monotonic）
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.disabled_until
+
+    def configure(self, min_interval: int, burst: int):
+        """
+        刷新配置后修改发送间隔
+        """
+        self.bucket.rate = 1000 / min_interval
+        self.bucket.capacity = burst
+
+    def delay(self) -> float:
+        """
+        距离这个账号可以发送下一条弹幕还需要等待的秒数
+        """
+        return max(self.disabled_until - time.monotonic(), self.bucket.delay())
+
+    def report_success(self):
+        self.sent += 1
+        self.failures = 0
+        self.strikes = 0
+
+    def report_failure(self, error: Exception):
+        """
+        记录一次发送失败，连续失败达到 max_failures 次时暂停使用
+        """
+        self.failed += 1
+        self.failures += 1
+        if self.failures < self.max_failures:
+            return
+        pause = min(self.max_cooldown, self.cooldown * 2 ** self.strikes)
+        self.strikes += 1
+        self.failures = 0
+        self.disabled_until = time.monotonic() + pause
+        self._log.warning("账号 %s 连续%d次发送弹幕失败（%s），暂停使用%d秒", self.name, self.max_failures, error, pause)
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'healthy': self.healthy,
+            'tokens': round(self.bucket.tokens, 2),
+        }
+
+
+def load_accounts(config: RawConfigParser, min_interval: int = 3000, burst: int = 1) -> list:
+    """
+    读取配置文件中所有发送弹幕的账号，[USER] 为第一个账号（也用于连接直播间和查询接口），其余的写在 [USER:名字] 中
+    :param min_interval: 每个账号两条弹幕之间的最小间隔（毫秒）
+    :param burst: 每个账号允许连续发送的最大弹幕条数
+    :return: [SenderAccount]
+    """
+    accounts = []
+    for section in config.sections():
+        if section != 'USER' and not section.startswith('USER:'):
+            continue
+        if not config.getboolean(section, 'SEND', fallback=True):
+            continue
+        verify = Verify(sessdata=config.get(section, 'SESSDATA'), csrf=config.get(section, 'BILIBILI_JCT'))
+        accounts.append(SenderAccount(section.split(':', 1)[1] if ':' in section else 'main', verify,
+                                      min_interval=min_interval, burst=burst,
+                                      max_failures=config.getint('SENDER', 'MAX_FAILURES', fallback=3),
+                                      cooldown=config.getfloat('SENDER', 'COOLDOWN', fallback=60),
+                                      max_cooldown=config.getfloat('SENDER', 'MAX_COOLDOWN', fallback=1800)))
+    return accounts
+
+
+class SenderPool(object):
+
+    def __init__(self, accounts: list, sticky_ttl: float = 120):
+        """
+        一个直播间使用的发送账号
+        :param accounts: [SenderAccount]，可以和其他直播间共用
+        :param sticky_ttl: 同一个 key 的弹幕（如同一个观众的AI回复）在多少秒内固定由同一个账号发送
+        """
+        self.accounts = accounts
+        self._sticky = TTLCache(maxsize=1024, ttl=sticky_ttl)  # {key: SenderAccount}
+
+    def accepts(self, account: SenderAccount, key) -> bool:
+        """
+        账号是否可以发送这个 key 的弹幕：没有 key、key 还没有固定的账号或固定的账号暂停使用时，任何账号都可以发送
+        """
+        if key is None:
+            return True
+        owner = self._sticky.get(key)
+        return owner is None or owner is account or not owner.healthy
+
+    def bind(self, key, account: SenderAccount):
+        """
+        之后这个 key 的弹幕固定由该账号发送
+        """
+        if key is not None:
+            self._sticky.set(key, account)
+
+    def stats(self) -> dict:
+        return {account.name: account.stats() for account in self.accounts}
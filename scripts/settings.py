@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           settings.py
+:project        bilibili_live_utils
+:name           运行配置
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/22 10:00
+:description    从配置文件生成类型化、不可修改的配置快照：读取配置时一次性完成检查、类型转换以及模板和欢迎规则的编译，
+                事件处理时直接读取属性。刷新配置时先完整生成新的快照，成功后才整体替换并推送给各个组件，
+                失败时继续使用原来的配置，不会出现只应用了一半的情况
+"""
+
+import json
+from configparser import RawConfigParser
+from typing import NamedTuple, Tuple
+
+from scripts import utils
+from scripts.templates import MessageTemplates
+from scripts.welcome_rules import DEFAULT_RULES, WelcomeRules
+
+
+class DanmakuSettings(NamedTuple):
+    enable: bool
+    send_interval: int  # 两条弹幕之间的最小发送间隔（毫秒）
+    send_burst: int
+    gift_merge_window: float
+    gift_merge_max: int
+    only_welcome_once: bool
+    welcome_cooldown: int  # 分钟，0 表示本次直播内不再欢迎
+    scheduled_interval: int  # 分钟
+    scheduled_notice: Tuple[str, ...]
+    scheduled_jitter: float  # 秒
+    scheduled_adaptive: bool
+    scheduled_min_interval: float  # 分钟，直播间冷清时的间隔
+    scheduled_quiet_rate: float  # 每分钟弹幕数低于此值时视为冷清
+    scheduled_max_queue: int  # 发送队列中的弹幕达到此数量时推迟定时弹幕
+    templates: MessageTemplates
+
+
+class TuringSettings(NamedTuple):
+    enable: bool
+    question_prefix: str
+    answer_prefix: str
+    fallback: str
+    api_url: str
+    api_keys: Tuple[str, ...]
+    request_format: str
+    daily_quota: int
+
+
+class Settings(NamedTuple):
+    config: RawConfigParser  # 原始配置（只读，只在启动时读取的配置项从这里获取）
+    danmaku: DanmakuSettings
+    turing: TuringSettings
+    welcome_rules: WelcomeRules
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        读取并检查配置文件，生成新的配置快照（不影响正在使用的配置）
+        :raise AssertionError: 配置文件有误时抛出
+        """
+        config = RawConfigParser()
+        utils.config_check(config, path)
+        return cls.from_config(config)
+
+    @classmethod
+    def from_config(cls, config: RawConfigParser):
+        """
+        从已检查的配置生成配置快照
+        :raise AssertionError: 配置项的值有误时抛出
+        """
+        try:
+            danmaku = DanmakuSettings(
+                enable=config.getboolean('DANMAKU', 'ENABLE'),
+                send_interval=config.getint('DANMAKU', 'SEND_INTERVAL', fallback=3000),
+                send_burst=config.getint('DANMAKU', 'SEND_BURST', fallback=1),
+                gift_merge_window=config.getfloat('DANMAKU', 'GIFT_MERGE_WINDOW', fallback=5),
+                gift_merge_max=config.getint('DANMAKU', 'GIFT_MERGE_MAX', fallback=3),
+                only_welcome_once=config.getboolean('DANMAKU', 'ONLY_WELCOME_ONCE'),
+                welcome_cooldown=config.getint('DANMAKU', 'WELCOME_COOLDOWN', fallback=0),
+                scheduled_interval=config.getint('DANMAKU', 'SCHEDULED_INTERVAL'),
+                scheduled_notice=tuple(config.get('DANMAKU', 'SCHEDULED_NOTICE').split(',')),
+                scheduled_jitter=config.getfloat('DANMAKU', 'SCHEDULED_JITTER', fallback=0),
+                scheduled_adaptive=config.getboolean('DANMAKU', 'SCHEDULED_ADAPTIVE', fallback=False),
+                scheduled_min_interval=config.getfloat('DANMAKU', 'SCHEDULED_MIN_INTERVAL', fallback=5),
+                scheduled_quiet_rate=config.getfloat('DANMAKU', 'SCHEDULED_QUIET_RATE', fallback=2),
+                scheduled_max_queue=config.getint('DANMAKU', 'SCHEDULED_MAX_QUEUE', fallback=5),
+                templates=MessageTemplates.from_config(config),
+            )
+            turing = TuringSettings(
+                enable=config.getboolean('TURING_AI', 'ENABLE'),
+                question_prefix=config.get('TURING_AI', 'QUESTION_PREFIX', fallback=''),
+                answer_prefix=config.get('TURING_AI', 'ANSWER_PREFIX', fallback=''),
+                fallback=config.get('TURING_AI', 'FALLBACK', fallback=''),
+                api_url=config.get('TURING_AI', 'API_URL', fallback=''),
+                api_keys=tuple(key.strip() for key in config.get('TURING_AI', 'API_KEYS', fallback='').split(',')
+                               if key.strip()),
+                request_format=config.get('TURING_AI', 'REQUEST_FORMAT', fallback='{}'),
+                daily_quota=config.getint('TURING_AI', 'DAILY_QUOTA', fallback=100),
+            )
+            if turing.enable:
+                assert turing.question_prefix != '', '[TURING_AI] 中的 QUESTION_PREFIX 不能为空！'
+                json.loads(turing.request_format)
+            welcome_rules = WelcomeRules.parse(config.get('WELCOME', 'RULES', fallback=DEFAULT_RULES),
+                                               config.get('WELCOME', 'DEFAULT', fallback='ignore'))
+        except ValueError as e:
+            raise AssertionError('配置文件中的配置项有误：' + str(e))
+        assert danmaku.send_interval > 0, '[DANMAKU] 中的 SEND_INTERVAL 必须大于0！'
+        assert danmaku.scheduled_interval > 0, '[DANMAKU] 中的 SCHEDULED_INTERVAL 必须大于0！'
+        assert danmaku.scheduled_min_interval > 0, '[DANMAKU] 中的 SCHEDULED_MIN_INTERVAL 必须大于0！'
+        return cls(config, danmaku, turing, welcome_rules)
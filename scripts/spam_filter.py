@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           spam_filter.py
+:project        bilibili_live_utils
+:name           刷屏过滤
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/23 16:00
+:description    会触发自动回复（图灵机器人）的弹幕在处理前先经过过滤：每个观众单独限速，
+                同一个观众最近一段时间内内容相近的弹幕（按字符片段的哈希计算相似度）不重复处理，
+                同时进行的图灵机器人请求数量有上限。被过滤的弹幕按原因计入指标。
+                不同观众问相同的问题不会被过滤，由图灵机器人的回复缓存直接回答
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+
+from scripts import metrics
+from scripts.rate_limiter import TokenBucket
+
+# 被过滤的原因
+REJECT_RATE = 'rate'  # 该观众触发得太频繁
+REJECT_DUPLICATE = 'duplicate'  # 和最近的弹幕内容相近
+REJECT_BUSY = 'busy'  # 同时进行的请求已达上限
+
+# 计算相似度时使用的字符片段长度
+SHINGLE_SIZE = 3
+
+_NORMALIZE_PATTERN = re.compile(r'[\s,.!?~，。！？～、]+')
+
+
+def shingles(text: str) -> frozenset:
+    """
+    弹幕内容的字符片段哈希集合（去掉空白和标点，英文转小写），内容短于片段长度时整体作为一个片段
+    """
+    text = _NORMALIZE_PATTERN.sub('', text).lower()
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset((hash(text), ))
+    return frozenset(hash(text[i:i + SHINGLE_SIZE]) for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+class ConcurrencyLimit(object):
+
+    def __init__(self, limit: int = 0):
+        """
+        不等待的并发上限（所有直播间共用），超过上限的请求直接放弃而不是排队
+        :param limit: 最多同时进行的数量，0 表示不限制
+        """
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if self.limit and self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+
+class SpamFilter(object):
+
+    def __init__(self, room_id: int, enable: bool = False, user_rate: float = 6, user_burst: int = 2,
+                 duplicate_window: float = 60, duplicate_size: int = 10, similarity: float = 0.8,
+                 max_users: int = 10000, log: logging.Logger = None):
+        """
+        初始化刷屏过滤
+        :param room_id: 直播间房间号（用于指标）
+        :param enable: 关闭后 check 总是通过（并发上限仍然生效）
+        :param user_rate: 每个观众每分钟最多触发的次数
+        :param user_burst: 每个观众最多连续触发的次数
+        :param duplicate_window: 多少秒内同一观众的弹幕参与相似度比较
+        :param duplicate_size: 每个观众最多保留多少条最近的弹幕参与比较
+        :param similarity: 相似度（Jaccard）达到多少视为重复，1 表示只过滤完全相同的内容
+        :param max_users: 最多记录多少个观众的限速状态和最近的弹幕，超出时淘汰最久没有发言的观众
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.enable = enable
+        self.user_rate = user_rate / 60
+        self.user_burst = user_burst
+        self.duplicate_window = duplicate_window
+        self.duplicate_size = duplicate_size
+        self.similarity = similarity
+        self.max_users = max_users
+        self._viewers = OrderedDict()  # {uid: (TokenBucket, 最近的弹幕 deque[(时间, 片段集合)])}，按最近发言排序
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+        self._rejected = {reason: metrics.danmaku_rejected.labels(room_id, reason)
+                          for reason in (REJECT_RATE, REJECT_DUPLICATE, REJECT_BUSY)}
+
+    def __len__(self):
+        """
+        记录的观众数
+        """
+        return len(self._viewers)
+
+    def check(self, uid, text: str):
+        """
+        检查一条弹幕是否需要处理，被过滤时计入指标
+        :return: 被过滤的原因（REJECT_*），None 表示可以处理
+        """
+        if not self.enable:
+            return None
+        viewer = self._viewers.get(uid)
+        if viewer is None:
+            viewer = self._viewers[uid] = (TokenBucket(self.user_rate, self.user_burst), deque())
+            if len(self._viewers) > self.max_users:
+                self._viewers.popitem(last=False)
+        else:
+            self._viewers.move_to_end(uid)
+        bucket, recent = viewer
+        if not bucket.try_acquire():
+            return self.reject(REJECT_RATE)
+        # 重复的弹幕也记录下来，持续刷屏时不会因为窗口滑过而放行
+        if self._remember(recent, shingles(text)):
+            return self.reject(REJECT_DUPLICATE)
+        return None
+
+    def reject(self, reason: str) -> str:
+        """
+        记录一次过滤
+        """
+        self._rejected[reason].inc()
+        return reason
+
+    def _remember(self, recent: deque, parts: frozenset) -> bool:
+        """
+        和这个观众窗口内的弹幕比较相似度，然后把这条弹幕加入窗口
+        （每个观众已经限速，窗口内只有几条弹幕，直接逐条比较）
+        :return: 是否和窗口内的某条弹幕相近
+        """
+        now = time.monotonic()
+        while recent and (recent[0][0] < now - self.duplicate_window or len(recent) >= self.duplicate_size):
+            recent.popleft()
+        duplicate = False
+        for _, other in recent:
+            overlap = len(parts & other)
+            if overlap and overlap / (len(parts) + len(other) - overlap) >= self.similarity:
+                duplicate = True
+                break
+        recent.append((now, parts))
+        return duplicate
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           startup.py
+:project        bilibili_live_utils
+:name           启动耗时
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/26 15:00
+:description    记录程序启动的各个阶段（导入模块、读取配置、初始化、获取连接前的数据、连接直播间）的耗时，
+                每个直播间收到第一个事件时输出从启动到现在的总耗时。需要最先导入，计时从导入这个模块开始
+"""
+
+import time
+
+
+class StartupProfile(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # [(阶段, 耗时秒数)]
+        self._last = self.started
+
+    def mark(self, phase: str) -> float:
+        """
+        记录上一个阶段结束到现在的耗时
+        :param phase: 刚结束的阶段名
+        :return: 这个阶段的耗时（秒）
+        """
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self.phases.append((phase, elapsed))
+        self._last = now
+        return elapsed
+
+    @property
+    def elapsed(self) -> float:
+        """
+        从启动到现在的秒数
+        """
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        return '，'.join('%s %.2fs' % (phase, elapsed) for phase, elapsed in self.phases) \
+               + '（共 %.2fs）' % (self._last - self.started)
+
+
+# 当前进程的启动耗时
+profile = StartupProfile()
@@ -0,0 +1,264 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           state_store.py
+:project        bilibili_live_utils
+:name           本地状态存储
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/24 10:00
+:description    把观众信息、欢迎记录、大航海列表、直播间信息和图灵机器人 KEY 的用量保存在本地 SQLite 数据库（WAL 模式）中，
+                重启后直接读取，不需要重新查询。事件处理时只修改内存中的待写入数据（同一条记录多次修改会合并），
+                由后台线程定时批量写入；所有数据库操作都在同一个后台线程中进行，不阻塞事件循环
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 观众信息中保存的字段
+VIEWER_FIELDS = ('uname', 'follower', 'following', 'sex', 'level', 'medal_name', 'medal_level', 'last_seen',
+                 'relation_at', 'info_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS viewers (
+    uid INTEGER PRIMARY KEY,
+    uname TEXT,
+    follower INTEGER,
+    following INTEGER,
+    sex TEXT,
+    level INTEGER,
+    medal_name TEXT,
+    medal_level INTEGER,
+    last_seen REAL,
+    relation_at REAL,
+    info_at REAL
+);
+CREATE TABLE IF NOT EXISTS welcomes (
+    room INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    welcomed_at REAL NOT NULL,
+    PRIMARY KEY (room, uid)
+);
+CREATE INDEX IF NOT EXISTS welcomes_time ON welcomes (room, welcomed_at);
+CREATE TABLE IF NOT EXISTS guards (
+    room INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    expire REAL,
+    PRIMARY KEY (room, uid)
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    room INTEGER PRIMARY KEY,
+    info TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS key_usage (
+    day TEXT NOT NULL,
+    api_key TEXT NOT NULL,
+    used INTEGER NOT NULL,
+    exhausted INTEGER NOT NULL,
+    PRIMARY KEY (day, api_key)
+);
+"""
+
+# 只更新提供了的字段，没有提供的字段保留数据库中原来的值
+_UPSERT_VIEWER = "INSERT INTO viewers (uid, {columns}) VALUES (?, {values}) ON CONFLICT (uid) DO UPDATE SET {updates}".format(
+    columns=', '.join(VIEWER_FIELDS), values=', '.join('?' * len(VIEWER_FIELDS)),
+    updates=', '.join('%s = COALESCE(excluded.%s, %s)' % (field, field, field) for field in VIEWER_FIELDS))
+
+
+class StateStore(object):
+
+    def __init__(self, path: str, flush_interval: float = 5, log: logging.Logger = None):
+        """
+        初始化本地状态存储（需要调用 open 打开数据库）
+        :param path: 数据库文件路径
+        :param flush_interval: 最长多少秒写入一次
+        :param log: 日志记录器，默认为 bilibili_live_utils
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn = None
+        self._executor = ThreadPoolExecutor(1, 'StateStore')  # 单线程，连接只在这个线程中使用，保证写入顺序
+        self._task = None
+        # 待写入的数据
+        self._viewers = {}  # {uid: {字段: 值}}
+        self._welcomes = {}  # {(room, uid): 时间戳}
+        self._rosters = {}  # {room: {uid: (等级, 到期时间)}}，整个列表替换
+        self._rooms = {}  # {room: 直播间信息}
+        self._key_usage = {}  # {(day, key): (用量, 是否用完)}
+        self._log = log if log is not None else logging.getLogger('bilibili_live_utils')
+
+    async def open(self):
+        """
+        打开（不存在时创建）数据库，并在当前事件循环上启动定时写入任务
+        """
+        await self._run(self._open)
+        self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+        self._log.info("本地状态数据库：%s", os.path.abspath(self.path))
+
+    def _open(self):
+        if os.path.dirname(self.path) != '':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')  # WAL 模式下断电最多丢失最近的事务，不会损坏数据库
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        停止定时写入，写入剩余的数据后关闭数据库（等待写入完成）
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._conn is not None:
+            self.flush()
+            self._executor.submit(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+    def _run(self, fn, *args):
+        return asyncio.get_event_loop().run_in_executor(self._executor, fn, *args)
+
+    """
+    写入（只修改待写入数据，立即返回）
+    """
+
+    def update_viewer(self, uid, **fields):
+        """
+        更新观众信息，只修改提供的字段（见 VIEWER_FIELDS）
+        """
+        pending = self._viewers.get(uid)
+        if pending is None:
+            self._viewers[uid] = fields
+        else:
+            pending.update(fields)
+
+    def add_welcome(self, room: int, uid):
+        self._welcomes[(room, uid)] = time.time()
+
+    def save_roster(self, room: int, members: dict):
+        """
+        保存直播间完整的大航海列表
+        :param members: {uid: (大航海等级, 到期时间戳或 None)}
+        """
+        self._rosters[room] = members
+
+    def save_room_info(self, room: int, info: dict):
+        """
+        保存连接直播间前需要的直播间信息（可以转换为 JSON 的 dict）
+        """
+        self._rooms[room] = info
+
+    def save_key_usage(self, day: str, used: dict, exhausted):
+        """
+        保存图灵机器人每个 KEY 当天的用量
+        :param used: {KEY: 已调用次数}
+        :param exhausted: 当天次数已用完的 KEY
+        """
+        for key, count in used.items():
+            self._key_usage[(day, key)] = (count, key in exhausted)
+
+    def flush(self):
+        """
+        把待写入的数据交给后台线程批量写入
+        """
+        if self._viewers or self._welcomes or self._rosters or self._rooms or self._key_usage:
+            batch = (self._viewers, self._welcomes, self._rosters, self._rooms, self._key_usage)
+            self._viewers, self._welcomes, self._rosters, self._rooms, self._key_usage = {}, {}, {}, {}, {}
+            self._executor.submit(self._write_batch, *batch)
+
+    def _write_batch(self, viewers: dict, welcomes: dict, rosters: dict, rooms: dict, key_usage: dict):
+        try:
+            with self._conn:  # 一个事务
+                self._conn.executemany(_UPSERT_VIEWER, ((uid, ) + tuple(fields.get(field) for field in VIEWER_FIELDS)
+                                                        for uid, fields in viewers.items()))
+                self._conn.executemany("INSERT OR REPLACE INTO welcomes (room, uid, welcomed_at) VALUES (?, ?, ?)",
+                                       ((room, uid, at) for (room, uid), at in welcomes.items()))
+                for room, members in rosters.items():
+                    self._conn.execute("DELETE FROM guards WHERE room = ?", (room, ))
+                    self._conn.executemany("INSERT INTO guards (room, uid, level, expire) VALUES (?, ?, ?, ?)",
+                                           ((room, uid, level, expire) for uid, (level, expire) in members.items()))
+                self._conn.executemany("INSERT OR REPLACE INTO rooms (room, info, saved_at) VALUES (?, ?, ?)",
+                                       ((room, json.dumps(info, ensure_ascii=False), time.time())
+                                        for room, info in rooms.items()))
+                self._conn.executemany("INSERT OR REPLACE INTO key_usage (day, api_key, used, exhausted) "
+                                       "VALUES (?, ?, ?, ?)",
+                                       ((day, key, used, int(exhausted))
+                                        for (day, key), (used, exhausted) in key_usage.items()))
+        except Exception as e:
+            self._log.error("写入本地状态数据库失败！%s", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    """
+    读取（在后台线程中查询，待写入的数据优先）
+    """
+
+    async def get_viewer(self, uid) -> dict:
+        """
+        读取观众信息
+        :return: {字段: 值}，没有记录时返回 None
+        """
+        row = await self._run(self._query_one, "SELECT %s FROM viewers WHERE uid = ?" % ', '.join(VIEWER_FIELDS),
+                              (uid, ))
+        viewer = dict(zip(VIEWER_FIELDS, row)) if row is not None else None
+        pending = self._viewers.get(uid)
+        if pending is not None:
+            viewer = dict(viewer or {}, **pending)
+        return viewer
+
+    async def load_welcomed(self, room: int, since: float) -> list:
+        """
+        读取直播间在某个时间之后欢迎过的观众
+        :return: [(uid, 欢迎时间戳)]，按时间排序
+        """
+        rows = await self._run(self._query_all, "SELECT uid, welcomed_at FROM welcomes WHERE room = ? AND welcomed_at >= ? "
+                                                "ORDER BY welcomed_at", (room, since))
+        return rows + sorted((uid, at) for (r, uid), at in self._welcomes.items() if r == room and at >= since)
+
+    async def load_roster(self, room: int) -> dict:
+        """
+        读取直播间上次保存的大航海列表
+        :return: {uid: (大航海等级, 到期时间戳或 None)}
+        """
+        if room in self._rosters:
+            return dict(self._rosters[room])
+        rows = await self._run(self._query_all, "SELECT uid, level, expire FROM guards WHERE room = ?", (room, ))
+        return {uid: (level, expire) for uid, level, expire in rows}
+
+    async def load_room_info(self, room: int) -> dict:
+        """
+        读取上次保存的直播间信息
+        :return: 直播间信息，没有记录时返回 None
+        """
+        if room in self._rooms:
+            return dict(self._rooms[room])
+        row = await self._run(self._query_one, "SELECT info FROM rooms WHERE room = ?", (room, ))
+        return json.loads(row[0]) if row is not None else None
+
+    async def load_key_usage(self, day: str) -> tuple:
+        """
+        读取图灵机器人每个 KEY 当天的用量
+        :return: ({KEY: 已调用次数}, {当天次数已用完的 KEY})
+        """
+        rows = await self._run(self._query_all, "SELECT api_key, used, exhausted FROM key_usage WHERE day = ?", (day, ))
+        used = {key: count for key, count, _ in rows}
+        exhausted = {key for key, _, flag in rows if flag}
+        return used, exhausted
+
+    def _query_one(self, sql: str, params: tuple):
+        return self._conn.execute(sql, params).fetchone()
+
+    def _query_all(self, sql: str, params: tuple) -> list:
+        return self._conn.execute(sql, params).fetchall()
@@ -0,0 +1,377 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           supervisor.py
+:project        bilibili_live_utils
+:name           多直播间管理
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/18 20:30
+:description    在同一个事件循环上连接配置文件中的所有直播间，直播间之间共享网络请求网关、用户信息缓存、
+                图灵机器人和定时任务，并定时报告每个直播间的资源占用
+"""
+
+import asyncio
+import logging
+import os
+from configparser import RawConfigParser
+
+from bilibili_api import Verify
+
+from scripts import events, metrics, startup, utils
+from scripts.cache import TTLCache
+from scripts.gateway import ApiGateway
+from scripts.log_pipeline import style
+from scripts.room_context import RoomContext
+from scripts.scheduler import AsyncScheduler, CronTrigger
+from scripts.sender_pool import load_accounts
+from scripts.settings import Settings
+from scripts.spam_filter import ConcurrencyLimit
+from scripts.turing_ai import TuringAI
+
+
+# 日志颜色（只在控制台显示）
+BOLD = style(attrs=['bold', ])
+BANNER_STYLE = style('red', attrs=['bold', ])
+CONSOLE_STYLE = style('blue', attrs=['bold', ])
+NOTICE_STYLE = style(on_color='on_yellow')
+FATAL_STYLE = style('red', 'on_green', ['bold', ])
+
+
+class Supervisor(object):
+
+    def __init__(self, config: RawConfigParser, config_path: str, room_ids: list = None, worker: int = None):
+        """
+        初始化共享的服务和所有直播间
+        :param config: 已读取的配置文件
+        :param config_path: 配置文件路径（刷新配置时使用）
+        :param room_ids: 要连接的直播间号码，默认为配置文件中的所有直播间
+        :param worker: 多进程模式下的工作进程编号（用来区分各进程的指标接口端口和指标文件）
+        """
+        self.config = config
+        self.config_path = config_path
+        self.settings = Settings.from_config(config)  # 配置快照，刷新配置时整体替换
+        self.worker = worker
+        self.log = logging.getLogger('bilibili_live_utils')
+        self.loop = asyncio.get_event_loop()
+        if events.install_fast_json():
+            self.log.debug("使用 orjson 解析直播间消息")
+        self.gateway = ApiGateway(max_workers=config.getint('GATEWAY', 'WORKERS', fallback=16),
+                                  timeout=config.getfloat('GATEWAY', 'TIMEOUT', fallback=10),
+                                  limits={'dahanghai': config.getint('DAHANGHAI', 'PAGE_CONCURRENCY', fallback=4)},
+                                  timeouts={'turing': config.getfloat('TURING_AI', 'TIMEOUT', fallback=5)})
+        self.verify = Verify(sessdata=config.get('USER', 'SESSDATA'), csrf=config.get('USER', 'BILIBILI_JCT'))
+        # 发送弹幕的账号（所有直播间共用，每个账号单独限流）
+        self.accounts = load_accounts(config, min_interval=self.settings.danmaku.send_interval,
+                                      burst=self.settings.danmaku.send_burst)
+        if len(self.accounts) > 1:
+            self.log.info("使用%d个账号发送弹幕：%s", len(self.accounts), ', '.join(a.name for a in self.accounts))
+        self.user_cache = TTLCache(maxsize=config.getint('CACHE', 'SIZE', fallback=4096),
+                                   ttl=config.getint('CACHE', 'TTL', fallback=3600))
+        self.cache_file = config.get('CACHE', 'FILE', fallback='')  # 缓存保存的文件（留空则不保存）
+        if self.cache_file != '':
+            self.user_cache.load(self.cache_file)
+            self.log.info("从 %s 读取了%d条用户缓存", self.cache_file, len(self.user_cache))
+        self.store = None  # 本地状态存储（未启用时为 None）
+        if config.getboolean('STATE', 'ENABLE', fallback=False):
+            from scripts.state_store import StateStore  # 可选的组件只在启用时导入，减少启动时间
+            self.store = StateStore(config.get('STATE', 'FILE', fallback='state.db'),
+                                    flush_interval=config.getfloat('STATE', 'FLUSH_INTERVAL', fallback=5))
+        turing = self.settings.turing
+        self.turing = TuringAI(api_url=turing.api_url, api_keys=list(turing.api_keys),
+                               request_body=turing.request_format, enable=turing.enable, gateway=self.gateway,
+                               daily_quota=turing.daily_quota,
+                               cache_size=config.getint('TURING_AI', 'CACHE_SIZE', fallback=256),
+                               cache_ttl=config.getfloat('TURING_AI', 'CACHE_TTL', fallback=600), store=self.store)
+        # 所有直播间同时进行的图灵机器人请求数上限，超出时放弃而不是排队
+        self.ai_limit = ConcurrencyLimit(config.getint('TURING_AI', 'MAX_CONCURRENT', fallback=2))
+        self.scheduler = AsyncScheduler()  # 定时任务在事件循环上执行
+        self.metrics_server = None  # 指标导出接口（未启用时为 None）
+        self.admin_server = None  # 管理接口（未启用时为 None）
+        self.rooms = {}  # {房间号: RoomContext}
+        for room_id in (room_ids if room_ids is not None else utils.get_room_ids(config)):
+            self.rooms[room_id] = RoomContext(room_id, self)
+        self._tasks = []
+
+    async def bootstrap(self):
+        """
+        同时获取所有直播间连接前需要的数据（启用本地状态存储时先读取上次保存的状态）
+        """
+        if self.store is not None:
+            await self.store.open()
+            await asyncio.gather(self.turing.restore(), *(ctx.bootstrap() for ctx in self.rooms.values()))
+        else:
+            await asyncio.gather(*(ctx.bootstrap() for ctx in self.rooms.values()))
+        startup.profile.mark('获取连接前的数据')
+        self.log.info("【启动耗时】%s", startup.profile.report())
+        self.log.info("************************** 初始化完毕 **************************", extra=BANNER_STYLE)
+
+    def start(self):
+        """
+        启动所有直播间的弹幕发送队列等组件，以及共享的定时任务
+        """
+        for ctx in self.rooms.values():
+            ctx.start()
+        self.scheduler.add_job(self.new_day_job, CronTrigger(hour=0, minute=0, second=5), id='new_day_job',
+                               misfire_grace_time=10)
+        self.scheduler.start()
+        report_interval = self.config.getfloat('SUPERVISOR', 'REPORT_INTERVAL', fallback=10)
+        if report_interval > 0:
+            self._tasks.append(self.loop.create_task(self._report_loop(report_interval * 60)))
+        self.start_metrics()
+        self._tasks.append(self.loop.create_task(self.start_admin()))
+        watch_interval = self.config.getfloat('SUPERVISOR', 'CONFIG_WATCH_INTERVAL', fallback=0)
+        if watch_interval > 0:
+            self._tasks.append(self.loop.create_task(self._watch_config_loop(watch_interval)))
+
+    def start_metrics(self):
+        """
+        按配置启动指标导出接口和定时写入指标文件（多进程模式下每个工作进程使用 PORT + 1 + 进程编号 的端口）
+        """
+        port = self.config.getint('METRICS', 'PORT', fallback=0)
+        if port > 0:
+            if self.worker is not None:
+                port += 1 + self.worker
+            host = self.config.get('METRICS', 'HOST', fallback='127.0.0.1')
+            try:
+                self.metrics_server = metrics.MetricsServer(metrics.registry, host, port)
+                self.metrics_server.start()
+                self.log.info("运行指标接口：http://%s:%d/metrics", host, port, extra=BOLD)
+            except OSError as e:
+                self.metrics_server = None
+                self.log.error("运行指标接口启动失败！%s", e)
+        metrics_file = self.config.get('METRICS', 'FILE', fallback='')
+        if metrics_file != '':
+            if self.worker is not None:
+                root, ext = os.path.splitext(metrics_file)
+                metrics_file = root + '.worker' + str(self.worker) + ext
+            self._tasks.append(self.loop.create_task(
+                self._dump_metrics_loop(metrics_file, self.config.getfloat('METRICS', 'DUMP_INTERVAL', fallback=60))))
+
+    async def start_admin(self):
+        """
+        按配置启动管理接口（多进程模式下每个工作进程使用 PORT + 1 + 进程编号 的端口）
+        """
+        port = self.config.getint('ADMIN', 'PORT', fallback=0)
+        if port <= 0:
+            return
+        if self.worker is not None:
+            port += 1 + self.worker
+        host = self.config.get('ADMIN', 'HOST', fallback='127.0.0.1')
+        from scripts.admin import AdminServer
+        server = AdminServer(self, host, port, token=self.config.get('ADMIN', 'TOKEN', fallback=''))
+        try:
+            await server.start()
+        except OSError as e:
+            self.log.error("管理接口启动失败！%s", e)
+            return
+        self.admin_server = server
+        self.log.info("管理接口：http://%s:%d/status", host, server.port, extra=BOLD)
+
+    def stop(self):
+        """
+        停止所有直播间和共享的服务，保存用户信息缓存
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.scheduler.running:
+            self.scheduler.shutdown()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.admin_server is not None:
+            self.admin_server.stop()
+            self.admin_server = None
+        for ctx in self.rooms.values():
+            ctx.stop()
+        if self.store is not None:
+            self.store.close()
+        if self.cache_file != '':
+            self.user_cache.save(self.cache_file)
+        self.gateway.shutdown()
+        events.uninstall_fast_json()
+
+    async def run(self, console: bool = True):
+        """
+        初始化并连接所有直播间，直到所有直播间的连接都断开
+        :param console: 是否接收控制台输入（工作进程中不接收）
+        """
+        await self.bootstrap()
+        self.start()
+        if console:
+            self._tasks.append(self.loop.create_task(self.console_input()))
+        results = await asyncio.gather(*(ctx.connect() for ctx in self.rooms.values()), return_exceptions=True)
+        for ctx, result in zip(self.rooms.values(), results):
+            if isinstance(result, Exception):
+                ctx.log.critical("致命错误：直播间重连失败！%s", result, extra=FATAL_STYLE)
+
+    def usage(self) -> dict:
+        """
+        每个直播间的资源占用 {房间号: RoomContext.usage()}
+        """
+        return {room_id: ctx.usage() for room_id, ctx in self.rooms.items()}
+
+    def report(self):
+        """
+        输出每个直播间的资源占用
+        """
+        for room_id, usage in self.usage().items():
+            self.log.info("[%d]【资源占用】事件 %d 个，处理耗时 %.2fs（CPU %.2f%%），状态内存约 %.1fKB",
+                          room_id, usage['events'], usage['handler_time'], usage['cpu_percent'], usage['memory_kb'])
+        self.log.info("【资源占用】共享用户信息缓存：%s", self.user_cache.stats())
+
+    async def _report_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.report()
+
+    async def _dump_metrics_loop(self, path: str, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.loop.run_in_executor(None, metrics.registry.dump, path)
+            except Exception as e:
+                self.log.error("写入运行指标文件失败！%s", e)
+
+    async def reload_config(self) -> bool:
+        """
+        重新读取配置文件：新的配置全部检查和编译成功后才替换，失败时继续使用原来的配置
+        只影响弹幕、图灵机器人、欢迎规则等运行中可以修改的配置，其余配置需要重启程序
+        :return: 是否刷新成功
+        """
+        try:
+            settings = await self.loop.run_in_executor(None, Settings.load, self.config_path)
+        except Exception as e:
+            self.log.error("刷新配置文件失败，继续使用原来的配置！%s", e)
+            return False
+        self.apply_settings(settings)
+        self.log.warning("配置文件已刷新", extra=CONSOLE_STYLE)
+        return True
+
+    def apply_settings(self, settings: Settings):
+        """
+        在事件循环上切换到新的配置快照，并推送给所有组件
+        """
+        self.settings = settings
+        self.config = settings.config
+        self.turing.apply(settings.turing)
+        for ctx in self.rooms.values():
+            ctx.apply_settings(settings)
+
+    async def _watch_config_loop(self, interval: float):
+        """
+        定时检查配置文件的修改时间，修改后自动刷新配置
+        """
+        def mtime():
+            try:
+                return os.stat(self.config_path).st_mtime
+            except OSError:
+                return None
+        last = mtime()
+        while True:
+            await asyncio.sleep(interval)
+            current = mtime()
+            if current is not None and current != last:
+                last = current
+                self.log.warning("检测到配置文件被修改，自动刷新配置...", extra=CONSOLE_STYLE)
+                await self.reload_config()
+
+    # 每日零点刷新大航海列表
+    def new_day_job(self):
+        self.log.info("新的一天到来了，执行cleanup任务！", extra=NOTICE_STYLE)
+        for ctx in self.rooms.values():
+            try:
+                ctx.refresh_dahanghai()
+            except Exception as e:
+                ctx.log.error("刷新大航海列表失败！%s", e)
+        # 刷新图灵机器人API重试次数
+        self.turing.reset_retry_count()
+
+    """
+    管理命令（控制台和管理接口共用）
+    """
+
+    def send_danmaku(self, text: str, room_id: int = None):
+        """
+        手动发送弹幕（暂停自动回复时也发送）
+        :param room_id: 房间号，None 表示第一个直播间
+        :return: 发送弹幕的 RoomContext
+        """
+        ctx = self.rooms[room_id] if room_id is not None else next(iter(self.rooms.values()))
+        ctx.ds.send_text(text, manual=True)
+        return ctx
+
+    def set_paused(self, room_id: int, paused: bool):
+        """
+        暂停或恢复直播间的自动回复（欢迎、答谢、AI回复、定时弹幕），手动发送的弹幕不受影响
+        """
+        ctx = self.rooms[room_id]
+        ctx.ds.paused = paused
+        ctx.log.warning("已%s自动回复", "暂停" if paused else "恢复", extra=CONSOLE_STYLE)
+
+    def resync_roster(self, room_id: int):
+        """
+        在后台重新获取直播间完整的大航海列表
+        """
+        self.rooms[room_id].refresh_dahanghai()
+
+    def dump_state(self) -> dict:
+        """
+        所有直播间和共享服务的状态
+        """
+        usage = self.usage()
+        return {
+            'rooms': {room_id: {
+                'streaming': ctx.is_streaming,
+                'paused': ctx.ds.paused,
+                'guards': len(ctx.roster),
+                'danmaku': ctx.ds.stats(),
+                'gifts_pending': ctx.gifts.pending,
+                'usage': usage[room_id],
+                'analytics': ctx.analytics_snapshots[-1] if ctx.analytics_snapshots else None,
+            } for room_id, ctx in self.rooms.items()},
+            'user_cache': self.user_cache.stats(),
+            'turing': self.turing.stats(),
+            'ai_active': self.ai_limit.active,
+            'jobs': {job.id: job.next_run_time for job in self.scheduler.get_jobs()},
+        }
+
+    async def console_input(self):
+        """
+        用户可以通过控制台与程序交互，'@房间号 内容' 发送到指定直播间，否则发送到第一个直播间
+        'pause 房间号' / 'resume 房间号' 暂停 / 恢复自动回复，'resync 房间号' 重新获取大航海列表
+        """
+        self.log.warning("在控制台直接输入内容即可发送弹幕！")
+        while True:
+            input_text = await utils.ainput()
+            if input_text is None:  # 没有控制台（作为服务运行），使用 [ADMIN] 管理接口
+                return
+            command, _, argument = input_text.partition(' ')
+            if input_text == 'r':  # 刷新配置文件
+                self.log.warning("刷新配置文件...", extra=CONSOLE_STYLE)
+                await self.reload_config()
+            elif input_text == 's':  # 查看弹幕发送队列状态
+                for room_id, ctx in self.rooms.items():
+                    self.log.warning("[%d]弹幕发送队列：%s", room_id, ctx.ds.stats(), extra=CONSOLE_STYLE)
+                self.log.warning("用户信息缓存：%s", self.user_cache.stats(), extra=CONSOLE_STYLE)
+                self.log.warning("图灵机器人：%s", self.turing.stats(), extra=CONSOLE_STYLE)
+                self.report()
+            elif command in ('pause', 'resume', 'resync') and argument.strip().isdigit():
+                room_id = int(argument)
+                if room_id not in self.rooms:
+                    self.log.warning("没有连接直播间 %d", room_id)
+                elif command == 'resync':
+                    self.resync_roster(room_id)
+                else:
+                    self.set_paused(room_id, command == 'pause')
+            elif input_text.startswith('@') and ' ' in input_text:  # 发送弹幕到指定直播间
+                target, text = input_text[1:].split(' ', 1)
+                if not target.isdigit() or int(target) not in self.rooms:
+                    self.log.warning("没有连接直播间 %s", target)
+                else:
+                    self.send_danmaku(text, int(target))
+            elif input_text != '':  # 发送弹幕
+                self.send_danmaku(input_text)
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           templates.py
+:project        bilibili_live_utils
+:name           弹幕模板
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/21 18:00
+:description    配置文件中 ${uname} 形式的弹幕模板在读取配置时编译（控制台输入 'r' 时重新编译），发送时只需填入内容。
+                一个模板可以用 | 分隔多种说法，随机或轮流使用；超过弹幕长度限制时优先截短用户名等填入的内容，
+                模板本身的文字尽量保留
+"""
+
+import itertools
+import random
+import re
+from configparser import RawConfigParser
+
+# 弹幕的最大长度
+MAX_LENGTH = 30
+# 截短填入的内容时使用的省略号
+ELLIPSIS = '…'
+
+# 每种弹幕可以使用的占位符，以及配置文件中没有设置时使用的模板
+TEMPLATES = {
+    'WELCOME_ENTER': (('uname', 'sex'), '欢迎${uname}进入直播间'),
+    'WELCOME_GUARD': (('uname', 'guard_type'), '欢迎${uname}${guard_type}大人进入直播间'),
+    'THANK_GIFT': (('uname', 'gift_name', 'gift_count'), '感谢${uname}赠送的${gift_name}x${gift_count}'),
+    'THANK_GUARD': (('uname', 'guard_type', 'gift_count'), '感谢${uname}开通了${gift_count}个月的${guard_type}，老板大气！'),
+    'THANK_SC': (('uname', ), '感谢${uname}赠送的醒目留言，老板大气！'),
+}
+
+_PLACEHOLDER_PATTERN = re.compile(r'\$\{(\w+)\}')
+
+
+class Template(object):
+    __slots__ = ('text', '_format', '_literal_length', '_fields')
+
+    def __init__(self, text: str, fields: tuple):
+        """
+        编译一种说法：转换成 str.format 格式，并记录模板文字本身的长度
+        :param text: 模板，例如 欢迎${uname}进入直播间
+        :param fields: 可以使用的占位符
+        :raise ValueError: 模板中有未知的占位符时抛出
+        """
+        self.text = text
+        used = _PLACEHOLDER_PATTERN.findall(text)
+        unknown = [name for name in used if name not in fields]
+        if unknown:
+            raise ValueError("模板 " + text + " 中有未知的占位符：" + ', '.join(unknown)
+                             + "（可以使用：" + ', '.join(fields) + "）")
+        literal = _PLACEHOLDER_PATTERN.split(text)[::2]
+        self._format = '{}'.join(part.replace('{', '{{').replace('}', '}}') for part in literal)
+        self._literal_length = sum(len(part) for part in literal)
+        self._fields = tuple(used)
+
+    def uses(self, field: str) -> bool:
+        """
+        模板中是否使用了这个占位符
+        """
+        return field in self._fields
+
+    def render(self, values: dict, limit: int = MAX_LENGTH) -> str:
+        """
+        填入内容，超过长度限制时先截短最长的内容，仍然超过时截断整条弹幕
+        """
+        parts = [str(values[name]) for name in self._fields]
+        length = self._literal_length + sum(len(part) for part in parts)
+        while length > limit and parts:
+            i = max(range(len(parts)), key=lambda j: len(parts[j]))
+            longest = parts[i]
+            keep = max(1, len(longest) - (length - limit) - len(ELLIPSIS))
+            if keep + len(ELLIPSIS) >= len(longest):
+                break  # 已经无法再截短
+            parts[i] = longest[:keep] + ELLIPSIS
+            length += len(parts[i]) - len(longest)
+        return self._format.format(*parts)[:limit]
+
+
+class TemplateSet(object):
+
+    def __init__(self, variants: list, mode: str = 'random'):
+        """
+        一种弹幕的所有说法
+        :param variants: 编译好的 Template
+        :param mode: random（随机） / round_robin（轮流）
+        """
+        if mode not in ('random', 'round_robin'):
+            raise ValueError("无法识别的模板选择方式：" + mode)
+        self.variants = variants
+        self._cycle = itertools.cycle(variants) if mode == 'round_robin' else None
+
+    def uses(self, field: str) -> bool:
+        """
+        是否有某种说法使用了这个占位符
+        """
+        return any(template.uses(field) for template in self.variants)
+
+    def render(self, **values) -> str:
+        if len(self.variants) == 1:
+            template = self.variants[0]
+        elif self._cycle is not None:
+            template = next(self._cycle)
+        else:
+            template = random.choice(self.variants)
+        return template.render(values)
+
+
+class MessageTemplates(object):
+
+    def __init__(self, templates: dict):
+        """
+        :param templates: {模板名: TemplateSet}
+        """
+        self._templates = templates
+
+    def render(self, name: str, **values) -> str:
+        """
+        生成一条弹幕
+        :param name: 模板名，见 TEMPLATES
+        :param values: 占位符的内容
+        """
+        return self._templates[name].render(**values)
+
+    def uses(self, name: str, field: str) -> bool:
+        """
+        模板是否使用了某个占位符，没有使用时不需要查询对应的内容（例如欢迎弹幕不使用 ${sex} 时不查询用户性别）
+        :param name: 模板名，见 TEMPLATES
+        :param field: 占位符
+        """
+        return self._templates[name].uses(field)
+
+    @classmethod
+    def from_config(cls, config=None):
+        """
+        编译配置文件 [DANMAKU] 中的所有模板，没有设置的使用 TEMPLATES 中的默认模板
+        :raise ValueError: 模板有误时抛出
+        """
+        if config is None:
+            config = RawConfigParser()
+        mode = config.get('DANMAKU', 'TEMPLATE_CHOICE', fallback='random').strip().lower()
+        templates = {}
+        for name, (fields, default) in TEMPLATES.items():
+            text = config.get('DANMAKU', name, fallback=default)
+            variants = [Template(variant.strip(), fields) for variant in re.split(r'[|\n]', text) if variant.strip()]
+            if not variants:
+                variants = [Template(default, fields)]
+            templates[name] = TemplateSet(variants, mode)
+        return cls(templates)
@@ -7,36 +7,97 @@
 :name           图灵机器人工具类
 :author         Doby2333
 :github         https://github.com/lyzhang0113/bilibili-live-utils
-:version        0.1.0
+:version        0.2.0
 :created        2021/01/31 22:04
-:description
+:description    异步的图灵机器人客户端：请求经网络请求网关的复用会话发出，相同的问题直接使用缓存的回复，
+                多个 API_KEY 优先使用当天用得最少的，并记录每个 KEY 的剩余次数
 """
 
-import requests
+import asyncio
+import copy
 import json
 import random
+import re
 import logging
+from datetime import date
+
+from scripts.cache import TTLCache
+from scripts.gateway import ApiGateway
+
+# 接口返回的 API_KEY 次数用完的错误码
+CODE_QUOTA_EXCEEDED = 4003
+
+# 归一化问题时去掉的空白和标点
+_NORMALIZE_PATTERN = re.compile(r'[\s,.!?~，。！？～、]+')
+
+
+def normalize_question(text: str) -> str:
+    """
+    归一化问题文本（去掉空白和标点，英文转小写），作为回复缓存的 key
+    """
+    return _NORMALIZE_PATTERN.sub('', text).lower()
 
 
 class TuringAI(object):
-    def __init__(self, api_url: str, api_keys: list, request_body: str, enable: bool = True):
+    def __init__(self, api_url: str, api_keys: list, request_body: str, enable: bool = True,
+                 gateway: ApiGateway = None, daily_quota: int = 100, cache_size: int = 256, cache_ttl: float = 600,
+                 store=None):
         """
         初始化图灵机器人
         :param api_url: 图灵机器人的API接口地址
         :param api_keys: 包含一个或多个API KEY的list
         :param request_body: 请求体模板
+        :param gateway: 发送请求使用的网络请求网关
+        :param daily_quota: 每个API KEY每天可以调用的次数
+        :param cache_size: 最多缓存多少个问题的回复
+        :param cache_ttl: 回复缓存的有效时间（秒），0 表示不缓存
+        :param store: 保存每个 KEY 当天用量的 StateStore（None 表示不保存，重启后用量从 0 开始）
         """
         self.api_url = api_url
-        self.api_keys = api_keys
+        self.api_keys = [key.strip() for key in api_keys if key.strip()]
         self.request_body = json.loads(request_body)
         self.enable = enable
+        self.gateway = gateway if gateway is not None else ApiGateway()
+        self.daily_quota = daily_quota
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
         self.log = logging.getLogger('bilibili_live_utils')
-        self._current_api = 0
-        self._retry_count = 0
+        self._used = {key: 0 for key in self.api_keys}  # 每个 KEY 今天已调用的次数
+        self._exhausted = set()  # 今天次数已用完的 KEY
+        self._next_key = 0  # 用量相同时轮流使用
+        self._pending = {}  # {归一化的问题: 正在进行的请求}，相同的问题只请求一次
+        self.store = store
+
+    async def restore(self):
+        """
+        从本地状态存储读取每个 KEY 今天的用量（重启后继续计数）
+        """
+        if self.store is None:
+            return
+        used, exhausted = await self.store.load_key_usage(date.today().isoformat())
+        for key in self.api_keys:
+            self._used[key] = used.get(key, 0)
+        self._exhausted = exhausted & set(self.api_keys)
+
+    def _save_usage(self):
+        if self.store is not None:
+            self.store.save_key_usage(date.today().isoformat(), self._used, self._exhausted)
 
-    def ask(self, text: str, user_id=str(random.randrange(10000000000, 99999999999))):
+    def apply(self, settings):
         """
-        向图灵机器人API发送请求
+        刷新配置后应用新的图灵机器人配置（settings.TuringSettings），保留的 KEY 今天的用量不变
+        """
+        self.enable = settings.enable
+        self.api_url = settings.api_url
+        self.request_body = json.loads(settings.request_format)
+        self.daily_quota = settings.daily_quota
+        self.api_keys = list(settings.api_keys)
+        self._used = {key: self._used.get(key, 0) for key in self.api_keys}
+        self._exhausted &= set(self.api_keys)
+        self._next_key = 0
+
+    async def ask(self, text: str, user_id: str = None):
+        """
+        向图灵机器人API发送请求，相同的问题优先使用缓存的回复
         :param text: 要发送的内容
         :param user_id: 用户id（用来区分对话，使弹幕发送者可以和机器人上下文联系对话）
         :return: 图灵机器人的回复
@@ -44,36 +105,92 @@ class TuringAI(object):
         """
         if not self.enable:
             return
-        self.log.debug("用户" + user_id + "向图灵AI请求：" + text)
-        request_body = self.request_body
+        if user_id is None:
+            user_id = str(random.randrange(10000000000, 99999999999))
+        key = normalize_question(text)
+        if key == '':
+            # 只有标点和空白的问题归一化后都是空字符串，不使用缓存，也不合并请求
+            return await self._request(text, user_id)
+        if self.cache is not None:
+            answer = self.cache.get(key)
+            if answer is not None:
+                self.log.debug("图灵AI使用缓存的回复：%s", text)
+                return answer
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._pending[key] = asyncio.ensure_future(self._request(text, user_id))
+        try:
+            answer = await asyncio.shield(pending)
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+        if self.cache is not None:
+            self.cache.set(key, answer)
+        return answer
+
+    async def _request(self, text: str, user_id: str) -> str:
+        self.log.debug("用户%s向图灵AI请求：%s", user_id, text)
+        request_body = copy.deepcopy(self.request_body)  # 请求在线程池中发出，不能修改共享的模板
         request_body['perception']['inputText']['text'] = text
         request_body['userInfo']['userId'] = user_id
-        api_key = self.api_keys[self._current_api]
-        request_body['userInfo']['apiKey'] = api_key
-
-        self.log.debug("使用API_KEY = " + api_key)
-        response = requests.post(self.api_url, json=request_body).json()
-        self.log.debug("图灵API返回：" + response)
-        response_code = response['intent']['code']
-
+        # 每个 KEY 最多尝试一次
+        for _ in range(len(self.api_keys)):
+            api_key = self._select_key()
+            if api_key is None:
+                break
+            request_body['userInfo']['apiKey'] = api_key
+            self.log.debug("使用API_KEY = %s", api_key)
+            response = await self.gateway.post_json('turing', self.api_url, request_body)
+            self.log.debug("图灵API返回：%s", response)
+            # 如果接口报请求次数限制错误，尝试下一API_KEY
+            # 等待回复期间刷新配置可能已经删除了这个 KEY，删除的 KEY 不再计数
+            configured = api_key in self._used
+            if str(response['intent']['code']) == str(CODE_QUOTA_EXCEEDED):
+                self.log.warning("API_KEY %s 次数已用完，尝试下一个API_KEY", api_key)
+                if configured:
+                    self._exhausted.add(api_key)
+                    self._save_usage()
+                continue
+            if configured:
+                self._used[api_key] += 1
+                self._save_usage()
+            return str(response['results'][0]['values']['text'])
         # 尝试所有API key仍然不行：
-        if self._retry_count >= len(self.api_keys):
-            raise ConnectionError("所有API KEY均失效")
+        raise ConnectionError("所有API KEY均失效")
 
-        # 如果接口报请求次数限制错误，尝试下一API_KEY
-        if str(response_code) == '4003':
-            self.log.warning("当前API_KEY次数已用完，尝试下一个API_KEY")
-            self._retry_count += 1
-            self._current_api = self._current_api + 1 if self._current_api < len(self.api_keys) else 0
-            return self.ask(text=text, user_id=user_id)
+    def _select_key(self):
+        """
+        选择今天用得最少且还有剩余次数的 KEY，用量相同时轮流使用
+        :return: API KEY，全部用完时返回 None
+        """
+        best = None
+        count = len(self.api_keys)
+        for i in range(count):
+            key = self.api_keys[(self._next_key + i) % count]
+            if key in self._exhausted or self._used.get(key, 0) >= self.daily_quota:
+                continue
+            if best is None or self._used.get(key, 0) < self._used.get(best, 0):
+                best = key
+        if best is not None:
+            self._next_key = (self.api_keys.index(best) + 1) % count
+        return best
 
-        response_text = str(response['results'][0]['values']['text'])
-        self._retry_count = 0
-        return response_text
+    def stats(self) -> dict:
+        """
+        每个 API KEY 今天的剩余次数，以及回复缓存的命中情况
+        """
+        return {
+            'remaining': {key[-6:]: 0 if key in self._exhausted else max(0, self.daily_quota - self._used.get(key, 0))
+                          for key in self.api_keys},
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
 
     def reset_retry_count(self):
         """
-        清空重试次数。API调用次数每日更新，即每日零点应触发一次。
+        清空每个 KEY 的用量。API调用次数每日更新，即每日零点应触发一次。
         :return: None
         """
-        self._retry_count = 0
+        self._used = {key: 0 for key in self.api_keys}
+        self._exhausted.clear()
+        self._save_usage()
@@ -16,24 +16,42 @@ import os
 import logging
 import re
 import sys
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from configparser import RawConfigParser
-from bilibili_api import live
 
 # Constants
 guard_name = {0: "用户", 1: "总督", 2: "提督", 3: "舰长"}  # 大航海类型映射关系
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')  # ANSI颜色标记
+
+
+def enable_utf8_console():
+    """
+    使 Windows 控制台用 utf-8 编码输出（代替 chcp 65001，不需要启动子进程）
+    """
+    if os.name != 'nt':
+        return
+    import ctypes
+    ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+    ctypes.windll.kernel32.SetConsoleCP(65001)
+
+
+_input_executor = None  # 读取控制台输入的线程（第一次读取时创建，之后一直使用）
 
 
 async def ainput(prompt: str = ""):
     """
     异步等待用户输入
     :param prompt: 提示语
-    :return: 用户输入的内容
+    :return: 用户输入的内容，输入结束（EOF）时返回 None
     """
-    with ThreadPoolExecutor(1, "AsyncInput", lambda x: print(x, end="", flush=True), (prompt,)) as executor:
-        return (await asyncio.get_event_loop().run_in_executor(
-            executor, sys.stdin.readline
-        )).rstrip()
+    global _input_executor
+    if _input_executor is None:
+        _input_executor = ThreadPoolExecutor(1, "AsyncInput")
+    if prompt != "":
+        print(prompt, end="", flush=True)
+    line = await asyncio.get_event_loop().run_in_executor(_input_executor, sys.stdin.readline)
+    return line.rstrip() if line != "" else None
 
 
 def config_check(config: RawConfigParser, path: str):
@@ -51,10 +69,24 @@ def config_check(config: RawConfigParser, path: str):
         '读取配置文件 ' + path + ' 失败！请确认 ' + path + ' 存在且编码格式为 utf-8 ！'
     assert config.has_option('LIVE', 'ROOM_ID'), \
         '配置文件缺少 [LIVE] 中的 ROOM_ID 属性，请指定要链接的直播间号码！'
+    for section in config.sections():
+        if section.startswith('LIVE:'):
+            assert config.has_option(section, 'ROOM_ID'), \
+                '配置文件缺少 [' + section + '] 中的 ROOM_ID 属性，请指定要链接的直播间号码！'
+    room_ids = get_room_ids(config)
+    assert len(set(room_ids)) == len(room_ids), \
+        '配置文件中有重复的直播间号码！'
     assert config.has_option('USER', 'SESSDATA'), \
         '配置文件缺少 [USER] 中的 SESSDATA 属性，请指定登陆用户的 SESSDATA ！'
     assert config.has_option('USER', 'BILIBILI_JCT'), \
         '配置文件缺少 [USER] 中的 CSRF 属性，请指定登陆用户的 CSRF ！'
+    for section in config.sections():
+        if section.startswith('USER:'):
+            assert config.has_option(section, 'SESSDATA') and config.has_option(section, 'BILIBILI_JCT'), \
+                '配置文件缺少 [' + section + '] 中的 SESSDATA 或 BILIBILI_JCT 属性，请指定发送弹幕账号的 COOKIE ！'
+    assert any(config.getboolean(section, 'SEND', fallback=True) for section in config.sections()
+               if section == 'USER' or section.startswith('USER:')), \
+        '配置文件中没有发送弹幕的账号！请至少为一个 [USER] 设置 SEND = True ！'
     assert config.has_option('LOG', 'LEVEL'), \
         '配置文件缺少 [LOG] 中的 LEVEL 属性，请指定程序日志等级！'
     assert config.has_option('LOG', 'FORMAT'), \
@@ -87,20 +119,72 @@ def config_check(config: RawConfigParser, path: str):
         '配置文件缺少 [TURING_AI] 中的 REQUEST_FORMAT 属性！请指定图灵机器人的请求模板！'
 
 
-def get_dahanghai_dict(room_id: int):
+def get_room_ids(config: RawConfigParser) -> list:
+    """
+    获取配置文件中所有要连接的直播间号码，[LIVE] 为第一个直播间，其余的写在 [LIVE:名字] 中
+    :param config: RawConfigParser 配置文件类
+    :return: 直播间号码列表
+    """
+    return [config.getint(section, 'ROOM_ID') for section in config.sections()
+            if section == 'LIVE' or section.startswith('LIVE:')]
+
+
+def bilibili_api_version() -> str:
+    """
+    已安装的 bilibili_api 的版本号，替换库内部的函数前用来确认是验证过的版本
+    :return: 版本号，无法获取时返回空字符串
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return ''
+    try:
+        return version('bilibili-api')
+    except PackageNotFoundError:
+        return ''
+
+
+def deep_getsizeof(obj, seen: set = None) -> int:
+    """
+    估算对象及其包含的所有对象占用的内存（字节），同一个对象只计算一次
+    :param obj: 要计算的对象
+    :param seen: 已经计算过的对象 id
+    :return: 占用的字节数
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_getsizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+async def cached(cache, key, loader, *args, **kwargs):
     """
-    获取指定直播间的大航海成员字典
-    :param room_id: 直播间ID
-    :return: 包含所有大航海成员的字典 {uid: 大航海等级}
+    先从缓存读取，没有时调用 loader 获取并写入缓存
+    :param cache: TTLCache 缓存
+    :param key: 缓存的 key
+    :param loader: 缓存中没有时用来获取数据的异步方法，参数为 *args, **kwargs
+    :return: 缓存中或 loader 返回的数据
     """
-    return {r['uid']: r['guard_level'] for r in live.get_dahanghai(room_id)}
+    value = cache.get(key)
+    if value is None:
+        value = await loader(*args, **kwargs)
+        cache.set(key, value)
+    return value
 
 
 class TrimColorFormatter(logging.Formatter):
     """
-    去除ANSI颜色标记
+    去除ANSI颜色标记（只处理格式化后的文本，不修改日志记录本身）
     """
     def format(self, record: logging.LogRecord) -> str:
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        record.msg = ansi_escape.sub('', record.msg)
-        return super(TrimColorFormatter, self).format(record)
+        text = super(TrimColorFormatter, self).format(record)
+        return ANSI_ESCAPE.sub('', text) if '\x1b' in text else text
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           welcome_rules.py
+:project        bilibili_live_utils
+:name           欢迎规则
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/21 15:00
+:description    决定用户进入直播间时是否欢迎。规则在读取配置时编译成判断函数，按顺序匹配，第一条满足的规则决定结果；
+                只用到进入事件自带字段的规则不需要任何网络请求，只有轮到需要粉丝数、性别等信息的规则时才查询用户信息
+
+                规则格式（每行一条）：  动作: 条件 and 条件 ...
+                动作为 welcome（欢迎）或 ignore（不欢迎），条件为 字段 运算符 值，值可以是数字、'文字' 或另一个字段，
+                例如：  welcome: medal_room == room and medal_level >= 5
+                        ignore: medal_level == 0
+                        welcome: follower >= 10000
+"""
+
+import operator
+import re
+
+WELCOME = 'welcome'
+IGNORE = 'ignore'
+
+# 没有配置规则时使用（即原来的规则：持有本直播间5级以上粉丝牌，或粉丝数大于10000）
+DEFAULT_RULES = """
+welcome: medal_room == room and medal_level >= 5
+welcome: follower >= 10000
+"""
+
+# 进入事件自带的字段（不需要网络请求）
+LOCAL_FIELDS = frozenset(('uid', 'uname', 'room', 'msg_type', 'identities', 'guard_level', 'medal_level', 'medal_name',
+                          'medal_room', 'medal_uid', 'medal_lighted', 'medal_guard_level'))
+# 需要查询用户信息才能得到的字段 {字段: 信息来源}
+REMOTE_FIELDS = {
+    'follower': 'relation',  # 粉丝数
+    'following': 'relation',  # 关注数
+    'sex': 'info',  # '男', '女', '保密'
+    'level': 'info',  # B站等级
+}
+
+_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+    'has': operator.contains,  # 列表字段包含某个值，例如 identities has 3
+}
+_CONDITION_PATTERN = re.compile(r"^\s*(\w+)\s*(==|!=|>=|<=|>|<|\bhas\b)\s*(.+?)\s*$")
+_AND_PATTERN = re.compile(r'\s+and\s+')
+
+
+def _compile_condition(text: str):
+    """
+    编译一个条件
+    :return: (判断函数, 用到的字段)
+    """
+    match = _CONDITION_PATTERN.match(text)
+    if match is None:
+        raise ValueError("无法识别的条件：" + text)
+    field, op, value = match.groups()
+    func = _OPERATORS[op]
+    fields = {field}
+    if value[0] in '\'"' and value[-1] == value[0] and len(value) >= 2:
+        value = value[1:-1]
+    elif re.match(r'^-?\d+$', value):
+        value = int(value)
+    elif value.lower() in ('true', 'false'):
+        value = value.lower() == 'true'
+    elif value in LOCAL_FIELDS or value in REMOTE_FIELDS:
+        # 和另一个字段比较
+        other = value
+        fields.add(other)
+        return (lambda f: func(f[field], f[other])), fields
+    else:
+        raise ValueError("无法识别的值：" + value)
+    return (lambda f: func(f[field], value)), fields
+
+
+class Rule(object):
+    __slots__ = ('action', 'text', 'sources', '_conditions')
+
+    def __init__(self, action: str, text: str):
+        """
+        编译一条规则
+        :param action: welcome / ignore
+        :param text: 以 and 连接的条件，* 表示总是满足
+        """
+        if action not in (WELCOME, IGNORE):
+            raise ValueError("无法识别的动作：" + action)
+        self.action = action
+        self.text = text
+        self._conditions = []
+        fields = set()
+        if text != '*':
+            for part in _AND_PATTERN.split(text):
+                condition, used = _compile_condition(part)
+                self._conditions.append(condition)
+                fields |= used
+        unknown = fields - LOCAL_FIELDS - REMOTE_FIELDS.keys()
+        if unknown:
+            raise ValueError("未知的字段：" + ', '.join(sorted(unknown)))
+        # 需要查询的用户信息，为空表示只用本地字段就能判断
+        self.sources = frozenset(REMOTE_FIELDS[field] for field in fields if field in REMOTE_FIELDS)
+
+    def __call__(self, fields: dict) -> bool:
+        for condition in self._conditions:
+            if not condition(fields):
+                return False
+        return True
+
+    def __repr__(self):
+        return self.action + ': ' + self.text
+
+
+class WelcomeRules(object):
+
+    def __init__(self, rules: list, default: str = IGNORE):
+        """
+        初始化规则列表
+        :param rules: 按顺序匹配的 Rule
+        :param default: 所有规则都不满足时的结果
+        """
+        if default not in (WELCOME, IGNORE):
+            raise ValueError("无法识别的默认动作：" + default)
+        self.default = default
+        self.rules = self._reorder(rules)
+
+    @classmethod
+    def parse(cls, text: str, default: str = IGNORE):
+        """
+        从配置文件的多行文本编译规则（空行忽略）
+        :raise ValueError: 规则格式有误时抛出
+        """
+        rules = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line == '':
+                continue
+            action, sep, condition = line.partition(':')
+            if not sep:
+                raise ValueError("规则缺少动作（welcome: 或 ignore:）：" + line)
+            rules.append(Rule(action.strip().lower(), condition.strip()))
+        return cls(rules, default.strip().lower())
+
+    @staticmethod
+    def _reorder(rules: list) -> list:
+        """
+        在连续的同一动作的规则中，把只用本地字段的规则移到前面（结果不变，但能少查询用户信息）
+        """
+        ordered = []
+        run = []
+        for rule in rules:
+            if run and rule.action != run[0].action:
+                ordered += sorted(run, key=lambda r: len(r.sources) > 0)
+                run = []
+            run.append(rule)
+        ordered += sorted(run, key=lambda r: len(r.sources) > 0)
+        return ordered
+
+    async def evaluate(self, fields: dict, enrich) -> bool:
+        """
+        按顺序匹配规则，决定是否欢迎
+        :param fields: 进入事件的本地字段，查询到的用户信息也会写入其中
+        :param enrich: 异步方法 enrich(source, fields)，把 relation / info 的字段写入 fields
+        :return: 是否欢迎
+        """
+        loaded = set()
+        for rule in self.rules:
+            for source in rule.sources:
+                if source not in loaded:
+                    await enrich(source, fields)
+                    loaded.add(source)
+            if rule(fields):
+                return rule.action == WELCOME
+        return self.default == WELCOME
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           workers.py
+:project        bilibili_live_utils
+:name           多进程直播间分片
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/19 15:10
+:description    直播间较多时，把直播间按一致性哈希分配到多个工作进程，每个进程运行一个 Supervisor。
+                主进程定时检查工作进程的心跳，重启崩溃或卡死的进程，并汇总所有进程上报的资源占用
+"""
+
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+from scripts import utils
+from scripts.log_pipeline import style
+
+# 日志颜色（只在控制台显示）
+ERROR_STYLE = style('red')
+
+
+class ConsistentHashRing(object):
+
+    def __init__(self, nodes: list, replicas: int = 100):
+        """
+        初始化一致性哈希环，增减节点时只有少量的 key 会换到别的节点
+        :param nodes: 节点列表
+        :param replicas: 每个节点在环上的虚拟节点数量，越多分配越均匀
+        """
+        self._ring = []
+        self._nodes = {}  # {哈希值: 节点}
+        for node in nodes:
+            for i in range(replicas):
+                h = self._hash(str(node) + '#' + str(i))
+                self._nodes[h] = node
+                bisect.insort(self._ring, h)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def get(self, key):
+        """
+        获取 key 所属的节点
+        """
+        index = bisect.bisect(self._ring, self._hash(str(key))) % len(self._ring)
+        return self._nodes[self._ring[index]]
+
+
+def _worker_main(index: int, room_ids: list, config_path: str, reports, heartbeat: float):
+    """
+    工作进程入口：只连接分配给该进程的直播间，并定时上报心跳和资源占用
+    """
+    import asyncio
+    from scripts import main
+    from scripts.supervisor import Supervisor
+
+    config = main.load_config(config_path)
+    main.setup_logging(config, room_ids, 'worker' + str(index))
+    supervisor = Supervisor(config, config_path, room_ids, index)
+
+    async def report_loop():
+        while True:
+            reports.put({'worker': index, 'pid': os.getpid(), 'time': time.time(), 'rooms': supervisor.usage(),
+                         'queues': {room_id: ctx.ds.stats() for room_id, ctx in supervisor.rooms.items()},
+                         'cache': supervisor.user_cache.stats()})
+            await asyncio.sleep(heartbeat)
+
+    task = supervisor.loop.create_task(report_loop())
+    try:
+        supervisor.loop.run_until_complete(supervisor.run(console=False))
+    finally:
+        task.cancel()
+        supervisor.stop()
+
+
+class WorkerPool(object):
+
+    def __init__(self, config, config_path: str, processes: int, heartbeat: float = 5, timeout: float = 30,
+                 report_interval: float = 600):
+        """
+        初始化工作进程池
+        :param config: 已读取的配置文件
+        :param config_path: 配置文件路径（工作进程各自读取）
+        :param processes: 工作进程数量
+        :param heartbeat: 工作进程上报心跳的间隔（秒）
+        :param timeout: 超过多少秒没有心跳认为进程卡死，重启该进程
+        :param report_interval: 输出所有进程资源占用汇总的间隔（秒），0 表示不输出
+        """
+        self.config_path = config_path
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.report_interval = report_interval
+        self.log = logging.getLogger('bilibili_live_utils')
+        ring = ConsistentHashRing(range(processes))
+        self.assignment = {i: [] for i in range(processes)}  # {进程编号: [房间号]}
+        for room_id in utils.get_room_ids(config):
+            self.assignment[ring.get(room_id)].append(room_id)
+        self._context = multiprocessing.get_context('spawn')  # Windows 下只能 spawn，各平台行为保持一致
+        self._reports = self._context.Queue()
+        self._processes = {}  # {进程编号: Process}
+        self._last_seen = {}  # {进程编号: 最后一次心跳的时间}
+        self._started = {}  # {进程编号: 启动时间}
+        self._restarts = {}  # {进程编号: 连续重启次数}
+        self.restart_count = {}  # {进程编号: 总重启次数}
+        self._restart_at = {}  # {进程编号: 下一次可以重启的时间}
+        self.metrics = {}  # {进程编号: 最近一次上报的资源占用}
+
+    def start(self):
+        """
+        启动所有分配到直播间的工作进程
+        """
+        for index, room_ids in self.assignment.items():
+            if room_ids:
+                self.log.info("工作进程 %d 负责直播间：%s", index, ', '.join(str(r) for r in room_ids))
+                self._spawn(index)
+
+    def stop(self):
+        """
+        结束所有工作进程
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(5)
+        self._processes = {}
+
+    def run(self):
+        """
+        启动工作进程，然后一直检查心跳、收集上报的资源占用，直到被中断
+        """
+        self.start()
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while True:
+                deadline = time.monotonic() + self.heartbeat
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        self._collect(self._reports.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self.check()
+                if self.report_interval > 0 and time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + self.report_interval
+        finally:
+            self.stop()
+
+    def check(self):
+        """
+        检查所有工作进程，重启已退出或长时间没有心跳的进程（连续重启时等待时间加倍，最长一分钟）
+        """
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                if now - self._last_seen[index] <= self.timeout:
+                    continue
+                self.log.error("工作进程 %d 超过%s秒没有响应，重启该进程！", index, self.timeout, extra=ERROR_STYLE)
+                process.terminate()
+                process.join(5)
+            elif index not in self._restart_at:
+                self.log.error("工作进程 %d 已退出（exitcode=%s），准备重启！", index, process.exitcode, extra=ERROR_STYLE)
+            restarts = self._restarts.get(index, 0)
+            restart_at = self._restart_at.setdefault(index, now + min(60, 2 ** restarts - 1))
+            if now >= restart_at:
+                del self._restart_at[index]
+                self._restarts[index] = restarts + 1
+                self.restart_count[index] = self.restart_count.get(index, 0) + 1
+                self._spawn(index)
+
+    def report(self):
+        """
+        输出所有工作进程的资源占用汇总
+        """
+        events, handler_time, memory = 0, 0.0, 0.0
+        for index, metrics in sorted(self.metrics.items()):
+            rooms = metrics['rooms']
+            worker_events = sum(usage['events'] for usage in rooms.values())
+            worker_time = sum(usage['handler_time'] for usage in rooms.values())
+            worker_memory = sum(usage['memory_kb'] for usage in rooms.values())
+            dropped = sum(stats['dropped'] for stats in metrics['queues'].values())
+            self.log.info("【工作进程 %d】pid %d，直播间 %d 个，事件 %d 个，处理耗时 %.2fs，状态内存约 %.1fKB，丢弃弹幕 %d 条，重启 %d 次",
+                index, metrics['pid'], len(rooms), worker_events, worker_time, worker_memory, dropped,
+                self.restart_count.get(index, 0))
+            events += worker_events
+            handler_time += worker_time
+            memory += worker_memory
+        self.log.info("【资源占用汇总】工作进程 %d 个，事件 %d 个，处理耗时 %.2fs，状态内存约 %.1fKB",
+            len(self.metrics), events, handler_time, memory)
+
+    def _spawn(self, index: int):
+        process = self._context.Process(target=_worker_main, name='bilibili_live_utils-worker' + str(index),
+                                        args=(index, self.assignment[index], self.config_path, self._reports,
+                                              self.heartbeat))
+        process.start()
+        self._processes[index] = process
+        self._started[index] = self._last_seen[index] = time.monotonic()  # 给新进程留出初始化的时间
+
+    def _collect(self, metrics: dict):
+        index = metrics['worker']
+        process = self._processes.get(index)
+        if process is None or process.pid != metrics['pid']:
+            return  # 已经被替换的旧进程
+        self._last_seen[index] = time.monotonic()
+        if self._last_seen[index] - self._started[index] > self.timeout:
+            self._restarts[index] = 0  # 已经稳定运行，不再算作连续重启
+        self.metrics[index] = metrics
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           conftest.py
+:project        bilibili_live_utils
+:name           单元测试的公共夹具
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    在项目根目录运行： python -m pytest -q
+"""
+
+import time
+
+import pytest
+
+
+class FakeClock(object):
+    """
+    代替 time.monotonic 和 time.time 的时钟，只在调用 advance 时前进
+    """
+
+    def __init__(self, start: float = 1000000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    替换 time.monotonic 和 time.time（不能和事件循环中的 sleep 一起使用）
+    """
+    fake = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    monkeypatch.setattr(time, 'time', fake)
+    return fake
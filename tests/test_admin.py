@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_admin.py
+:project        bilibili_live_utils
+:name           管理接口测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    AdminServer 读取请求时对 Content-Length 的检查，以及命令的分发和错误
+"""
+
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+from scripts.admin import MAX_BODY, AdminError, AdminServer
+
+
+def read(data: bytes):
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await AdminServer._read_request(reader)
+
+    return asyncio.run(main())
+
+
+def request(length: str = None, body: bytes = b'') -> bytes:
+    head = b'POST /send/?a=1 HTTP/1.1\r\nHost: localhost\r\nX-Admin-Token: t\r\n'
+    if length is not None:
+        head += b'Content-Length: ' + length.encode('latin-1') + b'\r\n'
+    return head + b'\r\n' + body
+
+
+def test_read_request():
+    method, path, headers, body = read(request('2', b'{}'))
+    assert (method, path, body) == ('POST', '/send', b'{}')
+    assert headers['x-admin-token'] == 't'
+
+
+@pytest.mark.parametrize('length, body', [(None, b''), ('', b''), ('0', b''), ('0002', b'{}'),
+                                          ('0' * 100 + '2', b'{}')])
+def test_content_length_variants(length, body):
+    assert read(request(length, body))[3] == body
+
+
+@pytest.mark.parametrize('length, status', [
+    ('-1', HTTPStatus.BAD_REQUEST),
+    ('abc', HTTPStatus.BAD_REQUEST),
+    ('1e3', HTTPStatus.BAD_REQUEST),
+    (str(MAX_BODY + 1), HTTPStatus.REQUEST_ENTITY_TOO_LARGE),
+    ('9' * 5000, HTTPStatus.REQUEST_ENTITY_TOO_LARGE),
+])
+def test_invalid_content_length(length, status):
+    with pytest.raises(AdminError) as info:
+        read(request(length))
+    assert info.value.status == status
+
+
+def test_malformed_request_line():
+    with pytest.raises(AdminError) as info:
+        read(b'GET /status\r\n\r\n')
+    assert info.value.status == HTTPStatus.BAD_REQUEST
+
+
+class FakeContext(object):
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+
+
+class FakeSupervisor(object):
+    """
+    记录执行过的命令
+    """
+
+    def __init__(self):
+        self.rooms = {100: None, 200: None}
+        self.calls = []
+
+    def dump_state(self):
+        return {'rooms': list(self.rooms)}
+
+    def send_danmaku(self, text, room_id):
+        self.calls.append(('send', text, room_id))
+        return FakeContext(room_id or 100)
+
+    def set_paused(self, room_id, paused):
+        self.calls.append(('pause', room_id, paused))
+
+    def resync_roster(self, room_id):
+        self.calls.append(('resync', room_id))
+
+
+def dispatch(server: AdminServer, method: str, path: str, body: bytes = b''):
+    return asyncio.run(server.dispatch(method, path, body))
+
+
+def test_dispatch_commands():
+    server = AdminServer(FakeSupervisor())
+    assert dispatch(server, 'GET', '/status') == {'rooms': [100, 200]}
+    assert dispatch(server, 'POST', '/send', '{"text": " 弹幕 "}'.encode('utf-8')) == {'room': 100}
+    assert dispatch(server, 'POST', '/send', b'{"text": "hi", "room": "200"}') == {'room': 200}
+    assert dispatch(server, 'POST', '/rooms/200/pause') == {'room': 200, 'paused': True}
+    assert dispatch(server, 'POST', '/rooms/200/resync') == {'room': 200}
+    assert server.supervisor.calls == [('send', '弹幕', None), ('send', 'hi', 200), ('pause', 200, True),
+                                       ('resync', 200)]
+
+
+@pytest.mark.parametrize('method, path, body, status', [
+    ('GET', '/send', b'', HTTPStatus.NOT_FOUND),
+    ('POST', '/unknown', b'', HTTPStatus.NOT_FOUND),
+    ('POST', '/send', b'not json', HTTPStatus.BAD_REQUEST),
+    ('POST', '/send', b'[1]', HTTPStatus.BAD_REQUEST),
+    ('POST', '/send', b'{"text": "  "}', HTTPStatus.BAD_REQUEST),
+    ('POST', '/send', b'{"text": "hi", "room": "abc"}', HTTPStatus.BAD_REQUEST),
+    ('POST', '/rooms/300/pause', b'', HTTPStatus.NOT_FOUND),
+    ('POST', '/rooms/100/stop', b'', HTTPStatus.NOT_FOUND),
+])
+def test_dispatch_errors(method, path, body, status):
+    server = AdminServer(FakeSupervisor())
+    with pytest.raises(AdminError) as info:
+        dispatch(server, method, path, body)
+    assert info.value.status == status
+    assert server.supervisor.calls == []
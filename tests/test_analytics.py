@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_analytics.py
+:project        bilibili_live_utils
+:name           弹幕统计测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    ChatAnalytics 的滑动窗口：时间桶滑出窗口后不再计入统计
+"""
+
+import pytest
+
+from scripts.analytics import ChatAnalytics
+
+
+@pytest.fixture
+def analytics(clock):
+    clock.now = 6000000.0  # 从一个时间桶的起点开始
+    return ChatAnalytics(window=600, buckets=10, top_n=3)
+
+
+def test_counts_within_window(analytics, clock):
+    for i in range(30):
+        analytics.add_danmaku(i % 3, 'user%d' % (i % 3), '主播唱歌好听')
+    analytics.add_enter()
+    analytics.add_gift('gold', 1000)
+    analytics.add_gift('silver', 500)
+    snapshot = analytics.snapshot()
+    assert snapshot['danmaku_per_minute'] == 3
+    assert snapshot['enters_per_minute'] == 0.1
+    assert snapshot['gifts_per_minute'] == 0.2
+    assert snapshot['gold_per_minute'] == 100
+    assert snapshot['unique_chatters'] == 3
+    assert sorted(snapshot['top_senders']) == [('user0', 10), ('user1', 10), ('user2', 10)]
+    assert analytics.danmaku_rate() == 30  # 只有一个时间桶有数据
+
+
+def test_window_slides(analytics, clock):
+    for _ in range(10):
+        analytics.add_danmaku(1, 'old', '第一段')
+    clock.advance(300)
+    for _ in range(5):
+        analytics.add_danmaku(2, 'new', '第二段')
+    snapshot = analytics.snapshot()
+    assert snapshot['danmaku_per_minute'] == 1.5
+    assert snapshot['top_senders'][0] == ('old', 10)
+
+    clock.advance(330)  # 第一段所在的时间桶滑出窗口
+    snapshot = analytics.snapshot()
+    assert snapshot['danmaku_per_minute'] == 0.5
+    assert snapshot['top_senders'] == [('new', 5)]
+    assert snapshot['unique_chatters'] == 1
+    assert snapshot['total_danmaku'] == 15
+
+    clock.advance(600)
+    snapshot = analytics.snapshot()
+    assert snapshot['danmaku_per_minute'] == 0
+    assert snapshot['top_senders'] == []
+    assert snapshot['top_keywords'] == []
+    assert analytics.danmaku_rate() == 0
+
+
+def test_memory_does_not_grow(analytics, clock):
+    nbytes = analytics.nbytes
+    for i in range(5000):
+        analytics.add_danmaku(i, 'user%d' % i, '弹幕%d' % i)
+        clock.advance(1)
+    assert analytics.nbytes == nbytes
+    assert len(analytics.snapshot()['top_senders']) <= 3
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_cache.py
+:project        bilibili_live_utils
+:name           缓存测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    TTLCache 和 ExpiringSet
+"""
+
+from scripts.cache import ExpiringSet, TTLCache
+
+
+def test_ttl_cache_hit_miss_and_expiry(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=5)
+    assert cache.get('a') == 1
+    assert cache.get('missing') is None
+    clock.advance(10)
+    assert cache.get('b', 'default') == 'default'
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.stats() == {'size': 1, 'hits': 2, 'misses': 3, 'evictions': 0}
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_save_and_load(clock, tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('kept', {'sex': '女'})
+    cache.set('expired', 1, ttl=1)
+    clock.advance(2)
+    cache.save(path)
+    loaded = TTLCache(maxsize=10, ttl=60)
+    loaded.load(path)
+    assert len(loaded) == 1
+    assert loaded.get('kept') == {'sex': '女'}
+
+
+def test_ttl_cache_load_ignores_broken_file(tmp_path):
+    path = tmp_path / 'cache.json'
+    path.write_text('not json', encoding='utf-8')
+    cache = TTLCache()
+    cache.load(str(path))
+    assert len(cache) == 0
+
+
+def test_expiring_set_expires_items(clock):
+    seen = ExpiringSet(ttl=10)
+    seen.add(1)
+    assert 1 in seen
+    clock.advance(11)
+    assert 1 not in seen
+    assert len(seen) == 0
+
+
+def test_expiring_set_without_ttl_keeps_items(clock):
+    seen = ExpiringSet()
+    seen.add(1)
+    clock.advance(10 ** 6)
+    assert 1 in seen
+    seen.clear()
+    assert 1 not in seen
+
+
+def test_expiring_set_expires_by_time_not_insertion_order(clock):
+    # 先加入的元素过期时间更晚（例如恢复的欢迎记录只剩下部分时间）
+    seen = ExpiringSet(ttl=100)
+    seen.add('long')
+    seen.add('short', ttl=1)
+    clock.advance(2)
+    seen.add('new')
+    assert len(seen) == 2
+    assert 'long' in seen and 'new' in seen and 'short' not in seen
+
+
+def test_expiring_set_drops_expired_before_live_items(clock):
+    seen = ExpiringSet(maxsize=2, ttl=100)
+    seen.add('live')
+    seen.add('short', ttl=1)
+    clock.advance(2)
+    seen.add('new')
+    assert 'live' in seen and 'new' in seen
+
+
+def test_expiring_set_evicts_soonest_expiring_when_full(clock):
+    seen = ExpiringSet(maxsize=2, ttl=100)
+    seen.add('a')
+    seen.add('b', ttl=50)
+    seen.add('c')
+    assert 'b' not in seen
+    assert 'a' in seen and 'c' in seen
+
+
+def test_expiring_set_refresh_extends_expiry(clock):
+    seen = ExpiringSet(maxsize=2, ttl=10)
+    seen.add('a')
+    clock.advance(5)
+    seen.add('b')
+    seen.add('a')  # 刷新后 a 比 b 晚过期
+    seen.add('c')
+    assert 'b' not in seen
+    assert 'a' in seen and 'c' in seen
+    for _ in range(1000):
+        seen.add('a')
+    assert len(seen._heap) < 100
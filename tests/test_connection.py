@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_connection.py
+:project        bilibili_live_utils
+:name           直播间连接管理测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    ConnectionManager 的重连、连接出错后恢复直播间的连接状态，以及只对自己的直播间使用查询好的连接信息
+"""
+
+import asyncio
+import logging
+
+import pytest
+from bilibili_api import exceptions, live
+
+from scripts.connection import ConnectionManager
+
+LOG = logging.getLogger('test')
+
+
+class FakeRoom(object):
+    """
+    模拟 bilibili_api 3.2 的 LiveDanmaku：连接后出现 ConnectionClosed 以外的异常时状态停在 1（已连接），
+    心跳任务继续运行，之后 connect 抛出“不可重复连接”。errors 中的异常依次在连接后抛出，用完后连接成功
+    """
+
+    def __init__(self, errors: list):
+        self.errors = list(errors)
+        self.room_real_id = 100
+        self.manager = None
+        self.status = 0
+        self.attempts = 0
+        self.disconnects = 0
+        self.heartbeats = []
+        self._LiveDanmaku__heartbeat_task = None
+
+    def get_connect_status(self):
+        return self.status
+
+    def disconnect(self):
+        self.disconnects += 1
+        self.status = 2
+
+    def connect(self, return_coroutine: bool = False):
+        if self.status == 1:
+            raise exceptions.LiveException("已连接直播间，不可重复连接")
+        return self._main()
+
+    async def _main(self):
+        self.attempts += 1
+        self.status = 1
+        self._LiveDanmaku__heartbeat_task = asyncio.get_event_loop().create_task(asyncio.sleep(30))
+        self.heartbeats.append(self._LiveDanmaku__heartbeat_task)
+        if self.errors:
+            raise self.errors.pop(0)
+        self.manager.on_event('VIEW')
+        self.manager.stop()
+
+
+def run_manager(room: FakeRoom, **kwargs) -> ConnectionManager:
+    async def main():
+        manager = ConnectionManager(room, 100, base_delay=0, log=LOG, **kwargs)
+        room.manager = manager
+        await manager.run()
+        await asyncio.sleep(0)  # 让取消的心跳任务结束
+        return manager
+
+    return asyncio.run(main())
+
+
+def test_recovers_room_after_unexpected_error():
+    room = FakeRoom([KeyError('cmd')])
+    manager = run_manager(room)
+    assert room.attempts == 2
+    assert manager.attempts == 1 and manager.connected
+    assert room.disconnects == 2  # 出错后恢复一次，stop 断开一次
+    assert all(task.cancelled() for task in room.heartbeats)
+
+
+def test_gives_up_after_max_retries():
+    room = FakeRoom([OSError('网络不可用')] * 3)
+    with pytest.raises(ConnectionError):
+        run_manager(room, max_retries=2)
+    assert room.attempts == 3 and room.status == 2
+
+
+def test_first_connect_calls_on_connect_once():
+    connected = []
+    room = FakeRoom([])
+    manager = run_manager(room, on_connect=lambda: connected.append(True))
+    assert connected == [True] and manager.reconnects == 0
+
+
+class FakeGateway(object):
+    """
+    记录通过网关的查询，聊天服务器列表为空（库不会真正连接）
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_room_play_info(self, room_id, verify):
+        self.calls.append(('play_info', room_id))
+        return {'room_id': 6154037}
+
+    async def get_chat_conf(self, room_real_id, verify):
+        self.calls.append(('chat_conf', room_real_id))
+        return {'host_server_list': [], 'token': ''}
+
+    async def get_self_info(self, verify):
+        self.calls.append(('self_info', ))
+        return {'mid': 1}
+
+
+def test_prefetched_queries_are_scoped_to_the_room(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('连接时不应在事件循环上查询')
+
+    monkeypatch.setattr(live, 'get_room_play_info', fail)
+    monkeypatch.setattr(live, 'get_chat_conf', fail)
+    gateway = FakeGateway()
+
+    async def main():
+        room = live.LiveDanmaku(room_display_id=732, should_reconnect=False)
+        other = live.LiveDanmaku(room_display_id=733, should_reconnect=False)
+        manager = ConnectionManager(room, 732, base_delay=0, max_retries=1, gateway=gateway, log=LOG)
+        with pytest.raises(ConnectionError):
+            await manager.run()
+        return room, other, manager
+
+    room, other, manager = asyncio.run(main())
+    assert gateway.calls == [('play_info', 732), ('chat_conf', 6154037), ('play_info', 6154037),
+                             ('chat_conf', 6154037)]
+    assert room.room_real_id == 6154037 and manager._prefetched == {}
+    # 模块和其他直播间不受影响
+    assert live.get_room_play_info is fail
+    assert '_LiveDanmaku__main' not in vars(other)
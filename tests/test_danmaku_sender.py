@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_danmaku_sender.py
+:project        bilibili_live_utils
+:name           弹幕发送队列测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    DanmakuSender 的优先级队列：按优先级发送，队列满时只丢弃非重要弹幕，每次丢弃都计数
+"""
+
+import asyncio
+import logging
+
+from bilibili_api import Danmaku, Verify
+
+from scripts.danmaku_sender import PRIORITY_TEXT, DanmakuSender
+
+LOG = logging.getLogger('test')
+
+
+class FakeGateway(object):
+    """
+    记录发送的弹幕，fail 为 True 时发送失败
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    async def send_danmaku(self, room_id, danmaku, verify):
+        if self.fail:
+            raise ConnectionError('发送失败')
+        self.sent.append(danmaku.text)
+
+
+def make_sender(gateway=None, **kwargs):
+    return DanmakuSender(1, Verify('sessdata', 'csrf'), gateway=gateway or FakeGateway(), log=LOG, **kwargs)
+
+
+def test_important_lane_is_never_dropped():
+    sender = make_sender(queue_size=3)
+    for i in range(10):
+        sender.send(Danmaku(text='重要%d' % i), important=True)
+        sender.send(Danmaku(text='普通%d' % i))
+        sender.send(Danmaku(text='文字%d' % i), priority=PRIORITY_TEXT)
+    assert sender.stats()['lanes'] == [10, 3, 3]
+    assert sender.dropped_count == 14
+    assert [item[0].text for item in sender._lanes[2]] == ['普通7', '普通8', '普通9']
+
+
+def test_disabled_or_paused_sender_ignores_danmaku():
+    sender = make_sender()
+    sender.paused = True
+    sender.send(Danmaku(text='自动回复'))
+    sender.send_text('手动输入', manual=True)
+    assert sender.queue_depth == 1
+    sender.enable = False
+    sender.send_text('手动输入', manual=True)
+    assert sender.queue_depth == 1
+
+
+def test_send_text_splits_long_text():
+    sender = make_sender()
+    sender.send_text('字' * 65)
+    assert [len(item[0].text) for item in sender._lanes[PRIORITY_TEXT]] == [30, 30, 5]
+
+
+def test_sends_by_priority():
+    gateway = FakeGateway()
+
+    async def main():
+        sender = make_sender(gateway, min_interval=10, burst=10)
+        sender.send(Danmaku(text='普通'))
+        sender.send_text('文字')
+        sender.send(Danmaku(text='重要'), important=True)
+        sender.start()
+        await asyncio.sleep(0.1)
+        sender.stop()
+        return sender
+
+    sender = asyncio.run(main())
+    assert gateway.sent == ['重要', '文字', '普通']
+    assert sender.sent_count == 3 and sender.queue_depth == 0
+
+
+def test_expired_normal_danmaku_are_dropped():
+    gateway = FakeGateway()
+
+    async def main():
+        sender = make_sender(gateway, min_interval=10, burst=10, max_delay=0.01)
+        sender.send(Danmaku(text='普通'))
+        sender.send(Danmaku(text='重要'), important=True)
+        await asyncio.sleep(0.05)
+        sender.start()
+        await asyncio.sleep(0.05)
+        sender.stop()
+        return sender
+
+    sender = asyncio.run(main())
+    assert gateway.sent == ['重要']
+    assert sender.dropped_count == 1
+
+
+def test_failed_send_is_counted():
+    gateway = FakeGateway()
+    gateway.fail = True
+
+    async def main():
+        sender = make_sender(gateway, min_interval=10, burst=10)
+        sender.send(Danmaku(text='弹幕'))
+        sender.start()
+        await asyncio.sleep(0.05)
+        sender.stop()
+        return sender
+
+    sender = asyncio.run(main())
+    assert sender.failed_count == 1 and sender.sent_count == 0
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_events.py
+:project        bilibili_live_utils
+:name           直播间事件测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    原始事件包装成带类型的事件对象、字段的默认值，以及 bilibili_api 中 json 的替换和恢复
+"""
+
+import json
+
+import pytest
+from bilibili_api import live
+
+from scripts import events
+
+
+def raw(type_: str, data) -> dict:
+    return {'room_display_id': 732, 'room_real_id': 6154037, 'type': type_, 'data': data}
+
+
+def test_decode_uses_event_types():
+    assert type(events.decode(raw('VIEW', 113791))) is events.ViewEvent
+    assert type(events.decode(raw('WATCHED_CHANGE', {'data': {}}))) is events.Event
+    assert events.decode(raw('VIEW', 113791)).viewers == 113791
+
+
+def test_danmaku_fields():
+    event = events.decode(raw('DANMU_MSG', {'cmd': 'DANMU_MSG', 'info': [[0, 1], '感觉可以的', [7930172, 'AのFa']]}))
+    assert (event.type, event.content, event.uid, event.uname) == ('DANMU_MSG', '感觉可以的', 7930172, 'AのFa')
+
+
+def test_enter_event_defaults_and_medal():
+    event = events.decode(raw('INTERACT_WORD', {'cmd': 'INTERACT_WORD', 'data': {'uid': 1, 'uname': '观众'}}))
+    assert (event.uid, event.uname, event.msg_type, event.identities, event.medal) == (1, '观众', 1, (), {})
+    medal = {'medal_name': '粉丝牌', 'medal_level': 5}
+    event = events.decode(raw('INTERACT_WORD', {'data': {'uid': 1, 'uname': '观众', 'msg_type': 2,
+                                                         'identities': None, 'fans_medal': medal}}))
+    # 值为 None 时也使用默认值
+    assert (event.msg_type, event.identities, event.medal) == (2, (), medal)
+
+
+def test_missing_required_field_raises():
+    event = events.decode(raw('SEND_GIFT', {'data': {'uid': 1}}))
+    assert event.combo_id is None
+    with pytest.raises(KeyError):
+        event.gift_name
+
+
+def test_guard_enter_uname_and_combo_id():
+    event = events.decode(raw('ENTRY_EFFECT', {'data': {'uid': 1, 'copy_writing': '欢迎舰长 <%观众%> 进入直播间'}}))
+    assert event.uname == '观众'
+    assert events.decode(raw('COMBO_SEND', {'data': {'combo_id': 'a'}})).combo_id == 'a'
+    assert events.decode(raw('COMBO_SEND', {'data': {'batch_combo_id': 'b', 'combo_id': 'a'}})).combo_id == 'b'
+
+
+def test_loads_and_dumps_round_trip():
+    data = {'cmd': 'DANMU_MSG', 'info': [[0], '弹幕', [1, '观众']]}
+    encoded = events.dumps(data)
+    assert isinstance(encoded, bytes) and '弹幕'.encode('utf-8') in encoded
+    assert events.loads(encoded) == data
+    assert events.loads(encoded.decode('utf-8')) == data
+
+
+def test_install_fast_json(monkeypatch):
+    monkeypatch.setattr(live, 'json', json)
+    if events.orjson is None:
+        assert events.install_fast_json() is False
+        assert live.json is json
+        return
+    assert events.install_fast_json() is True
+    assert live.json.loads is events.loads
+    assert events.install_fast_json() is True  # 重复安装
+    events.uninstall_fast_json()
+    assert live.json is json
+
+
+def test_fast_json_is_skipped_on_unverified_versions(monkeypatch):
+    monkeypatch.setattr(live, 'json', json)
+    monkeypatch.setattr(events.utils, 'bilibili_api_version', lambda: '4.0.0')
+    assert events.install_fast_json() is False
+    assert live.json is json
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_gateway.py
+:project        bilibili_live_utils
+:name           网络请求网关测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    ApiGateway 的并发上限和超时（超时只计算取得并发名额之后的时间）
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scripts.gateway import ApiGateway
+
+
+class Blocking(object):
+    """
+    模拟耗时的同步请求，记录同时进行的最大数量和执行的线程
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.active = 0
+        self.peak = 0
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.active -= 1
+        return value
+
+
+def run(coro_func, gateway):
+    try:
+        return asyncio.run(coro_func())
+    finally:
+        gateway.shutdown()
+
+
+def test_call_runs_in_thread_pool_and_returns_result():
+    gateway = ApiGateway()
+    request = Blocking(0)
+    assert run(lambda: gateway.call('room_info', request, 42), gateway) == 42
+    assert all(name.startswith('ApiGateway') for name in request.threads)
+
+
+def test_endpoint_concurrency_limit():
+    gateway = ApiGateway(limits={'test': 2})
+    request = Blocking(0.05)
+
+    async def main():
+        return await asyncio.gather(*(gateway.call('test', request, i) for i in range(6)))
+
+    assert run(main, gateway) == list(range(6))
+    assert request.peak == 2
+
+
+def test_timeout_does_not_include_queue_time():
+    gateway = ApiGateway(limits={'test': 1}, timeout=0.15)
+    request = Blocking(0.1)
+
+    async def main():
+        # 第二个请求排队约 0.1 秒，加上自己的 0.1 秒超过 timeout，但请求本身没有超时
+        return await asyncio.gather(gateway.call('test', request, 1), gateway.call('test', request, 2))
+
+    assert run(main, gateway) == [1, 2]
+
+
+def test_slow_call_times_out_and_keeps_slot_until_done():
+    gateway = ApiGateway(limits={'test': 1}, timeouts={'test': 0.05})
+    request = Blocking(0.2)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await gateway.call('test', request)
+        # 超时后线程仍在运行，下一个请求等它结束才开始
+        start = time.perf_counter()
+        fast = Blocking(0)
+        await gateway.call('test', fast)
+        return time.perf_counter() - start
+
+    assert run(main, gateway) >= 0.1
+    assert request.peak == 1
+
+
+def test_errors_propagate():
+    gateway = ApiGateway()
+
+    def fail():
+        raise ValueError('接口返回错误')
+
+    async def main():
+        with pytest.raises(ValueError):
+            await gateway.call('room_info', fail)
+
+    run(main, gateway)
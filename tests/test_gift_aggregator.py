@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_gift_aggregator.py
+:project        bilibili_live_utils
+:name           礼物合并测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    GiftAggregator 的合并和答谢
+"""
+
+from scripts.gift_aggregator import GiftAggregator
+
+
+def make_aggregator(**kwargs):
+    thanked = []
+    aggregator = GiftAggregator(lambda uname, giftname, num: thanked.append((uname, giftname, num)), **kwargs)
+    return aggregator, thanked
+
+
+def test_merges_same_user_and_gift():
+    aggregator, thanked = make_aggregator()
+    aggregator.add_gift(1, 'A', '辣条', 1)
+    aggregator.add_gift(1, 'A', '辣条', 2)
+    aggregator.add_gift(1, 'A', '小心心', 1)
+    aggregator.add_gift(2, 'B', '辣条', 5)
+    aggregator.flush()
+    assert sorted(thanked) == [('A', '小心心', 1), ('A', '辣条', 3), ('B', '辣条', 5)]
+    assert aggregator.pending == 0
+
+
+def test_combo_counts_are_not_added_twice():
+    aggregator, thanked = make_aggregator()
+    # 连击的每次 SEND_GIFT 和带累计数量的 COMBO_SEND 描述的是同一批礼物
+    aggregator.add_gift(1, 'A', '辣条', 1, combo_id='c1')
+    aggregator.add_gift(1, 'A', '辣条', 1, combo_id='c1')
+    aggregator.add_combo(1, 'A', '辣条', 2, combo_id='c1')
+    aggregator.add_combo(1, 'A', '辣条', 5, combo_id='c1')
+    aggregator.add_combo(1, 'A', '辣条', 4, combo_id='c1')  # 乱序到达的旧事件
+    aggregator.flush()
+    assert thanked == [('A', '辣条', 5)]
+
+
+def test_combo_continuing_after_flush_only_thanks_new_gifts():
+    aggregator, thanked = make_aggregator()
+    aggregator.add_combo(1, 'A', '辣条', 10, combo_id='c1')
+    aggregator.flush()
+    aggregator.add_combo(1, 'A', '辣条', 15, combo_id='c1')
+    aggregator.flush()
+    assert thanked == [('A', '辣条', 10), ('A', '辣条', 5)]
+
+
+def test_flush_thanks_most_valuable_groups_first():
+    aggregator, thanked = make_aggregator(max_groups=2)
+    aggregator.add_gift(1, 'A', '辣条', 1, coin=100)
+    aggregator.add_gift(2, 'B', '飞船', 1, coin=100000)
+    aggregator.add_gift(3, 'C', '小电视', 1, coin=10000)
+    aggregator.flush()
+    assert thanked == [('B', '飞船', 1), ('C', '小电视', 1)]
+    assert aggregator.pending == 1
+    aggregator.flush()
+    assert thanked[-1] == ('A', '辣条', 1)
+
+
+def test_new_group_evicts_lowest_value_when_full():
+    aggregator, thanked = make_aggregator(max_groups=1, max_pending=2)
+    aggregator.add_gift(1, '1', '辣条', 1, coin=10)
+    aggregator.add_gift(2, '2', '辣条', 1, coin=5)
+    aggregator.add_gift(3, '3', '辣条', 1, coin=20)
+    assert aggregator.pending == 2
+    aggregator.flush()
+    aggregator.flush()
+    assert thanked == [('3', '辣条', 1), ('1', '辣条', 1)]
+
+
+def test_pending_groups_stay_bounded_during_flood():
+    aggregator, thanked = make_aggregator(max_groups=3, max_pending=10)
+    aggregator.add_gift(0, 'big', '飞船', 1, coin=100000)
+    for uid in range(1, 1000):
+        aggregator.add_gift(uid, str(uid), '辣条', 1, coin=100)
+        assert aggregator.pending <= 10
+    aggregator.add_gift(5000, 'mid', '小电视', 1, coin=1000)
+    aggregator.flush()
+    assert thanked[:2] == [('big', '飞船', 1), ('mid', '小电视', 1)]
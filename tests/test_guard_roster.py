@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_guard_roster.py
+:project        bilibili_live_utils
+:name           大航海列表测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    GuardRoster 的增量更新、到期和与完整列表的合并（使用模拟的网关）
+"""
+
+import asyncio
+import logging
+
+from scripts.guard_roster import MONTH, GuardRoster
+
+LOG = logging.getLogger('test')
+
+
+class FakeGateway(object):
+    """
+    按页返回大航海列表，每页 page_size 个成员，total_pages 为 False 时不返回总页数
+    """
+
+    def __init__(self, members: dict, page_size: int = 2, total_pages: bool = True, on_page=None):
+        self.members = members
+        self.page_size = page_size
+        self.total_pages = total_pages
+        self.on_page = on_page
+        self.pages = []
+
+    async def get_room_play_info(self, room_id, verify):
+        return {'room_id': room_id + 1, 'uid': 99}
+
+    async def get_dahanghai_page(self, room_real_id, ruid, page, verify):
+        self.pages.append(page)
+        if self.on_page is not None:
+            self.on_page(page)
+        users = [{'uid': uid, 'guard_level': level} for uid, level in sorted(self.members.items())]
+        pages = max(1, -(-len(users) // self.page_size))
+        info = {'num': len(users), 'now': page}
+        if self.total_pages:
+            info['page'] = pages
+        chunk = users[(page - 1) * self.page_size:page * self.page_size]
+        return {'info': info, 'list': chunk, 'top3': []}
+
+
+def test_fetch_reads_all_pages():
+    gateway = FakeGateway({1: 3, 2: 3, 3: 2, 4: 1, 5: 3})
+    roster = GuardRoster(100, gateway, log=LOG)
+    assert asyncio.run(roster.fetch()) == {1: 3, 2: 3, 3: 2, 4: 1, 5: 3}
+    assert sorted(gateway.pages) == [1, 2, 3]
+    assert (roster.room_real_id, roster.ruid, roster.total) == (101, 99, 5)
+
+
+def test_fetch_without_page_count_stops_at_empty_page():
+    gateway = FakeGateway({1: 3, 2: 3, 3: 3}, total_pages=False)
+    roster = GuardRoster(100, gateway, log=LOG)
+    assert asyncio.run(roster.fetch()) == {1: 3, 2: 3, 3: 3}
+    assert gateway.pages == [1, 2, 3]
+
+
+def test_purchase_keeps_higher_level_and_extends_expiry(clock):
+    changes = []
+    roster = GuardRoster(100, None, on_change=changes.append, log=LOG)
+    roster.apply_purchase(1, 3)
+    roster.apply_purchase(1, 2, num=2)
+    roster.apply_purchase(1, 3)
+    assert roster.get(1) == 2
+    assert roster.snapshot()[1] == (2, clock.now + 4 * MONTH)
+    assert len(changes) == 3
+
+
+def test_expired_members_are_removed(clock):
+    roster = GuardRoster(100, None, log=LOG)
+    roster.restore({2: (3, None), 3: (3, clock.now - 1)})
+    assert 3 not in roster
+    roster.apply_purchase(1, 3)
+    roster.apply_purchase(1, 3)
+    clock.advance(MONTH + 1)
+    assert roster.expire() == 0  # 1 顺延到了两个月
+    clock.advance(MONTH)
+    assert roster.expire() == 1
+    assert roster.as_dict() == {2: 3}
+
+
+def test_reconcile_diffs_with_full_list():
+    gateway = FakeGateway({1: 3, 2: 2, 4: 3})
+    roster = GuardRoster(100, gateway, log=LOG)
+    roster.restore({1: (3, None), 3: (3, None)})
+    roster.apply_purchase(2, 3)
+    expire = roster.snapshot()[2][1]
+
+    # 获取完整列表期间上舰的成员以事件为准
+    gateway.on_page = lambda page: page == 1 and roster.apply_purchase(5, 1)
+    asyncio.run(roster.reconcile())
+    assert roster.as_dict() == {1: 3, 2: 2, 4: 3, 5: 1}
+    assert roster.snapshot()[2] == (2, expire)  # 已知的到期时间保留
+
+
+def test_observe_resyncs_on_mismatch():
+    gateway = FakeGateway({1: 3, 2: 3})
+
+    async def main():
+        roster = GuardRoster(100, gateway, resync_interval=600, log=LOG)
+        roster.observe(1, 3)
+        await asyncio.sleep(0)
+        roster.observe(2, 3)  # 距离上次获取不足 resync_interval，不再获取
+        await roster._task
+        return roster
+
+    roster = asyncio.run(main())
+    assert roster.as_dict() == {1: 3, 2: 3}
+    assert gateway.pages == [1]
@@ -0,0 +1,42 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_rate_limiter.py
+:project        bilibili_live_utils
+:name           令牌桶测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    TokenBucket
+"""
+
+import pytest
+
+from scripts.rate_limiter import TokenBucket
+
+
+def test_bucket_allows_burst_then_limits(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=1)
+    assert bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.advance(0.25)
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.25)
+    clock.advance(0.25)
+    assert bucket.delay() == 0.0
+    assert bucket.try_acquire()
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    clock.advance(100)
+    assert bucket.tokens == 2
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire()
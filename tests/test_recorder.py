@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_recorder.py
+:project        bilibili_live_utils
+:name           事件录制测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    EventRecorder 写入的文件可以被 RecordReader 按时间和事件类型读回
+"""
+
+import logging
+
+from scripts.recorder import EventRecorder, RecordReader
+
+
+def make_event(i: int) -> dict:
+    event_type = 'DANMU_MSG' if i % 2 == 0 else 'SEND_GIFT'
+    return {'room_display_id': 732, 'room_real_id': 6154037, 'type': event_type,
+            'data': {'cmd': event_type, 'info': [i, '弹幕%d' % i]}}
+
+
+def record(directory, count: int, batch_size: int, clock) -> str:
+    recorder = EventRecorder(str(directory), 732, batch_size=batch_size, log=logging.getLogger('test'))
+    for i in range(count):
+        recorder.record(make_event(i))
+        clock.advance(1)
+    recorder.stop()
+    return recorder.path
+
+
+def test_round_trip(tmp_path, clock):
+    path = record(tmp_path, 25, 10, clock)
+    reader = RecordReader(path)
+    assert reader.count == 25
+    assert len(reader.index) == 3
+    events = list(reader.read())
+    assert [event['data']['info'][0] for event in events] == list(range(25))
+    assert events[1]['type'] == 'SEND_GIFT'
+    assert events[1]['data']['info'][1] == '弹幕1'
+    assert events[1]['ts'] == events[0]['ts'] + 1
+
+
+def test_read_by_time_and_type(tmp_path, clock):
+    start = clock.now
+    path = record(tmp_path, 25, 10, clock)
+    reader = RecordReader(path)
+    events = list(reader.read(start=start + 5, end=start + 14))
+    assert [event['data']['info'][0] for event in events] == list(range(5, 15))
+    gifts = list(reader.read(types={'SEND_GIFT'}))
+    assert [event['data']['info'][0] for event in gifts] == list(range(1, 25, 2))
+
+
+def test_missing_index_reads_nothing(tmp_path):
+    path = tmp_path / 'empty.jsonl.gz'
+    path.write_bytes(b'')
+    assert RecordReader(str(path)).count == 0
+    assert list(RecordReader(str(path)).read()) == []
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_scheduler.py
+:project        bilibili_live_utils
+:name           定时任务测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    CronTrigger 和 IntervalTrigger 计算下一次执行时间，AsyncScheduler 执行任务
+"""
+
+import asyncio
+import datetime
+
+from scripts.scheduler import AsyncScheduler, CronTrigger, IntervalTrigger
+
+
+def at(*args) -> float:
+    return datetime.datetime(*args).timestamp()
+
+
+def test_cron_fires_later_today():
+    assert CronTrigger(hour=4).next_fire_time(at(2021, 2, 27, 3, 59, 59)) == at(2021, 2, 27, 4, 0, 0)
+
+
+def test_cron_fires_tomorrow_after_time_passed():
+    assert CronTrigger(hour=4).next_fire_time(at(2021, 2, 27, 4, 0, 0)) == at(2021, 2, 28, 4, 0, 0)
+    assert CronTrigger(hour=4).next_fire_time(at(2021, 2, 27, 23, 0, 0)) == at(2021, 2, 28, 4, 0, 0)
+
+
+def test_cron_crosses_month_end():
+    assert CronTrigger(hour=0).next_fire_time(at(2021, 2, 28, 12, 0, 0)) == at(2021, 3, 1, 0, 0, 0)
+
+
+def test_cron_every_hour():
+    trigger = CronTrigger(hour=None, minute=30)
+    assert trigger.next_fire_time(at(2021, 2, 27, 10, 15, 0)) == at(2021, 2, 27, 10, 30, 0)
+    assert trigger.next_fire_time(at(2021, 2, 27, 10, 45, 0)) == at(2021, 2, 27, 11, 30, 0)
+    assert trigger.next_fire_time(at(2021, 2, 27, 23, 45, 0)) == at(2021, 2, 28, 0, 30, 0)
+
+
+def test_cron_jitter_only_delays():
+    now = at(2021, 2, 27, 3, 0, 0)
+    for _ in range(20):
+        fire = CronTrigger(hour=4, jitter=30).next_fire_time(now)
+        assert at(2021, 2, 27, 4, 0, 0) <= fire <= at(2021, 2, 27, 4, 0, 30)
+
+
+def test_interval_recomputes_seconds():
+    intervals = iter([10, 20])
+    trigger = IntervalTrigger(lambda: next(intervals))
+    assert trigger.next_fire_time(100) == 110
+    assert trigger.next_fire_time(100) == 120
+
+
+def test_scheduler_runs_plain_and_coroutine_jobs():
+    runs = []
+
+    async def job():
+        runs.append('async')
+
+    async def main():
+        scheduler = AsyncScheduler()
+        scheduler.add_job(lambda: runs.append('sync'), IntervalTrigger(0.01), id='sync')
+        scheduler.add_job(job, IntervalTrigger(0.01), id='async')
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        scheduler.shutdown()
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert 'sync' in runs and 'async' in runs
+    assert scheduler.get_job('sync').runs > 1
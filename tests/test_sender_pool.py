@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_sender_pool.py
+:project        bilibili_live_utils
+:name           发送弹幕的账号测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    SenderAccount 的暂停和翻倍、SenderPool 固定账号，以及多个账号轮流发送弹幕
+"""
+
+import asyncio
+import logging
+from configparser import RawConfigParser
+
+from bilibili_api import Danmaku, Verify
+
+from scripts.danmaku_sender import DanmakuSender
+from scripts.sender_pool import SenderAccount, SenderPool, load_accounts
+
+LOG = logging.getLogger('test')
+
+
+def make_account(name: str = 'main', **kwargs) -> SenderAccount:
+    return SenderAccount(name, Verify(name, 'csrf'), log=LOG, **kwargs)
+
+
+def test_cooldown_doubles_until_success(clock):
+    account = make_account(max_failures=2, cooldown=10, max_cooldown=25)
+    account.report_failure(ConnectionError())
+    assert account.healthy
+    account.report_failure(ConnectionError())
+    assert not account.healthy and account.delay() == 10
+    clock.advance(10)
+    assert account.healthy
+    for pause in (20, 25):
+        account.report_failure(ConnectionError())
+        account.report_failure(ConnectionError())
+        assert account.delay() == pause
+        clock.advance(pause)
+    account.report_success()
+    account.report_failure(ConnectionError())
+    account.report_failure(ConnectionError())
+    assert account.delay() == 10
+    assert (account.sent, account.failed) == (1, 8)
+
+
+def test_sticky_key_follows_healthy_account(clock):
+    first, second = make_account('a', max_failures=1), make_account('b')
+    pool = SenderPool([first, second], sticky_ttl=60)
+    assert pool.accepts(second, 'key') and pool.accepts(first, None)
+    pool.bind('key', first)
+    assert pool.accepts(first, 'key') and not pool.accepts(second, 'key')
+    # 固定的账号暂停使用时由其他账号发送
+    first.report_failure(ConnectionError())
+    assert pool.accepts(second, 'key')
+    clock.advance(61)
+    assert first.healthy
+    assert pool.accepts(second, 'key')  # 固定已过期
+
+
+def test_load_accounts():
+    config = RawConfigParser()
+    config.read_dict({
+        'USER': {'SESSDATA': 's0', 'BILIBILI_JCT': 'c0'},
+        'USER:alt': {'SESSDATA': 's1', 'BILIBILI_JCT': 'c1'},
+        'USER:watch': {'SESSDATA': 's2', 'BILIBILI_JCT': 'c2', 'SEND': 'False'},
+        'SENDER': {'MAX_FAILURES': '5', 'COOLDOWN': '30'},
+        'DANMAKU': {'SEND': 'True'},
+    })
+    accounts = load_accounts(config, min_interval=2000, burst=2)
+    assert [account.name for account in accounts] == ['main', 'alt']
+    assert accounts[1].verify.sessdata == 's1'
+    assert (accounts[0].max_failures, accounts[0].cooldown, accounts[0].max_cooldown) == (5, 30, 1800)
+    assert (accounts[0].bucket.rate, accounts[0].bucket.capacity) == (0.5, 2)
+
+
+class FakeGateway(object):
+    """
+    记录每条弹幕由哪个账号发送
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_danmaku(self, room_id, danmaku, verify):
+        self.sent.append((verify.sessdata, danmaku.text))
+
+
+def test_accounts_share_lanes_and_keep_sticky_order():
+    gateway = FakeGateway()
+    accounts = [make_account('a', min_interval=10), make_account('b', min_interval=10)]
+
+    async def main():
+        sender = DanmakuSender(1, accounts[0].verify, gateway=gateway, pool=SenderPool(accounts), log=LOG)
+        for i in range(4):
+            sender.send_text('回复%d' % i, key='uid')
+            sender.send(Danmaku(text='普通%d' % i))
+        sender.start()
+        await asyncio.sleep(0.2)
+        sender.stop()
+        return sender
+
+    sender = asyncio.run(main())
+    assert sender.sent_count == 8
+    # 两个账号都发送了弹幕，同一个 key 的弹幕由同一个账号按顺序发送
+    assert {name for name, _ in gateway.sent} == {'a', 'b'}
+    replies = [(name, text) for name, text in gateway.sent if text.startswith('回复')]
+    assert len({name for name, _ in replies}) == 1
+    assert [text for _, text in replies] == ['回复0', '回复1', '回复2', '回复3']
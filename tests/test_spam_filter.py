@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_spam_filter.py
+:project        bilibili_live_utils
+:name           刷屏过滤测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    SpamFilter 的限速和重复检测
+"""
+
+from scripts.spam_filter import REJECT_DUPLICATE, REJECT_RATE, ConcurrencyLimit, SpamFilter
+
+
+def test_disabled_filter_passes_everything(clock):
+    spam_filter = SpamFilter(1, enable=False, user_burst=1)
+    assert [spam_filter.check(1, '你好') for _ in range(3)] == [None, None, None]
+
+
+def test_rate_limit_per_user(clock):
+    spam_filter = SpamFilter(1, enable=True, user_rate=6, user_burst=2)
+    assert spam_filter.check(1, '今天天气怎么样') is None
+    assert spam_filter.check(1, '你叫什么名字') is None
+    assert spam_filter.check(1, '讲个笑话') == REJECT_RATE
+    assert spam_filter.check(2, '讲个笑话') is None
+    clock.advance(10)  # 每分钟 6 次，10 秒恢复一次
+    assert spam_filter.check(1, '讲个笑话') is None
+
+
+def test_similar_questions_from_same_user_are_duplicates(clock):
+    spam_filter = SpamFilter(1, enable=True, user_burst=10)
+    assert spam_filter.check(1, '今天天气怎么样') is None
+    assert spam_filter.check(1, '今天天气怎么样？？') == REJECT_DUPLICATE
+    assert spam_filter.check(1, '今天 天气 怎么样啊') == REJECT_DUPLICATE
+    assert spam_filter.check(1, '给我讲一个笑话吧') is None
+
+
+def test_same_question_from_different_users_passes(clock):
+    spam_filter = SpamFilter(1, enable=True)
+    assert spam_filter.check(1, '今天天气怎么样') is None
+    assert spam_filter.check(2, '今天天气怎么样') is None
+
+
+def test_duplicate_window_slides(clock):
+    spam_filter = SpamFilter(1, enable=True, user_burst=10, duplicate_window=60)
+    assert spam_filter.check(1, '今天天气怎么样') is None
+    clock.advance(30)
+    # 重复的弹幕也记录，持续刷屏时一直被过滤
+    assert spam_filter.check(1, '今天天气怎么样') == REJECT_DUPLICATE
+    clock.advance(45)
+    assert spam_filter.check(1, '今天天气怎么样') == REJECT_DUPLICATE
+    clock.advance(61)
+    assert spam_filter.check(1, '今天天气怎么样') is None
+
+
+def test_similarity_threshold(clock):
+    strict = SpamFilter(1, enable=True, user_burst=10, similarity=1)
+    assert strict.check(1, '今天天气怎么样') is None
+    assert strict.check(1, '今天天气怎么样呢') is None
+    assert strict.check(1, '今天，天气怎么样!') == REJECT_DUPLICATE
+
+
+def test_forgets_least_recent_users(clock):
+    spam_filter = SpamFilter(1, enable=True, user_burst=1, max_users=2)
+    for uid in (1, 2, 3):
+        assert spam_filter.check(uid, '你好') is None
+    assert len(spam_filter) == 2
+    assert spam_filter.check(1, '你好') is None  # 1 已被淘汰，重新开始计数
+
+
+def test_concurrency_limit():
+    limit = ConcurrencyLimit(2)
+    assert limit.try_acquire() and limit.try_acquire()
+    assert not limit.try_acquire()
+    limit.release()
+    assert limit.try_acquire()
+    assert all(ConcurrencyLimit(0).try_acquire() for _ in range(100))
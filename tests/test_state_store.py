@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_state_store.py
+:project        bilibili_live_utils
+:name           本地状态存储测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    StateStore 的写入合并、读取时待写入数据优先，以及关闭后重新打开能读到保存的数据
+"""
+
+import asyncio
+import logging
+
+from scripts.state_store import StateStore
+
+LOG = logging.getLogger('test')
+
+
+def run_store(path, coro_func):
+    """
+    打开数据库执行 coro_func(store)，结束后关闭（写入剩余数据）
+    """
+    async def main():
+        store = StateStore(str(path), flush_interval=60, log=LOG)
+        await store.open()
+        try:
+            return await coro_func(store)
+        finally:
+            store.close()
+
+    return asyncio.run(main())
+
+
+def test_viewer_updates_are_merged(tmp_path):
+    path = tmp_path / 'state.db'
+
+    async def write(store):
+        store.update_viewer(1, uname='观众', follower=10)
+        store.update_viewer(1, level=5)
+        # 还没有写入时读取待写入的数据
+        return await store.get_viewer(1)
+
+    viewer = run_store(path, write)
+    assert (viewer['uname'], viewer['follower'], viewer['level']) == ('观众', 10, 5)
+
+    async def update(store):
+        # 只修改提供的字段，其余字段保留数据库中的值
+        store.update_viewer(1, follower=20)
+        store.flush()
+        return await store.get_viewer(1), await store.get_viewer(2)
+
+    viewer, missing = run_store(path, update)
+    assert (viewer['uname'], viewer['follower'], viewer['level']) == ('观众', 20, 5)
+    assert missing is None
+
+
+def test_welcomes_roster_and_room_info_survive_restart(tmp_path):
+    path = tmp_path / 'data' / 'state.db'
+
+    async def write(store):
+        store.add_welcome(100, 1)
+        store.add_welcome(200, 2)
+        store.save_roster(100, {1: (3, None), 2: (2, 1234.5)})
+        store.save_room_info(100, {'room_id': 101, 'uid': 99})
+        store.save_key_usage('2021-02-27', {'a': 100, 'b': 3}, {'a'})
+
+    run_store(path, write)
+
+    async def read(store):
+        return (await store.load_welcomed(100, 0), await store.load_roster(100), await store.load_room_info(100),
+                await store.load_room_info(200), await store.load_key_usage('2021-02-27'),
+                await store.load_key_usage('2021-02-28'))
+
+    welcomed, roster, info, missing, usage, other_day = run_store(path, read)
+    assert [uid for uid, _ in welcomed] == [1]
+    assert roster == {1: (3, None), 2: (2, 1234.5)}
+    assert info == {'room_id': 101, 'uid': 99} and missing is None
+    assert usage == ({'a': 100, 'b': 3}, {'a'})
+    assert other_day == ({}, set())
+
+
+def test_saved_roster_replaces_previous_one(tmp_path):
+    path = tmp_path / 'state.db'
+
+    async def write(store):
+        store.save_roster(100, {1: (3, None), 2: (3, None)})
+        store.flush()
+        store.save_roster(100, {2: (1, None)})
+        # 待写入的列表优先
+        return await store.load_roster(100)
+
+    assert run_store(path, write) == {2: (1, None)}
+
+    async def read(store):
+        return await store.load_roster(100)
+
+    assert run_store(path, read) == {2: (1, None)}
+
+
+def test_load_welcomed_filters_by_time(tmp_path, clock):
+    path = tmp_path / 'state.db'
+
+    async def write(store):
+        store.add_welcome(100, 1)
+        store.flush()
+        clock.advance(60)
+        store.add_welcome(100, 2)
+        # 一条已写入，一条待写入
+        return await store.load_welcomed(100, 0), await store.load_welcomed(100, clock.now - 30)
+
+    everyone, recent = run_store(path, write)
+    assert [uid for uid, _ in everyone] == [1, 2]
+    assert recent == [(2, clock.now)]
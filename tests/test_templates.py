@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_templates.py
+:project        bilibili_live_utils
+:name           弹幕模板测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    Template 的编译、填入和截短，以及从配置文件读取模板
+"""
+
+from configparser import RawConfigParser
+
+import pytest
+
+from scripts.templates import ELLIPSIS, MAX_LENGTH, MessageTemplates, Template
+
+FIELDS = ('uname', 'gift_name', 'gift_count')
+
+
+def test_render_fills_placeholders():
+    template = Template('感谢${uname}赠送的${gift_name}x${gift_count}', FIELDS)
+    assert template.render({'uname': 'A', 'gift_name': '辣条', 'gift_count': 3}) == '感谢A赠送的辣条x3'
+
+
+def test_render_keeps_literal_braces():
+    template = Template('{欢迎}${uname}', FIELDS)
+    assert template.render({'uname': 'A'}) == '{欢迎}A'
+
+
+def test_render_shortens_longest_value_first():
+    template = Template('感谢${uname}赠送的${gift_name}', FIELDS)
+    text = template.render({'uname': '很' * 40, 'gift_name': '辣条'})
+    assert len(text) == MAX_LENGTH
+    assert text.startswith('感谢很') and text.endswith(ELLIPSIS + '赠送的辣条')
+
+
+def test_render_truncates_when_values_cannot_shrink():
+    template = Template('很长的模板' * 10 + '${uname}', FIELDS)
+    assert len(template.render({'uname': 'A'})) == MAX_LENGTH
+
+
+def test_unknown_placeholder_raises():
+    with pytest.raises(ValueError):
+        Template('欢迎${sex}', FIELDS)
+
+
+def test_uses():
+    template = Template('感谢${uname}', FIELDS)
+    assert template.uses('uname')
+    assert not template.uses('gift_name')
+
+
+def test_message_templates_from_config():
+    config = RawConfigParser()
+    config.read_dict({'DANMAKU': {'TEMPLATE_CHOICE': 'round_robin',
+                                  'WELCOME_ENTER': '欢迎${uname} | 你好${uname}${sex}'}})
+    templates = MessageTemplates.from_config(config)
+    rendered = [templates.render('WELCOME_ENTER', uname='A', sex='') for _ in range(3)]
+    assert rendered == ['欢迎A', '你好A', '欢迎A']
+    assert templates.uses('WELCOME_ENTER', 'sex')
+    assert not templates.uses('THANK_SC', 'gift_name')
+    assert not MessageTemplates.from_config().uses('WELCOME_ENTER', 'sex')
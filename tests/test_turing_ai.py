@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_turing_ai.py
+:project        bilibili_live_utils
+:name           图灵机器人测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    TuringAI 的 API KEY 选择、每日用量和回复缓存（使用模拟的网关，不发送网络请求）
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from scripts.settings import TuringSettings
+from scripts.turing_ai import CODE_QUOTA_EXCEEDED, TuringAI
+
+REQUEST_FORMAT = json.dumps({'perception': {'inputText': {'text': ''}}, 'userInfo': {'apiKey': '', 'userId': ''}})
+
+
+class FakeGateway(object):
+    """
+    记录每次请求使用的 KEY，exhausted 中的 KEY 返回次数用完
+    """
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.keys = []
+        self.exhausted = set()
+
+    async def post_json(self, endpoint, url, body):
+        await asyncio.sleep(self.delay)
+        key = body['userInfo']['apiKey']
+        self.keys.append(key)
+        if key in self.exhausted:
+            return {'intent': {'code': CODE_QUOTA_EXCEEDED}}
+        return {'intent': {'code': 0}, 'results': [{'values': {'text': '回复：' + body['perception']['inputText']['text']}}]}
+
+
+def make_turing(keys, gateway, **kwargs):
+    kwargs.setdefault('cache_ttl', 0)
+    return TuringAI(api_url='http://127.0.0.1/', api_keys=keys, request_body=REQUEST_FORMAT, gateway=gateway,
+                    **kwargs)
+
+
+def ask_all(turing, questions):
+    async def main():
+        return [await turing.ask(question, 'uid') for question in questions]
+    return asyncio.run(main())
+
+
+def test_keys_are_used_in_turn():
+    gateway = FakeGateway()
+    turing = make_turing(['k1', 'k2', 'k3'], gateway)
+    ask_all(turing, ['q%d' % i for i in range(6)])
+    assert gateway.keys == ['k1', 'k2', 'k3', 'k1', 'k2', 'k3']
+    assert turing.stats()['remaining'] == {'k1': 98, 'k2': 98, 'k3': 98}
+
+
+def test_daily_quota_switches_key():
+    gateway = FakeGateway()
+    turing = make_turing(['k1', 'k2'], gateway, daily_quota=1)
+    assert ask_all(turing, ['a', 'b']) == ['回复：a', '回复：b']
+    with pytest.raises(ConnectionError):
+        ask_all(turing, ['c'])
+    turing.reset_retry_count()
+    assert ask_all(turing, ['c']) == ['回复：c']
+
+
+def test_exhausted_key_is_skipped():
+    gateway = FakeGateway()
+    gateway.exhausted.add('k1')
+    turing = make_turing(['k1', 'k2'], gateway)
+    assert ask_all(turing, ['a', 'b']) == ['回复：a', '回复：b']
+    assert gateway.keys == ['k1', 'k2', 'k2']
+    assert turing.stats()['remaining'] == {'k1': 0, 'k2': 98}
+
+
+def test_cached_answer_does_not_use_quota():
+    gateway = FakeGateway()
+    turing = make_turing(['k1'], gateway, cache_ttl=600)
+    assert ask_all(turing, ['你好', '你好！', ' 你好']) == ['回复：你好'] * 3
+    assert gateway.keys == ['k1']
+
+
+def test_reload_during_request_drops_key():
+    gateway = FakeGateway(delay=0.05)
+    turing = make_turing(['k1'], gateway)
+
+    async def main():
+        pending = asyncio.ensure_future(turing.ask('你好', 'uid'))
+        await asyncio.sleep(0.01)
+        turing.apply(TuringSettings(enable=True, question_prefix='#', answer_prefix='', fallback='',
+                                    api_url='http://127.0.0.1/', api_keys=('k2', ), request_format=REQUEST_FORMAT,
+                                    daily_quota=100))
+        return await pending
+
+    assert asyncio.run(main()) == '回复：你好'
+    assert turing.stats()['remaining'] == {'k2': 100}
+
+
+def test_punctuation_only_questions_are_not_cached_or_merged():
+    gateway = FakeGateway(delay=0.01)
+    turing = make_turing(['k1'], gateway, cache_ttl=600)
+
+    async def main():
+        together = await asyncio.gather(turing.ask('？？？', 'a'), turing.ask('!!!', 'b'))
+        return list(together) + [await turing.ask('😀', 'c')]
+
+    assert asyncio.run(main()) == ['回复：？？？', '回复：!!!', '回复：😀']
+    assert len(gateway.keys) == 3
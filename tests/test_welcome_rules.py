@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_welcome_rules.py
+:project        bilibili_live_utils
+:name           欢迎规则测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    WelcomeRules 的编译和匹配，以及只在需要时查询用户信息
+"""
+
+import asyncio
+
+import pytest
+
+from scripts.welcome_rules import DEFAULT_RULES, WelcomeRules
+
+USERS = {
+    'relation': {'follower': 20000, 'following': 10},
+    'info': {'sex': '女', 'level': 6},
+}
+
+
+def evaluate(rules: WelcomeRules, users: dict = USERS, **fields):
+    """
+    :param users: 查询用户信息时返回的内容 {信息来源: 字段}
+    :return: (是否欢迎, 查询过的信息来源)
+    """
+    loaded = []
+
+    async def enrich(source, values):
+        loaded.append(source)
+        values.update(users[source])
+
+    fields = dict({'uid': 1, 'room': 100, 'medal_room': 0, 'medal_level': 0, 'identities': [1]}, **fields)
+    return asyncio.run(rules.evaluate(fields, enrich)), loaded
+
+
+def test_default_rules():
+    rules = WelcomeRules.parse(DEFAULT_RULES)
+    assert evaluate(rules, medal_room=100, medal_level=5) == (True, [])
+    assert evaluate(rules, medal_room=100, medal_level=4) == (True, ['relation'])
+    assert evaluate(rules, users={'relation': {'follower': 10, 'following': 10}}) == (False, ['relation'])
+
+
+def test_first_matching_rule_wins():
+    rules = WelcomeRules.parse("ignore: medal_level == 0\nwelcome: *")
+    assert evaluate(rules) == (False, [])
+    assert evaluate(rules, medal_level=1) == (True, [])
+
+
+def test_local_rules_are_checked_before_remote_ones():
+    rules = WelcomeRules.parse("welcome: level >= 5\nwelcome: identities has 1")
+    assert evaluate(rules) == (True, [])
+
+
+def test_each_source_is_loaded_once():
+    rules = WelcomeRules.parse("ignore: sex == '男'\nignore: level < 3\nwelcome: follower > following")
+    assert evaluate(rules) == (True, ['info', 'relation'])
+
+
+def test_default_action():
+    assert evaluate(WelcomeRules.parse("ignore: medal_level > 0", default='welcome')) == (True, [])
+    assert evaluate(WelcomeRules.parse("welcome: medal_level > 0")) == (False, [])
+
+
+@pytest.mark.parametrize('text', [
+    "medal_level > 0",
+    "greet: medal_level > 0",
+    "welcome: unknown_field > 0",
+    "welcome: medal_level ~ 0",
+    "welcome: medal_level > nothing",
+])
+def test_invalid_rules_raise(text):
+    with pytest.raises(ValueError):
+        WelcomeRules.parse(text)
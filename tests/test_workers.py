@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+:file           test_workers.py
+:project        bilibili_live_utils
+:name           直播间分配测试
+:author         Doby2333
+:github         https://github.com/lyzhang0113/bilibili-live-utils
+:version        1.0.0
+:created        2021/02/27 10:00
+:description    ConsistentHashRing：分配固定，增减节点时只有少量直播间换到别的节点
+"""
+
+from collections import Counter
+
+from scripts.workers import ConsistentHashRing
+
+ROOMS = range(100000, 102000)
+
+
+def assign(nodes: list) -> dict:
+    ring = ConsistentHashRing(nodes)
+    return {room: ring.get(room) for room in ROOMS}
+
+
+def test_assignment_is_stable():
+    assert assign([0, 1, 2]) == assign([0, 1, 2])
+    assert assign([0, 1, 2]) == assign([2, 1, 0])
+
+
+def test_rooms_are_spread_over_nodes():
+    counts = Counter(assign([0, 1, 2, 3]).values())
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(ROOMS) / 4 * 0.6
+
+
+def test_adding_a_node_only_moves_rooms_to_it():
+    before = assign([0, 1, 2])
+    after = assign([0, 1, 2, 3])
+    moved = [room for room in ROOMS if before[room] != after[room]]
+    assert all(after[room] == 3 for room in moved)
+    assert len(moved) < len(ROOMS) / 4 * 1.5
+
+
+def test_removing_a_node_only_moves_its_rooms():
+    before = assign([0, 1, 2, 3])
+    after = assign([0, 1, 3])
+    for room in ROOMS:
+        if before[room] != 2:
+            assert after[room] == before[room]